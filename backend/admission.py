@@ -0,0 +1,236 @@
+"""
+Contrôle d'admission des endpoints qui appellent le LLM
+
+Chaque appel LLM bloque un thread Flask plusieurs secondes : on borne le nombre
+de requêtes LLM simultanées (slots partagés) et on met les autres en file.
+
+- Une file bornée par endpoint, avec une priorité : quand un slot se libère,
+  il va à la requête la plus prioritaire (FIFO à priorité égale). /ask
+  (interactif) passe avant /summarize, /quiz et /ask_batch, eux-mêmes
+  avant les générations de fond (complément de la banque de questions).
+- Les endpoints lents ne peuvent pas occuper tous les slots (max_active).
+- File pleine ou attente trop longue : refus immédiat, 429 + Retry-After
+  estimé d'après le temps de service moyen.
+
+Configuration (variables d'environnement) :
+    ADMISSION_ENABLED            1 = activé, 0 = aucune limite       (défaut: 1)
+    ADMISSION_SLOTS              requêtes LLM simultanées            (défaut: 8)
+    ADMISSION_<FILE>_QUEUE       requêtes en attente max dans la file
+    ADMISSION_<FILE>_MAX_ACTIVE  slots max occupés par la file
+    ADMISSION_<FILE>_TIMEOUT_S   attente max avant refus
+    (<FILE> = ASK, ASK_BATCH, SUMMARIZE, QUIZ, QUIZ_BANK ; défauts dans QUEUES)
+"""
+
+import functools
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response
+
+import metrics
+import tracing
+
+# {file: (priorité (0 = la plus haute), attente max, part max des slots, timeout en s)}
+QUEUES = {
+    "ask": (0, 32, 1.0, 10.0),
+    "ask_batch": (1, 16, 0.5, 30.0),  # un slot par génération du batch
+    "summarize": (1, 8, 0.5, 30.0),
+    "quiz": (1, 8, 0.5, 30.0),
+    "quiz_bank": (2, 16, 0.25, 60.0),
+}
+
+
+class Overloaded(Exception):
+    """File pleine ou attente trop longue : la requête est refusée (429)."""
+
+    def __init__(self, queue, reason, retry_after):
+        super().__init__(queue, reason)
+        self.queue = queue
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Queue:
+    __slots__ = ("name", "priority", "max_waiting", "max_active", "timeout",
+                 "waiting", "active", "service_s")
+
+    def __init__(self, name, priority, max_waiting, max_active, timeout):
+        self.name = name
+        self.priority = priority
+        self.max_waiting = max_waiting
+        self.max_active = max_active
+        self.timeout = timeout
+        self.waiting = 0
+        self.active = 0
+        self.service_s = 5.0  # moyenne glissante du temps de service (estimation du Retry-After)
+
+
+class AdmissionController:
+    """Slots LLM partagés entre files bornées, attribués par priorité."""
+
+    def __init__(self, slots, queues):
+        self.slots = slots
+        self.active = 0
+        self.queues = {name: _Queue(name, *config) for name, config in queues.items()}
+        self._waiters = []  # [(priorité, ordre d'arrivée, file)] des requêtes en attente
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def _next_waiter(self):
+        """Première requête en attente (par priorité) dont la file a encore droit à un slot."""
+        for waiter in sorted(self._waiters):
+            if self.queues[waiter[2]].active < self.queues[waiter[2]].max_active:
+                return waiter
+        return None
+
+    def retry_after(self, queue):
+        """Secondes estimées avant qu'une nouvelle requête de la file soit servie."""
+        ahead = sum(1 for w in self._waiters if w[0] <= queue.priority) + 1
+        slots = max(1, min(self.slots, queue.max_active))
+        return max(1, math.ceil(queue.service_s * ahead / slots))
+
+    def acquire(self, name):
+        """
+        Attend un slot pour la file `name`.
+
+        Returns:
+            secondes d'attente
+        Raises:
+            Overloaded si la file est pleine ou si le timeout expire
+        """
+        queue = self.queues[name]
+        start = time.perf_counter()
+        with self._cond:
+            if queue.waiting >= queue.max_waiting:
+                self._reject(queue, "queue_full")
+            waiter = (queue.priority, next(self._order), name)
+            self._waiters.append(waiter)
+            queue.waiting += 1
+            self._publish(queue)
+            try:
+                deadline = start + queue.timeout
+                while not (self.active < self.slots and self._next_waiter() == waiter):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._waiters.remove(waiter)
+                        self._cond.notify_all()
+                        self._reject(queue, "timeout")
+                    self._cond.wait(remaining)
+                self._waiters.remove(waiter)
+            finally:
+                queue.waiting -= 1
+                self._publish(queue)
+            queue.active += 1
+            self.active += 1
+            self._publish(queue)
+        waited = time.perf_counter() - start
+        metrics.observe_admission_wait(name, waited)
+        return waited
+
+    def release(self, name, service_s):
+        queue = self.queues[name]
+        with self._cond:
+            queue.active -= 1
+            self.active -= 1
+            queue.service_s = 0.8 * queue.service_s + 0.2 * service_s
+            self._publish(queue)
+            self._cond.notify_all()
+
+    def _reject(self, queue, reason):
+        retry_after = self.retry_after(queue)
+        metrics.record_admission_rejected(queue.name, reason)
+        raise Overloaded(queue.name, reason, retry_after)
+
+    def _publish(self, queue):
+        metrics.set_admission_queue(queue.name, queue.waiting, queue.active)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "active": self.active,
+                "queues": {
+                    name: {
+                        "priority": q.priority,
+                        "waiting": q.waiting,
+                        "max_waiting": q.max_waiting,
+                        "active": q.active,
+                        "max_active": q.max_active,
+                        "timeout_s": q.timeout,
+                        "avg_service_s": round(q.service_s, 3),
+                    }
+                    for name, q in self.queues.items()
+                },
+            }
+
+
+def create_controller():
+    """AdmissionController configuré par les variables d'environnement (None si désactivé)."""
+    if os.getenv("ADMISSION_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    slots = int(os.getenv("ADMISSION_SLOTS", "8"))
+    queues = {}
+    for name, (priority, max_waiting, share, timeout) in QUEUES.items():
+        prefix = f"ADMISSION_{name.upper()}_"
+        queues[name] = (
+            priority,
+            int(os.getenv(prefix + "QUEUE", str(max_waiting))),
+            int(os.getenv(prefix + "MAX_ACTIVE", str(max(1, int(slots * share))))),
+            float(os.getenv(prefix + "TIMEOUT_S", str(timeout))),
+        )
+    return AdmissionController(slots, queues)
+
+
+CONTROLLER = create_controller()
+
+
+@contextmanager
+def slot(name):
+    """
+    Slot de la file `name` autour d'un appel LLM, hors décorateur de vue
+    (génération d'un batch, du quiz, en arrière-plan) ; lève Overloaded.
+    """
+    if CONTROLLER is None:
+        yield
+        return
+    tracing.record("admission_wait", CONTROLLER.acquire(name))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CONTROLLER.release(name, time.perf_counter() - start)
+
+
+def admit(name):
+    """
+    Décorateur de vue : la requête attend un slot de la file `name` avant de s'exécuter.
+    Une réponse streamée garde son slot jusqu'à la fin du flux.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if CONTROLLER is None:
+                return view(*args, **kwargs)
+            waited = CONTROLLER.acquire(name)
+            tracing.record("admission_wait", waited)
+            start = time.perf_counter()
+
+            def release():
+                CONTROLLER.release(name, time.perf_counter() - start)
+
+            try:
+                result = view(*args, **kwargs)
+            except BaseException:
+                release()
+                raise
+            if isinstance(result, Response) and result.is_streamed:
+                result.call_on_close(release)
+            else:
+                release()
+            return result
+        return wrapper
+    return decorator
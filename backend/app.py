@@ -1,180 +1,384 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import pdfplumber
+import contextvars
+import functools
+import hmac
+import json
 import uuid
-from groq import Groq
 import os
-from sentence_transformers import SentenceTransformer
-import faiss
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 from dotenv import load_dotenv
 
+import admission
+import metrics
+import models
+import pdf_extract
+import quiz_bank
+import retrieval
+import snapshot
+import tracing
+from batching import create_batcher
+from chunking import chunk_spans
+from session_cache import create_session_cache
+from reembed import create_reembedder, start_on_boot
+from kb_collections import (
+    DEFAULT_COLLECTION,
+    CollectionBusy,
+    CollectionExists,
+    CollectionNotFound,
+    EmbeddingModelChanged,
+    InvalidCollectionName,
+    create_manager,
+    validate_name,
+)
+
 # modèle d'embeddings
 #modèle de Sentence Transformers (HuggingFace)
 #4️⃣ RETRIEVAL – Récupérer les passages pertinents
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# -> chargé paresseusement par models.get_embedder() (torch n'est pas importé au démarrage)
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-client = Groq()
-
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Server-Timing", "X-Request-Id", "X-Trace", "X-Profile-File"])
 
 # ====== STOCKAGE DES SOURCES PDF ======
-SOURCES = []
+# Une collection = index FAISS + sources + chunks (offsets) + texte compressé,
+# persistée dans KB_DIR et chargée à la demande (cf. kb_collections.py).
+# Le modèle d'embedding et la dimension sont enregistrés avec chaque index.
+COLLECTIONS = create_manager()
+# Ré-encodage en arrière-plan quand EMBEDDING_MODEL change (cf. reembed.py)
+REEMBEDDER = create_reembedder(COLLECTIONS)
+
+# Paramètres de chunking par défaut (surchargeables à l'upload)
+CHUNK_MAX_WORDS = int(os.getenv("CHUNK_MAX_WORDS", "300"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("CHUNK_OVERLAP_WORDS", "0"))
+
+# Embedding + recherche des questions /ask, regroupés en micro-batches
+search_question = create_batcher()
+
+def request_collection_name():
+    """Collection demandée : champ "collection" du JSON, du formulaire ou de l'URL."""
+    data = request.get_json(silent=True) or {}
+    name = (
+        (data.get("collection") if isinstance(data, dict) else None)
+        or request.form.get("collection")
+        or request.args.get("collection")
+        or DEFAULT_COLLECTION
+    )
+    return validate_name(name)
+
+
+def with_collection(create=False):
+    """
+    Passe la collection de la requête à la vue (premier argument).
+    La collection par défaut existe toujours ; les autres sont créées à l'upload.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            name = request_collection_name()
+            with COLLECTIONS.use(name, create=create or name == DEFAULT_COLLECTION) as collection:
+                return view(collection, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@app.errorhandler(CollectionNotFound)
+def collection_not_found(e):
+    return {"error": f"Unknown collection: {e.args[0]}"}, 404
+
+
+@app.errorhandler(InvalidCollectionName)
+def invalid_collection_name(e):
+    return {"error": str(e)}, 400
+
+
+@app.errorhandler(admission.Overloaded)
+def overloaded(e):
+    # Refus immédiat plutôt qu'un thread bloqué derrière des appels LLM lents
+    print(f"🚦 Requête refusée ({e.queue}: {e.reason}), Retry-After {e.retry_after}s")
+    return (
+        {"error": "Server busy, retry later", "queue": e.queue, "reason": e.reason},
+        429,
+        {"Retry-After": str(e.retry_after)},
+    )
 
-# Initialisation de l'index FAISS global
-dimension = 384
-index = faiss.IndexFlatL2(dimension)
 
-# ====== VECTOR_DB - Structure améliorée ======
-CHUNKS_METADATA = []  # [{source_id, chunk_text, chunk_index}]
+def update_index_metrics():
+    # Calculé au scrape : les collections changent aussi hors des routes
+    # (chargement paresseux, éviction, ré-encodage, suppression)
+    totals = COLLECTIONS.totals()
+    metrics.set_index_stats(totals["vectors"], totals["chunks"], totals["sources"])
+    metrics.set_text_store_stats(totals["text_chars"], totals["text_compressed_bytes"])
 
-def call_llm(prompt: str) -> str:
-    """Appel Groq LLM avec le prompt complet."""
-    completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[{"role": "user", "content": prompt}],
-        max_completion_tokens=800,
-        temperature=0.3,
-    )
-    return completion.choices[0].message.content
 
-#Prend une liste d’IDs de sources PDF.Combine le texte complet de toutes ces sources.Renvoie le texte combiné et les noms des sources.
+def chunk_ref(chunk):
+    """Provenance d'un chunk renvoyée au client (source + pages)."""
+    return {
+        "source_id": chunk["source_id"],
+        "page_start": chunk.get("page_start"),
+        "page_end": chunk.get("page_end"),
+        "start": chunk["start"],
+        "end": chunk["end"],
+    }
 
-def get_combined_text_from_sources(selected_ids):
-    """Récupère le texte combiné de toutes les sources sélectionnées."""
-    combined_text = ""
-    source_names = []
-    
-    for s in SOURCES:
-        if s["id"] in selected_ids:
-            combined_text += s.get("text", "") + "\n\n"
-            source_names.append(s["name"])
-    
-    return combined_text.strip(), source_names
-
-#Divise le texte en morceaux (chunks) de max 300 mots.Essayez de respecter les paragraphes, 
-# puis les phrases si un paragraphe est trop long.
-# Chaque chunk sera utilisé pour générer un embedding
-def smart_chunk_text(text, max_words=300):
-    """Divise le texte en chunks intelligents (par paragraphes/phrases)."""
-    # Diviser par paragraphes d'abord
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
-    
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
-            
-        words = para.split()
-        word_count = len(words)
-        
-        # Si le paragraphe est trop long, le diviser par phrases
-        if word_count > max_words:
-            sentences = para.replace('!', '.').replace('?', '.').split('.')
-            for sent in sentences:
-                sent = sent.strip()
-                if sent:
-                    sent_words = len(sent.split())
-                    if current_word_count + sent_words > max_words and current_chunk:
-                        chunks.append(' '.join(current_chunk))
-                        current_chunk = [sent]
-                        current_word_count = sent_words
-                    else:
-                        current_chunk.append(sent)
-                        current_word_count += sent_words
-        else:
-            # Ajouter le paragraphe entier
-            if current_word_count + word_count > max_words and current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [para]
-                current_word_count = word_count
-            else:
-                current_chunk.append(para)
-                current_word_count += word_count
-    
-    # Ajouter le dernier chunk
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
 
+def call_llm(prompt: str) -> str:
+    """Appel Groq LLM avec le prompt complet."""
+    with tracing.stage("llm_call"):
+        completion = models.get_llm_client().chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=[{"role": "user", "content": prompt}],
+            max_completion_tokens=800,
+            temperature=0.3,
+        )
+    return completion.choices[0].message.content
 
 # ---------- 1. UPLOAD PDF ----------
 @app.post("/upload_pdf")
-def upload_pdf():
-    global index, CHUNKS_METADATA
-    
+@with_collection(create=True)
+def upload_pdf(collection):
     file = request.files.get("file")
     if not file:
         return {"error": "No file provided"}, 400
 
     try:
-        with pdfplumber.open(file) as pdf:
-            text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
+        max_words = int(request.form.get("max_words", CHUNK_MAX_WORDS))
+        overlap_words = int(request.form.get("overlap_words", CHUNK_OVERLAP_WORDS))
+    except ValueError:
+        return {"error": "max_words and overlap_words must be integers"}, 400
+    if max_words < 1 or overlap_words < 0:
+        return {"error": "Invalid chunking parameters"}, 400
+
+    # Moteur d'extraction : champ "engine" de l'upload, sinon PDF_ENGINE (auto par défaut)
+    engine = request.form.get("engine")
+    try:
+        pdf_extract.resolve_engine(engine or os.getenv("PDF_ENGINE", "auto"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    try:
+        with tracing.stage("pdf_extraction"):
+            # Pages en cache par hash du fichier : un nouvel essai ne ré-extrait rien
+            page_texts, extraction = pdf_extract.extract_pages(file.read(), engine)
     except Exception as e:
         return {"error": f"Failed to read PDF: {e}"}, 500
 
-    # Utiliser le chunking intelligent
-    chunks = smart_chunk_text(text, max_words=300)
+    pages = []
+    page_starts = []  # offset de début de chaque page dans le texte
+    offset = 0
+    for page_text in page_texts:
+        page_text += "\n"
+        page_starts.append(offset)
+        pages.append(page_text)
+        offset += len(page_text)
+    text = "".join(pages)
+
+    # Chunking en une passe : chaque chunk = offsets + pages dans `text`
+    with tracing.stage("chunking"):
+        spans = chunk_spans(text, max_words, overlap_words, page_starts)
     
-    if not chunks:
+    if not spans:
         return {"error": "No text extracted from PDF"}, 400
+    chunks = [text[c["start"]:c["end"]] for c in spans]
 
-    # Generate embeddings depuis les chaunks genere du texte des pdfs
-    embeddings = embedder.encode(chunks)
-#index.add() ajoute ces vecteurs dans l’index FAISS.
-    # Add to global FAISS index
-    start_idx = len(CHUNKS_METADATA)
-    index.add(np.array(embeddings))
-
-    # Store source info
     source_id = str(uuid.uuid4())
-    SOURCES.append({
+    source = {
         "id": source_id,
         "name": file.filename,
-        "text": text,
+        "pages": len(page_starts),
         "chunk_count": len(chunks)
-    })
-
-    # Store chunk metadata
-    for i, chunk in enumerate(chunks):
-        CHUNKS_METADATA.append({
-            "source_id": source_id,
-            "chunk_text": chunk,
-            "global_index": start_idx + i
-        })
-
-    print(f"✅ PDF uploaded: {file.filename} - {len(chunks)} chunks created")
-    return {"id": source_id, "name": file.filename, "chunks": len(chunks)}
+    }
+    # Modèle de la collection (l'ancien tant qu'un ré-encodage n'a pas été substitué) ;
+    # une collection vide prend le modèle configuré
+    model = collection.embedding_model if collection.chunks else models.embedding_model()
+    for attempt in range(2):
+        # Generate embeddings depuis les chaunks genere du texte des pdfs
+        with tracing.stage("embedding"):
+            embeddings = models.get_embedder(model).encode(chunks)
+#index.add() ajoute ces vecteurs dans l’index FAISS.
+        # Add to the collection's FAISS index (+ chunks en offsets, texte compressé, écriture disque)
+        try:
+            collection.add_source(source, text, spans, np.asarray(embeddings, dtype=np.float32), model)
+            break
+        except EmbeddingModelChanged as e:
+            # Ré-encodage substitué pendant l'upload : on ré-encode avec le nouveau modèle
+            model = e.args[0]
+    else:
+        return {"error": "Embedding model changed during upload, retry"}, 409
+
+    print(f"✅ PDF uploaded: {file.filename} - {len(chunks)} chunks created ({collection.name}, "
+          f"extraction {extraction['engine']} en {extraction['seconds']}s)")
+    return {
+        "id": source_id,
+        "name": file.filename,
+        "chunks": len(chunks),
+        "pages": len(page_starts),
+        "collection": collection.name,
+        "extraction": {
+            "engine": extraction["engine"],
+            "pages_by_engine": extraction["pages_by_engine"],
+            "cached_pages": extraction["cached_pages"],
+        },
+    }
 
 
 # ---------- 2. LIST SOURCES ----------
 @app.get("/list_sources")
-def list_sources():
+@with_collection()
+def list_sources(collection):
     return jsonify([{
         "id": s["id"], 
         "name": s["name"],
         "chunks": s.get("chunk_count", 0)
-    } for s in SOURCES])
+    } for s in collection.sources])
+
+
+@app.get("/collections")
+def list_collections():
+    # Collections sur disque, avec taille mémoire pour celles qui sont chargées
+    return jsonify(COLLECTIONS.info())
 
 
 # ---------- 3. ASK QUESTION (QA) ----------
+# Nombre max de questions par appel /ask_batch et de générations LLM simultanées
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+ASK_BATCH_LLM_CONCURRENCY = int(os.getenv("ASK_BATCH_LLM_CONCURRENCY", "4"))
+
+
+def select_chunks(collection, selected_ids):
+    """Chunks de toutes les sources sélectionnées."""
+    with tracing.stage("metadata_scan"):
+        return collection.select_chunks(selected_ids)
+
+
+def retrieve_chunks(valid_chunks, neighbors, limit=8):
+    """Voisins FAISS qui appartiennent aux sources sélectionnées (ordre de pertinence)."""
+    retrieved = []
+    with tracing.stage("metadata_scan"):
+        by_index = {c["global_index"]: c for c in valid_chunks}
+        for idx in neighbors:
+            chunk = by_index.get(int(idx))
+            if chunk:
+                retrieved.append(chunk)
+            if len(retrieved) >= limit:
+                break
+    return retrieved
+
+
+# k adaptatif + MMR sur les candidats FAISS (cf. retrieval.py)
+RETRIEVAL = retrieval.load_config()
+
+
+def pick_chunks(space, question_vector, candidates, vectors=None):
+    """
+    Chunks envoyés au LLM parmi les candidats (ordre FAISS) + explication des choix.
+    `space` : espace vectoriel (index + modèle) de la recherche, cf. kb_collections.VectorSpace.
+    `vectors` : vecteurs des candidats s'ils sont déjà connus (cache de session).
+
+    Returns:
+        (chunks retenus, rapport [{source_id, pages, score, decision, reason, rank}] ou None)
+    """
+    if not candidates:
+        return [], None
+    if not RETRIEVAL["adaptive"]:
+        if vectors is not None:
+            # Candidats d'une question précédente : re-tri selon la nouvelle question
+            candidates = [candidates[p] for p in retrieval.rank(question_vector, vectors)]
+        return candidates[:5], None
+    with tracing.stage("rerank"):
+        if vectors is None:
+            vectors = space.vectors([c["global_index"] for c in candidates])
+        selected, report = retrieval.select(question_vector, vectors, RETRIEVAL)
+    for entry in report:
+        entry.update(chunk_ref(candidates[entry.pop("position")]))
+        entry["reason"] = retrieval.REASONS[entry["decision"]]
+    return [candidates[p] for p in selected], report
+
+
+# Candidats récents par conversation, pour les questions de suivi (cf. session_cache.py)
+SESSIONS = create_session_cache()
+
+
+def session_retrieve(collection, conversation_id, question, selected_ids):
+    """
+    Candidats d'une question posée dans une conversation. La question est encodée
+    par le micro-batching (encodage seul) ; si elle reste proche de celle qui a
+    rempli le cache de la session, ses candidats sont re-scorés sans recherche,
+    sinon une recherche complète remplace le cache de la session.
+
+    Returns:
+        (candidats, vecteurs des candidats, vecteur de la question, espace vectoriel, infos de session)
+    """
+    info = {"conversation_id": conversation_id, "cache": "miss", "similarity": None}
+    space = collection.space
+    valid_chunks = select_chunks(collection, selected_ids)
+    if not valid_chunks:
+        return [], None, None, space, info
+
+    # Plus de candidats qu'une recherche simple : ils servent aussi aux questions suivantes
+    k = min(max(20, SESSIONS.max_candidates), len(valid_chunks))
+    question_vector, _, _, timings = search_question(
+        question, k, models.get_embedder(space.model).encode
+    )
+    for stage_name, seconds in timings.items():
+        tracing.record(stage_name, seconds)
+
+    candidates, vectors, similarity = SESSIONS.lookup(
+        conversation_id, collection, space, selected_ids, question_vector
+    )
+    info.update(
+        cache="hit" if candidates is not None else "miss",
+        similarity=None if similarity is None else round(similarity, 4),
+    )
+    if candidates is not None:
+        return candidates, vectors, question_vector, space, info
+
+    with tracing.stage("vector_search"):
+        _, neighbors = space.search(question_vector[None, :], k)
+    candidates = retrieve_chunks(valid_chunks, neighbors[0], limit=k)
+    vectors = space.vectors([c["global_index"] for c in candidates]) if candidates else None
+    if candidates:
+        SESSIONS.store(conversation_id, collection, space, selected_ids, question_vector,
+                       candidates, vectors)
+    return candidates, vectors, question_vector, space, info
+
+
+def build_qa_prompt(question, retrieved_chunks):
+    with tracing.stage("prompt_build"):
+        context = "\n\n---\n\n".join(retrieved_chunks)
+    
+        return f"""Tu es un assistant qui répond aux questions en te basant UNIQUEMENT sur le contexte fourni.
+
+CONTEXTE (provenant de toutes les sources sélectionnées) :
+{context}
+
+QUESTION :
+{question}
+
+INSTRUCTIONS :
+- Utilise TOUTES les informations pertinentes du contexte ci-dessus
+- Si la réponse se trouve dans plusieurs parties du contexte, synthétise-les
+- Si l'information n'est pas dans le contexte, dis-le clairement
+- Réponds en français
+
+RÉPONSE :
+"""
+
+
 # ---------- 3. ASK QUESTION (QA) - VERSION CORRIGÉE ----------
 @app.post("/ask")
-def ask():
+@admission.admit("ask")
+@with_collection()
+def ask(collection):
     data = request.json or {}
     question = data.get("question", "")
     selected_ids = data.get("selected_ids", [])
+    # Optionnel : identifiant de conversation pour réutiliser les candidats des questions précédentes
+    conversation_id = data.get("conversation_id")
 
     if not question:
         return {"error": "Question is required"}, 400
@@ -185,41 +389,50 @@ def ask():
     print(f"\n🔍 Question: {question}")
     print(f"📚 Sources sélectionnées: {len(selected_ids)}")
 
-    # Filter chunks from ALL selected sources
-    valid_chunks = [
-        chunk for chunk in CHUNKS_METADATA 
-        if chunk["source_id"] in selected_ids
-    ]
+    session = None
+    candidate_vectors = None
+    if conversation_id:
+        candidates, candidate_vectors, question_embedding, space, session = session_retrieve(
+            collection, str(conversation_id), question, selected_ids
+        )
+        print(f"💬 Conversation {conversation_id}: cache {session['cache']}")
+        if not candidates:
+            print("⚠️  Aucun chunk disponible pour ces sources")
+            return {
+                "answer": "No content found in selected sources.",
+                "chunks": [],
+                "session": session
+            }
+    else:
+        # Filter chunks from ALL selected sources
+        valid_chunks = select_chunks(collection, selected_ids)
+
+        if not valid_chunks:
+            print("⚠️  Aucun chunk disponible pour ces sources")
+            return {
+                "answer": "No content found in selected sources.",
+                "chunks": []  # ← IMPORTANT: retourner une liste vide
+            }
+
+        print(f"✅ Chunks disponibles: {len(valid_chunks)}")
+
+        # Vectorize the question + Search in FAISS
+        # (micro-batché avec les autres /ask concurrents, cf. batching.py)
+        k = min(20, len(valid_chunks))
+        # Modèle et index lus ensemble : un ré-encodage substitué entre-temps ne les mélange pas
+        space = collection.space
+        question_embedding, distances, neighbors, timings = search_question(
+            question, k, models.get_embedder(space.model).encode, space.search
+        )
+        for stage_name, seconds in timings.items():
+            tracing.record(stage_name, seconds)
 
-    if not valid_chunks:
-        print("⚠️  Aucun chunk disponible pour ces sources")
-        return {
-            "answer": "No content found in selected sources.",
-            "chunks": []  # ← IMPORTANT: retourner une liste vide
-        }
+        # Candidats des sources sélectionnées, dans l'ordre FAISS
+        candidates = retrieve_chunks(valid_chunks, neighbors, limit=k)
 
-    print(f"✅ Chunks disponibles: {len(valid_chunks)}")
-
-    # Vectorize the question
-    question_embedding = embedder.encode([question])
-
-    # Search in FAISS
-    k = min(20, len(valid_chunks))
-    distances, neighbors = index.search(question_embedding, k)
-
-    # Retrieve relevant chunks
-    retrieved_chunks = []
-    for idx, dist in zip(neighbors[0], distances[0]):
-        matching_chunks = [
-            c for c in valid_chunks 
-            if c["global_index"] == idx
-        ]
-        
-        if matching_chunks:
-            retrieved_chunks.append(matching_chunks[0]["chunk_text"])
-        
-        if len(retrieved_chunks) >= 8:
-            break
+    # Retrieve relevant chunks : k adaptatif + MMR sur les candidats
+    retrieved, selection = pick_chunks(space, question_embedding, candidates, candidate_vectors)
+    retrieved_chunks = [collection.chunk_text(c) for c in retrieved]
 
     if not retrieved_chunks:
         print("⚠️  Aucun chunk pertinent trouvé")
@@ -231,24 +444,7 @@ def ask():
     print(f"📄 Chunks récupérés: {len(retrieved_chunks)}")
 
     # Build prompt
-    context = "\n\n---\n\n".join(retrieved_chunks[:5])
-    
-    prompt = f"""Tu es un assistant qui répond aux questions en te basant UNIQUEMENT sur le contexte fourni.
-
-CONTEXTE (provenant de toutes les sources sélectionnées) :
-{context}
-
-QUESTION :
-{question}
-
-INSTRUCTIONS :
-- Utilise TOUTES les informations pertinentes du contexte ci-dessus
-- Si la réponse se trouve dans plusieurs parties du contexte, synthétise-les
-- Si l'information n'est pas dans le contexte, dis-le clairement
-- Réponds en français
-
-RÉPONSE :
-"""
+    prompt = build_qa_prompt(question, retrieved_chunks)
 
     # Call LLM
     answer = call_llm(prompt)
@@ -257,12 +453,118 @@ RÉPONSE :
     # ← CORRECTION CRITIQUE: Retourner les chunks comme liste de strings
     return {
         "answer": answer,
-        "chunks": retrieved_chunks  # Liste de strings, pas de dicts
+        "chunks": retrieved_chunks,  # Liste de strings, pas de dicts
+        "chunk_refs": [chunk_ref(c) for c in retrieved],  # même ordre que "chunks"
+        "retrieval": {"adaptive": RETRIEVAL["adaptive"], "candidates": selection},
+        **({"session": session} if session else {})
     }
 
+
+# ---------- 3b. ASK BATCH (plusieurs questions, un seul appel) ----------
+@app.post("/ask_batch")
+@with_collection()
+def ask_batch(collection):
+    """
+    Body: {"questions": [...], "selected_ids": [...], "stream": false}
+    Un seul encode + un seul index.search pour toutes les questions,
+    puis les générations LLM en parallèle (ASK_BATCH_LLM_CONCURRENCY),
+    chacune dans son propre slot d'admission (file ask_batch).
+    - stream=false : {"results": [...]} dans l'ordre des questions
+    - stream=true  : NDJSON, une ligne {"index", "question", "answer", "chunks"} par réponse terminée
+    """
+    data = request.json or {}
+    questions = data.get("questions", [])
+    selected_ids = data.get("selected_ids", [])
+
+    if not isinstance(questions, list) or not questions or not all(
+        isinstance(q, str) and q.strip() for q in questions
+    ):
+        return {"error": "questions must be a non-empty list of strings"}, 400
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        return {"error": f"Too many questions (max {ASK_BATCH_MAX_QUESTIONS})"}, 400
+    if not selected_ids:
+        return {"error": "No sources selected"}, 400
+
+    print(f"\n🔍 Batch de {len(questions)} question(s) sur {len(selected_ids)} source(s)")
+
+    valid_chunks = select_chunks(collection, selected_ids)
+
+    def empty_result(i, answer):
+        return {"index": i, "question": questions[i], "answer": answer, "chunks": []}
+
+    if not valid_chunks:
+        results = [empty_result(i, "No content found in selected sources.") for i in range(len(questions))]
+        tasks = []
+    else:
+        # Une seule passe embedding + recherche pour tout le batch
+        k = min(20, len(valid_chunks))
+        space = collection.space
+        with tracing.stage("embedding"):
+            question_embeddings = np.asarray(
+                models.get_embedder(space.model).encode(questions), dtype=np.float32
+            )
+        with tracing.stage("vector_search"):
+            distances, neighbors = space.search(question_embeddings, k)
+
+        results = [None] * len(questions)
+        tasks = []  # [(index, prompt, chunks)]
+        for i, question in enumerate(questions):
+            candidates = retrieve_chunks(valid_chunks, neighbors[i], limit=k)
+            retrieved, selection = pick_chunks(space, question_embeddings[i], candidates)
+            if not retrieved:
+                results[i] = empty_result(i, "No relevant information found in selected sources.")
+            else:
+                retrieved_chunks = [collection.chunk_text(c) for c in retrieved]
+                tasks.append((i, build_qa_prompt(question, retrieved_chunks), retrieved,
+                              retrieved_chunks, selection))
+
+    def generate(task):
+        i, prompt, retrieved, retrieved_chunks, selection = task
+        result = {
+            "index": i,
+            "question": questions[i],
+            "chunks": retrieved_chunks,
+            "chunk_refs": [chunk_ref(c) for c in retrieved],
+            "retrieval": {"adaptive": RETRIEVAL["adaptive"], "candidates": selection},
+        }
+        try:
+            with admission.slot("ask_batch"):
+                result["answer"] = call_llm(prompt)
+        except admission.Overloaded as e:
+            result.update(error="Server busy, retry later", retry_after=e.retry_after)
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    def run_generations():
+        """Générations LLM bornées ; renvoie les résultats au fil de l'eau."""
+        workers = max(1, min(ASK_BATCH_LLM_CONCURRENCY, len(tasks)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Le contexte (trace de la requête) suit chaque génération
+            futures = [pool.submit(contextvars.copy_context().run, generate, t) for t in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+    if data.get("stream"):
+        def ndjson():
+            for result in results:
+                if result is not None:
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            for result in run_generations():
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+            print(f"✅ Batch terminé ({len(questions)} question(s))\n")
+        return Response(stream_with_context(ndjson()), mimetype="application/x-ndjson")
+
+    for result in run_generations():
+        results[result["index"]] = result
+    print(f"✅ Batch terminé ({len(questions)} question(s))\n")
+    return {"results": results}
+
 # ---------- 4. SUMMARY (Résumé) ----------
 @app.post("/summarize")
-def summarize():
+@admission.admit("summarize")
+@with_collection()
+def summarize(collection):
     data = request.json or {}
     selected_ids = data.get("selected_ids", [])
 
@@ -272,16 +574,13 @@ def summarize():
     print(f"\n📝 Résumé demandé pour {len(selected_ids)} source(s)")
 
     # Get ALL chunks from selected sources
-    selected_chunks = [
-        chunk for chunk in CHUNKS_METADATA 
-        if chunk["source_id"] in selected_ids
-    ]
+    selected_chunks = select_chunks(collection, selected_ids)
 
     if not selected_chunks:
         return {"error": "No content found in selected sources"}, 400
 
     # Get source names
-    source_names = [s["name"] for s in SOURCES if s["id"] in selected_ids]
+    source_names = [s["name"] for s in collection.sources if s["id"] in selected_ids]
     print(f"📚 Sources: {', '.join(source_names)}")
     print(f"📦 Total chunks: {len(selected_chunks)}")
 
@@ -291,39 +590,38 @@ def summarize():
         sid = chunk["source_id"]
         if sid not in chunks_per_source:
             chunks_per_source[sid] = []
-        chunks_per_source[sid].append(chunk["chunk_text"])
+        chunks_per_source[sid].append(chunk)
 
     # Calculer combien de chunks prendre par source pour rester sous la limite
     max_total_chars = 10000
     num_sources = len(chunks_per_source)
     max_chars_per_source = max_total_chars // num_sources
-    
+
     # Construire le texte en prenant des chunks de chaque source
     combined_chunks = []
-    
+
     for sid, chunks in chunks_per_source.items():
-        source_name = next(s["name"] for s in SOURCES if s["id"] == sid)
+        source_name = collection.source_name(sid)
         combined_chunks.append(f"\n=== Document: {source_name} ===\n")
-        
+    
         # Ajouter des chunks jusqu'à atteindre la limite par source
         current_chars = 0
         chunks_added = 0
         for chunk in chunks:
-            chunk_text = chunk.strip()
+            # Texte relu depuis le store seulement pour les chunks retenus
+            chunk_text = collection.chunk_text(chunk).strip()
             if current_chars + len(chunk_text) < max_chars_per_source:
                 combined_chunks.append(chunk_text)
                 current_chars += len(chunk_text)
                 chunks_added += 1
             else:
                 break
-        
-        print(f"  → {source_name}: {chunks_added} chunks, {current_chars} chars")
-    
-    combined_text = "\n\n".join(combined_chunks)
     
-    print(f"📄 Texte final: {len(combined_text)} caractères")
+        print(f"  → {source_name}: {chunks_added} chunks, {current_chars} chars")
 
-    prompt = f"""Tu dois résumer le contenu suivant qui provient de {len(source_names)} document(s) : {', '.join(source_names)}
+    with tracing.stage("prompt_build"):
+        combined_text = "\n\n".join(combined_chunks)
+        prompt = f"""Tu dois résumer le contenu suivant qui provient de {len(source_names)} document(s) : {', '.join(source_names)}
 
 CONTENU À RÉSUMER :
 {combined_text}
@@ -338,14 +636,33 @@ INSTRUCTIONS :
 RÉSUMÉ :
 """
 
+    print(f"📄 Texte final: {len(combined_text)} caractères")
     answer = call_llm(prompt)
     print(f"✅ Résumé généré\n")
     return {"result": answer}
 
 
 # ---------- 5. QUIZ (QCM) ----------
+def call_quiz_llm(prompt: str) -> str:
+    """Appel LLM du quiz : plus de tokens qu'une réponse (QCM complet)."""
+    print("🤖 Génération du quiz...")
+    with tracing.stage("llm_call"):
+        completion = models.get_llm_client().chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=[{"role": "user", "content": prompt}],
+            max_completion_tokens=1500,  # Plus de tokens pour le quiz
+            temperature=0.3,  # Un peu de créativité pour les mauvaises réponses
+        )
+    return completion.choices[0].message.content
+
+
+# Questions validées par source, servies sans LLM quand la banque suffit (cf. quiz_bank.py)
+QUIZ_BANK = quiz_bank.create_question_bank(COLLECTIONS, call_quiz_llm)
+
+
 @app.post("/quiz")
-def quiz():
+@with_collection()
+def quiz(collection):
     data = request.json or {}
     selected_ids = data.get("selected_ids", [])
 
@@ -355,112 +672,38 @@ def quiz():
     print(f"\n🎯 Quiz demandé pour {len(selected_ids)} source(s)")
 
     # Get ALL chunks from selected sources
-    selected_chunks = [
-        chunk for chunk in CHUNKS_METADATA 
-        if chunk["source_id"] in selected_ids
-    ]
+    selected_chunks = select_chunks(collection, selected_ids)
 
     if not selected_chunks:
         return {"error": "No content found in selected sources"}, 400
 
     # Get source names
-    source_names = [s["name"] for s in SOURCES if s["id"] in selected_ids]
+    source_names = [s["name"] for s in collection.sources if s["id"] in selected_ids]
     print(f"📚 Sources: {', '.join(source_names)}")
     print(f"📦 Total chunks: {len(selected_chunks)}")
 
-    # Prendre des chunks de CHAQUE source pour le quiz
-    chunks_per_source = {}
-    for chunk in selected_chunks:
-        sid = chunk["source_id"]
-        if sid not in chunks_per_source:
-            chunks_per_source[sid] = []
-        chunks_per_source[sid].append(chunk["chunk_text"])
-
-    # Calculer combien de chunks prendre par source
-    max_total_chars = 12000  # Augmenté pour avoir plus de contexte
-    num_sources = len(chunks_per_source)
-    max_chars_per_source = max_total_chars // num_sources
-    
-    # Construire le texte en incluant des chunks de chaque source
-    combined_chunks = []
-    
-    for sid, chunks in chunks_per_source.items():
-        source_name = next(s["name"] for s in SOURCES if s["id"] == sid)
-        combined_chunks.append(f"\n{'='*60}")
-        combined_chunks.append(f"DOCUMENT SOURCE: {source_name}")
-        combined_chunks.append(f"{'='*60}\n")
-        
-        # Ajouter des chunks jusqu'à atteindre la limite par source
-        current_chars = 0
-        chunks_added = 0
-        for chunk in chunks:
-            chunk_text = chunk.strip()
-            if current_chars + len(chunk_text) < max_chars_per_source:
-                combined_chunks.append(f"[Section {chunks_added + 1}]")
-                combined_chunks.append(chunk_text)
-                combined_chunks.append("")  # Ligne vide pour séparation
-                current_chars += len(chunk_text)
-                chunks_added += 1
-            else:
-                break
-        
-        print(f"  → {source_name}: {chunks_added} chunks, {current_chars} chars")
-    
-    combined_text = "\n\n".join(combined_chunks)
-    
-    print(f"📄 Texte final: {len(combined_text)} caractères")
-
-    # Calculer le nombre de questions par source
-    questions_per_source = max(1, 5 // len(source_names))
-    total_questions = questions_per_source * len(source_names)
-    
-    prompt = f"""Tu es un expert en création de quiz. Tu dois créer un QCM basé STRICTEMENT sur le contenu suivant.
+    # Sources dans l'ordre de la collection (ids inconnus ignorés)
+    source_ids = [s["id"] for s in collection.sources if s["id"] in selected_ids]
+    # "fresh": true force une génération (sans piocher dans la banque)
+    use_bank = quiz_bank.BANK_ENABLED and not data.get("fresh")
+    count = data.get("count")
+    if count is not None and (not isinstance(count, int) or not 1 <= count <= 20):
+        return {"error": "count must be an integer between 1 and 20"}, 400
 
-RÈGLES ABSOLUES :
-1. Les questions et réponses doivent venir DIRECTEMENT du texte fourni
-2. Ne PAS inventer d'informations
-3. Vérifie que chaque réponse correcte correspond exactement à une information du texte
-4. Les mauvaises réponses doivent être plausibles mais clairement incorrectes
+    questions, info = QUIZ_BANK.quiz(collection, source_ids, use_bank, count)
+    if not questions:
+        return {"error": "Quiz generation failed (no valid question)"}, 502
 
-CONTENU SOURCE ({len(source_names)} document(s) : {', '.join(source_names)}) :
-{combined_text}
+    if info["served_from"] == "bank":
+        print(f"🏦 Quiz tiré de la banque en {info['seconds'] * 1000:.1f}ms\n")
+    else:
+        print(f"✅ Quiz généré : {len(questions)} question(s) valides en {info['attempts']} appel(s) LLM\n")
 
-INSTRUCTIONS DE GÉNÉRATION :
-- Génère exactement {total_questions} questions QCM
-- Répartis les questions équitablement entre tous les documents
-- Pour chaque question :
-  * Cite le document source
-  * Pose une question claire basée sur une information factuelle du texte
-  * Propose 4 options (A, B, C, D)
-  * UNE SEULE réponse correcte qui correspond EXACTEMENT au texte
-  * 3 réponses incorrectes mais plausibles
-  * Indique la lettre de la bonne réponse (A, B, C ou D)
-
-EXEMPLE DE FORMAT :
-1. [Document: exemple.pdf] - Quelle est la définition de X selon le document ?
-   A) Première définition incorrecte
-   B) Définition correcte tirée du texte
-   C) Deuxième définition incorrecte
-   D) Troisième définition incorrecte
-   Réponse correcte : B
-
-GÉNÈRE LE QUIZ MAINTENANT (respecte strictement le format ci-dessus) :
-"""
-
-    print("🤖 Génération du quiz...")
-    
-    # Augmenter max_tokens pour avoir un quiz complet
-    completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[{"role": "user", "content": prompt}],
-        max_completion_tokens=1500,  # Plus de tokens pour le quiz
-        temperature=0.3,  # Un peu de créativité pour les mauvaises réponses
-    )
-    answer = completion.choices[0].message.content
-    
-    print(f"✅ Quiz généré avec questions sur tous les documents\n")
-
-    return {"result": answer}
+    return {
+        "result": quiz_bank.render_quiz(questions),  # texte au format historique
+        "questions": questions,
+        "bank": {**info, "available": QUIZ_BANK.stats(collection.name)},
+    }
 
 @app.post("/transcribe")
 def transcribe():
@@ -475,11 +718,12 @@ def transcribe():
 
     try:
         # Appel Whisper Groq
-        transcript = client.audio.transcriptions.create(
-            file=open(temp_path, "rb"),
-            model="whisper-large-v3",
-            response_format="json"
-        )
+        with tracing.stage("transcription"):
+            transcript = models.get_llm_client().audio.transcriptions.create(
+                file=open(temp_path, "rb"),
+                model="whisper-large-v3",
+                response_format="json"
+            )
 
         # 🔥 Ici la vraie correction
         text = transcript.text.strip()
@@ -490,6 +734,127 @@ def transcribe():
         return {"error": str(e)}, 500
 
 
+# ---------- 6. HEALTH / READINESS ----------
+@app.get("/healthz")
+def healthz():
+    # Le process répond : aucun modèle requis
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    # Prêt quand l'embedder et le client LLM sont chargés (warmup terminé)
+    body = {"ready": models.is_ready(), "components": dict(models.STATUS)}
+    if models.ERRORS:
+        body["errors"] = dict(models.ERRORS)
+    return body, (200 if body["ready"] else 503)
+
+
+# ---------- 7. METRICS (Prometheus) ----------
+@app.get("/metrics")
+def prometheus_metrics():
+    update_index_metrics()
+    payload, content_type = metrics.render()
+    return Response(payload, mimetype=content_type)
+
+
+# ---------- 8. ADMIN (snapshots, files d'admission) ----------
+# Les endpoints /admin/* exigent l'en-tête X-Admin-Token = ADMIN_TOKEN
+# (fermés à tous si ADMIN_TOKEN n'est pas défini : ils peuvent écraser une collection)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+if not ADMIN_TOKEN:
+    print("🔒 ADMIN_TOKEN non défini : endpoints /admin/* désactivés (403)")
+
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get("X-Admin-Token", "")
+        if not ADMIN_TOKEN or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+            return {"error": "Forbidden"}, 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.get("/admin/export")
+@admin_required
+@with_collection()
+def admin_export(collection):
+    # Snapshot streamé : index + chunks + textes, sans passer par la mémoire
+    try:
+        stream = snapshot.export_collection(collection)
+    except snapshot.NothingToExport as e:
+        return {"error": f"Collection is empty, nothing to export: {e.args[0]}"}, 409
+    return Response(
+        stream,
+        mimetype="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{collection.name}.snap"'},
+    )
+
+
+@app.post("/admin/import")
+@admin_required
+def admin_import():
+    # Corps de la requête = snapshot brut, lu en flux ; ?collection=... pour renommer
+    name = request.args.get("collection")
+    if name:
+        validate_name(name)
+    overwrite = request.args.get("overwrite", "").lower() in ("1", "true", "yes")
+    try:
+        collection, manifest = snapshot.import_snapshot(COLLECTIONS, request.stream, name, overwrite)
+    except CollectionExists as e:
+        return {"error": f"Collection already exists: {e.args[0]} (use overwrite=1)"}, 409
+    except CollectionBusy as e:
+        return {"error": f"Collection in use, retry later: {e.args[0]}"}, 409
+    except (ValueError, RuntimeError) as e:  # RuntimeError : index FAISS illisible
+        return {"error": f"Invalid snapshot: {e}"}, 400
+
+    print(f"📥 Snapshot importé: {collection.name} ({manifest['chunks']} chunks)")
+    reembed = None
+    if collection.embedding_model != models.embedding_model():
+        # Snapshot d'un autre modèle : servi tel quel, ré-encodé en arrière-plan
+        # (à la suite du job en cours s'il y en a un)
+        reembed = REEMBEDDER.enqueue([collection.name])
+    return {**collection.info(), "snapshot": manifest, "reembed": reembed}
+
+
+@app.get("/admin/queues")
+@admin_required
+def admin_queues():
+    # Files d'admission : attente, slots occupés, temps de service moyen
+    if admission.CONTROLLER is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.CONTROLLER.stats()}
+
+
+@app.get("/admin/reembed")
+@admin_required
+def reembed_status():
+    # Progression du ré-encodage (chunks encodés / total par collection)
+    return {"embedding_model": models.embedding_model(), **REEMBEDDER.status()}
+
+
+@app.post("/admin/reembed")
+@admin_required
+def reembed_start():
+    # Relance le ré-encodage des collections (toutes, ou "collections": [...])
+    data = request.get_json(silent=True) or {}
+    names = data.get("collections")
+    for name in names or []:
+        validate_name(name)
+    if not REEMBEDDER.start(names):
+        return {"error": "Re-embedding already running", **REEMBEDDER.status()}, 409
+    return REEMBEDDER.status(), 202
+
+
+# Server-Timing / trace JSON / profilage à la demande sur les endpoints coûteux
+tracing.init_app(app, endpoints=["ask", "ask_batch", "upload_pdf", "summarize", "quiz", "transcribe"])
+
+# Warmup des modèles en arrière-plan (pas dans le process superviseur du reloader Flask)
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    models.start_warmup()
+    start_on_boot(REEMBEDDER)
+
 
 if __name__ == "__main__":
     app.run(port=5000, debug=True, threaded=True)
\ No newline at end of file
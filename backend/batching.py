@@ -0,0 +1,170 @@
+"""
+Micro-batching des requêtes /ask
+Les questions qui arrivent à quelques millisecondes d'intervalle sont encodées
+en un seul appel embedder.encode() puis cherchées avec un seul index.search()
+multi-requêtes. Chaque thread Flask récupère ensuite sa ligne de résultat.
+Une soumission sans `search` (encodage seul, ex: cache de session) partage
+l'encodage du batch et laisse la recherche à l'appelant.
+
+Configuration :
+    ASK_BATCHING        1 = activé (défaut), 0 = encode/search individuels
+    ASK_BATCH_MAX       questions max par batch (défaut: 32)
+    ASK_BATCH_WAIT_MS   attente max pour compléter un batch (défaut: 2 ms)
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+import metrics
+
+
+class _Request:
+    __slots__ = ("text", "k", "encode", "search", "future", "submitted")
+
+    def __init__(self, text, k, encode, search):
+        self.text = text
+        self.k = k
+        self.encode = encode
+        self.search = search
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class QueryBatcher:
+    """
+    Regroupe les couples (encode, search) concurrents.
+
+    `encode(list[str]) -> np.ndarray` et `search(vectors, k) -> (distances, ids)`
+    sont passés à chaque soumission : des requêtes visant des index différents
+    partagent le même worker mais sont cherchées séparément. Les requêtes d'un
+    même encodeur sont encodées ensemble, y compris celles sans `search`.
+    """
+
+    def __init__(self, max_batch=32, max_wait_ms=2.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name="ask-batcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def submit(self, text, k, encode, search=None):
+        """
+        Bloque jusqu'au traitement du batch contenant `text`.
+
+        Returns:
+            (query_vector, distances, ids, timings) — timings en secondes
+            {"batch_wait", "embedding", "vector_search"} ; sans `search`,
+            distances et ids valent None et "vector_search" est absent
+        """
+        self._ensure_worker()
+        request = _Request(text, k, encode, search)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Délai écoulé : on prend encore ce qui est déjà en file, sans attendre
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            metrics.observe_batch("ask", len(batch))
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.encode, []).append(request)
+            for encode, requests in groups.items():
+                self._process(encode, requests)
+
+    def _process(self, encode, requests):
+        started = time.perf_counter()
+        try:
+            vectors = np.asarray(encode([r.text for r in requests]), dtype=np.float32)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        encoded = time.perf_counter()
+
+        searches = {}  # {search: [lignes]}, une recherche multi-requêtes par index
+        for row, request in enumerate(requests):
+            if request.search is None:
+                request.future.set_result((vectors[row], None, None, {
+                    "batch_wait": started - request.submitted,
+                    "embedding": encoded - started,
+                }))
+            else:
+                searches.setdefault(request.search, []).append(row)
+
+        for search, rows in searches.items():
+            search_started = time.perf_counter()
+            try:
+                k = max(requests[row].k for row in rows)
+                distances, ids = search(vectors[rows], k)
+            except Exception as e:
+                for row in rows:
+                    requests[row].future.set_exception(e)
+                continue
+            searched = time.perf_counter()
+            for i, row in enumerate(rows):
+                request = requests[row]
+                timings = {
+                    "batch_wait": started - request.submitted,
+                    "embedding": encoded - started,
+                    "vector_search": searched - search_started,
+                }
+                request.future.set_result(
+                    (vectors[row], distances[i, :request.k], ids[i, :request.k], timings)
+                )
+
+
+def direct_search(text, k, encode, search=None):
+    """Même contrat que QueryBatcher.submit, sans regroupement (ASK_BATCHING=0)."""
+    started = time.perf_counter()
+    vectors = np.asarray(encode([text]), dtype=np.float32)
+    encoded = time.perf_counter()
+    if search is None:
+        return vectors[0], None, None, {"batch_wait": 0.0, "embedding": encoded - started}
+    distances, ids = search(vectors, k)
+    timings = {
+        "batch_wait": 0.0,
+        "embedding": encoded - started,
+        "vector_search": time.perf_counter() - encoded,
+    }
+    return vectors[0], distances[0], ids[0], timings
+
+
+def create_batcher():
+    """Renvoie une fonction `search(text, k, encode, search=None)` selon la configuration."""
+    if os.getenv("ASK_BATCHING", "1").lower() in ("0", "false", "no"):
+        return direct_search
+    batcher = QueryBatcher(
+        max_batch=int(os.getenv("ASK_BATCH_MAX", "32")),
+        max_wait_ms=float(os.getenv("ASK_BATCH_WAIT_MS", "2")),
+    )
+    return batcher.submit
@@ -0,0 +1,4 @@
+"""
+Benchmarks hors-ligne du backend RAG
+À lancer depuis backend/ : python -m benchmarks.<script> --help
+"""
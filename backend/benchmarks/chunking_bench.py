@@ -0,0 +1,94 @@
+"""
+Micro-benchmark du chunking : ancienne version (copie de chaînes) vs chunk_spans (offsets)
+Texte synthétique de plusieurs centaines de pages, mesuré sans PDF ni modèle.
+
+Exemple :
+    python -m benchmarks.chunking_bench --pages 1000 --max-words 300 --overlap 50
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from chunking import chunk_spans, smart_chunk_text
+from benchmarks import synthetic
+from benchmarks.load_test import git_revision
+
+
+def make_text(pages, seed=42):
+    """Texte d'un document synthétique + offsets de début de page (comme /upload_pdf)."""
+    document = synthetic.make_corpus(1, pages=pages, seed=seed)[0]
+    page_starts, parts, offset = [], [], 0
+    for page in document:
+        page_text = page + "\n"
+        page_starts.append(offset)
+        parts.append(page_text)
+        offset += len(page_text)
+    return "".join(parts), page_starts
+
+
+def measure(fn, repeat):
+    """Meilleur temps sur `repeat` essais + pic mémoire alloué pendant un essai."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du chunking")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--max-words", type=int, default=300)
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    text, page_starts = make_text(args.pages)
+    words = len(text.split())
+    print(f"📄 {args.pages} pages, {words} mots, {len(text)} caractères")
+
+    legacy, legacy_time, legacy_peak = measure(
+        lambda: smart_chunk_text(text, args.max_words), args.repeat
+    )
+    spans, spans_time, spans_peak = measure(
+        lambda: chunk_spans(text, args.max_words, args.overlap, page_starts), args.repeat
+    )
+
+    results = [
+        {"version": "smart_chunk_text", "chunks": len(legacy),
+         "seconds": round(legacy_time, 4), "peak_mb": round(legacy_peak / 2**20, 2)},
+        {"version": "chunk_spans", "chunks": len(spans),
+         "seconds": round(spans_time, 4), "peak_mb": round(spans_peak / 2**20, 2)},
+    ]
+    for row in results:
+        print(f"  {row['version']:<17} {row['chunks']:>6} chunks  {row['seconds']:.4f}s  "
+              f"pic {row['peak_mb']} Mo")
+    print(f"⏱️  chunk_spans: {spans_time / args.pages * 1e6:.0f} µs/page "
+          f"(ratio vs ancienne version: {spans_time / max(legacy_time, 1e-9):.1f})")
+
+    report = {
+        "git_revision": git_revision(),
+        "params": vars(args),
+        "words": words,
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport: {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Débit d'embedding par backend (torch / int8 / onnx) sur des chunks synthétiques
+Mesure ce qui domine /upload_pdf : encode() sur des chunks de ~300 mots.
+
+Exemple :
+    python -m benchmarks.embedding_bench --backends torch,int8,onnx --chunks 256 --threads 4
+
+Sans accès au hub Hugging Face, --offline-model construit un modèle de même
+architecture que all-MiniLM-L6-v2 (6 couches, 384 dims) aux poids aléatoires :
+le débit ne dépend que de l'architecture, la parité int8 reste indicative.
+    python -m benchmarks.embedding_bench --offline-model /tmp/minilm-shape --backends torch,int8
+"""
+
+import argparse
+import json
+import os
+import time
+
+import embeddings
+from benchmarks import synthetic
+from benchmarks.load_test import git_revision, peak_rss_mb
+
+
+def make_chunks(n, words=300, seed=11):
+    import random
+    rng = random.Random(seed)
+    return [synthetic.make_paragraph(rng, words, words) for _ in range(n)]
+
+
+def build_offline_model(directory, seed=11):
+    """
+    Modèle SentenceTransformer local à l'architecture de all-MiniLM-L6-v2
+    (poids aléatoires, tokenizer WordPiece entraîné sur le vocabulaire synthétique).
+    """
+    if os.path.exists(os.path.join(directory, "modules.json")):
+        return directory
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers import models as st_models
+    from tokenizers import BertWordPieceTokenizer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = BertWordPieceTokenizer(lowercase=True)
+    tokenizer.train_from_iterator(make_chunks(2000, 120, seed), vocab_size=30522)
+    tokenizer.save_model(directory)
+    BertTokenizerFast(os.path.join(directory, "vocab.txt")).save_pretrained(directory)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=30522, hidden_size=384, num_hidden_layers=6,
+                        num_attention_heads=12, intermediate_size=1536)
+    BertModel(config).save_pretrained(directory)
+
+    transformer = st_models.Transformer(directory, max_seq_length=256)
+    pooling = st_models.Pooling(transformer.get_word_embedding_dimension(), "mean")
+    SentenceTransformer(modules=[transformer, pooling, st_models.Normalize()]).save(directory)
+    print(f"🏗️  Modèle hors-ligne (architecture MiniLM-L6) : {directory}")
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark des backends d'embedding")
+    parser.add_argument("--backends", default="torch,int8,onnx")
+    parser.add_argument("--model", default=embeddings.DEFAULT_MODEL)
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--words", type=int, default=300, help="mots par chunk")
+    parser.add_argument("--batch-sizes", default="16,64")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--max-seq-length", type=int, default=256)
+    parser.add_argument("--offline-model", metavar="DIR",
+                        help="modèle local à l'architecture MiniLM-L6 (créé si absent) au lieu de --model")
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+    if args.offline_model:
+        args.model = build_offline_model(args.offline_model)
+
+    os.environ["EMBED_THREADS"] = str(args.threads)
+    os.environ["EMBED_MAX_SEQ_LENGTH"] = str(args.max_seq_length)
+    texts = make_chunks(args.chunks, args.words)
+    reference = None
+    results = []
+
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            embedder = embeddings.load_embedder(args.model, backend)
+        except Exception as e:
+            print(f"⚠️  {backend} indisponible: {e}")
+            continue
+        if reference is None and backend == "torch":
+            reference = embedder
+        parity = embeddings.check_parity(embedder, reference) if reference else None
+
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            embedder.encode(texts[:batch_size], batch_size=batch_size)  # warmup
+            start = time.perf_counter()
+            embedder.encode(texts, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            row = {
+                "backend": embedder.name,
+                "batch_size": batch_size,
+                "chunks_per_s": round(len(texts) / elapsed, 1),
+                "seconds": round(elapsed, 3),
+                "parity_min_cosine": round(parity["min_cosine"], 5) if parity else None,
+            }
+            results.append(row)
+            print(f"  {row['backend']:<28} batch={batch_size:<4} {row['chunks_per_s']} chunks/s "
+                  f"(parité: {row['parity_min_cosine']})")
+
+    report = {
+        "git_revision": git_revision(),
+        "params": vars(args),
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport: {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Vitesse et qualité de l'extraction PDF par moteur (PDF de backend/data)
+
+Pour chaque PDF lisible et chaque moteur installé : temps d'extraction, pages/s,
+caractères extraits et recouvrement des mots avec pdfplumber (référence
+historique). Mesure aussi un second passage servi par le cache des pages.
+
+Exemple :
+    python -m benchmarks.extraction_bench --data-dir data
+    python -m benchmarks.extraction_bench --engines pdfium,pdfplumber --out results/extraction.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+
+import pdf_extract
+from benchmarks.load_test import git_revision
+
+
+def word_overlap(text, reference):
+    """Part des mots de `reference` retrouvés dans `text` (multiset, insensible à la casse)."""
+    words = Counter(text.lower().split())
+    expected = Counter(reference.lower().split())
+    total = sum(expected.values())
+    if total == 0:
+        return 1.0
+    return sum((words & expected).values()) / total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction PDF")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--engines", help="moteurs séparés par des virgules (défaut: tous ceux installés)")
+    parser.add_argument("--repeat", type=int, default=1, help="passages non cachés par moteur (meilleur temps)")
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(",") if args.engines else pdf_extract.available_engines()
+    for engine in engines:
+        pdf_extract.resolve_engine(engine)  # ValueError si inconnu / non installé
+    print(f"🔧 Moteurs: {', '.join(engines)} (auto → {pdf_extract.resolve_engine('auto')})")
+
+    files = []
+    for path in sorted(glob.glob(os.path.join(args.data_dir, "*.pdf"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            reference, _ = pdf_extract.extract_pages(data, "pdfplumber", cache=None)
+        except Exception as e:
+            print(f"⚠️  {os.path.basename(path)} ignoré: {e}")
+            continue
+        files.append((os.path.basename(path), data, "\n".join(reference)))
+
+    results = []
+    for name, data, reference in files:
+        for engine in engines:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                pages, _ = pdf_extract.extract_pages(data, engine, cache=None)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            text = "\n".join(pages)
+
+            cache = pdf_extract.PageCache(64 * 2**20)
+            pdf_extract.extract_pages(data, engine, cache=cache)
+            start = time.perf_counter()
+            pdf_extract.extract_pages(data, engine, cache=cache)
+            cached = time.perf_counter() - start
+
+            row = {
+                "file": name,
+                "engine": engine,
+                "pages": len(pages),
+                "seconds": round(best, 4),
+                "pages_per_s": round(len(pages) / best, 1),
+                "cached_seconds": round(cached, 5),
+                "chars": len(text),
+                "word_overlap": round(word_overlap(text, reference), 4),
+            }
+            results.append(row)
+            print(f"  {name:<40} {engine:<10} {row['pages']:>4} p  {row['seconds']:>7.3f}s  "
+                  f"{row['pages_per_s']:>7.1f} p/s  cache {row['cached_seconds'] * 1000:.2f}ms  "
+                  f"mots {row['word_overlap']:.1%}")
+
+    report = {
+        "git_revision": git_revision(),
+        "params": vars(args),
+        "engines": engines,
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport: {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Remplaçants locaux et déterministes des modèles (embedder + Groq)
+Permettent de mesurer le backend sans réseau, sans GPU et sans clé API.
+
+Usage (AVANT d'importer app) :
+    from benchmarks import fakes
+    fakes.install(llm_latency_ms=200)
+    import app
+"""
+
+import hashlib
+import re
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class FakeSentenceTransformer:
+    """
+    Embedder déterministe : sac de mots haché dans `dimension` dimensions, normalisé.
+    Deux textes qui partagent des mots ont des vecteurs proches, ce qui garde
+    un retrieval plausible pour les benchmarks.
+    """
+
+    def __init__(self, model_name_or_path="fake-minilm", dimension=384, latency_ms_per_text=0.0,
+                 latency_ms_per_call=0.0, **kwargs):
+        self.model_name = model_name_or_path
+        self.dimension = dimension
+        self.latency_ms_per_text = latency_ms_per_text
+        # Coût fixe par appel (lancement du forward) : ce que le micro-batching amortit
+        self.latency_ms_per_call = latency_ms_per_call
+        self.max_seq_length = 256
+        self._compute_lock = threading.Lock()
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _word_slot(self, word):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dimension, 1.0 if (value >> 32) & 1 else -1.0
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False,
+               convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for word in WORD_RE.findall(text.lower()):
+                slot, sign = self._word_slot(word)
+                vectors[row, slot] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+
+        latency_ms = self.latency_ms_per_call + self.latency_ms_per_text * len(sentences)
+        if latency_ms:
+            # Un vrai forward occupe tous les cœurs : les appels concurrents se sérialisent
+            with self._compute_lock:
+                time.sleep(latency_ms / 1000)
+        return vectors[0] if single else vectors
+
+
+# ====== FAUX CLIENT GROQ ======
+
+SECTION_RE = re.compile(r"^\[Section (\d+)\]\n(.*?)(?=^\[Section |^=====|^INSTRUCTIONS)", re.M | re.S)
+COUNT_RE = re.compile(r"exactement (\d+) questions")
+AVOID_RE = re.compile(r"^- Que désigne le terme (\w+) \?$", re.M)
+
+
+def _fake_quiz(prompt):
+    """QCM au format attendu par quiz_bank.parse_quiz (cf. prompt de /quiz)."""
+    sections = SECTION_RE.findall(prompt) or [("1", prompt)]
+    count = COUNT_RE.search(prompt)
+    avoid = set(AVOID_RE.findall(prompt))  # questions déjà posées (nouvelle demande)
+    lines = []
+    for i in range(int(count.group(1)) if count else 5):
+        section, text = sections[i % len(sections)]
+        words = [w for w in dict.fromkeys(WORD_RE.findall(text)) if len(w) > 6 and w not in avoid]
+        words = words or ["document"]
+        w = words[(i // len(sections)) % len(words)]
+        lines.append(f"{i + 1}. [Document: synthetic.pdf | Section {section}] - Que désigne le terme {w} ?")
+        for letter in "ABCD":
+            lines.append(f"   {letter}) Option {letter} pour {w}")
+        lines.append(f"   Réponse correcte : {'ABCD'[i % 4]}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+        self.role = "assistant"
+
+
+class _Choice:
+    def __init__(self, content):
+        self.message = _Message(content)
+        self.finish_reason = "stop"
+        self.index = 0
+
+
+class _Completion:
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+
+
+class _ChatCompletions:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def create(self, model=None, messages=None, max_completion_tokens=800, temperature=0.0, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if "QCM" in prompt:
+            content = _fake_quiz(prompt)
+        else:
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+            content = f"Réponse synthétique {digest} ({len(prompt)} caractères de prompt)."
+        return _Completion(content)
+
+
+class _Transcriptions:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def create(self, file=None, model=None, response_format="json", **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return types.SimpleNamespace(text=" Question transcrite synthétique ")
+
+
+class FakeGroq:
+    """Imite l'API du client Groq utilisée par app.py (chat + transcription)."""
+
+    def __init__(self, api_key=None, latency_ms=0.0, **kwargs):
+        self.chat = types.SimpleNamespace(completions=_ChatCompletions(latency_ms))
+        self.audio = types.SimpleNamespace(transcriptions=_Transcriptions(latency_ms))
+
+
+def install(llm_latency_ms=0.0, embed_latency_ms=0.0, embed_call_latency_ms=0.0, dimension=384):
+    """
+    Enregistre les faux modules `sentence_transformers` et `groq` dans sys.modules,
+    pour que `import app` utilise les remplaçants au lieu des vrais modèles.
+    """
+    st_module = types.ModuleType("sentence_transformers")
+    st_module.SentenceTransformer = lambda name, *a, **kw: FakeSentenceTransformer(
+        name, dimension=dimension, latency_ms_per_text=embed_latency_ms,
+        latency_ms_per_call=embed_call_latency_ms,
+    )
+    groq_module = types.ModuleType("groq")
+    groq_module.Groq = lambda *a, **kw: FakeGroq(latency_ms=llm_latency_ms)
+
+    sys.modules["sentence_transformers"] = st_module
+    sys.modules["groq"] = groq_module
@@ -0,0 +1,214 @@
+"""
+Test de charge hors-ligne du backend Flask
+- Génère des PDF synthétiques (taille configurable)
+- Remplace Groq et l'embedder par des fakes déterministes (benchmarks.fakes)
+- Pilote l'app Flask en mémoire (test_client) avec une concurrence configurable
+- Rapporte p50/p95/p99, débit et RSS max en JSON
+
+Exemple :
+    python -m benchmarks.load_test --pdfs 4 --pages 30 --requests 200 --concurrency 8 \
+        --out bench_results/load.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext, redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks import fakes, synthetic
+
+
+def percentile(sorted_values, q):
+    """Percentile par interpolation linéaire (valeurs déjà triées)."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize_latencies(name, latencies, errors, wall_time):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "endpoint": name,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else None,
+        "wall_time_s": round(wall_time, 3),
+        "latency_ms": {
+            "mean": ms(sum(values) / len(values)) if values else None,
+            "p50": ms(percentile(values, 50)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "max": ms(values[-1]) if values else None,
+        },
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets, macOS : octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class Driver:
+    """Exécute des requêtes concurrentes sur l'app, un test_client par thread."""
+
+    def __init__(self, flask_app, concurrency, quiet=True):
+        self.app = flask_app
+        self.concurrency = concurrency
+        self.quiet = quiet
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def run(self, name, calls):
+        """`calls` : liste de fonctions client -> response. Renvoie le résumé de latence."""
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def one(call):
+            nonlocal errors
+            start = time.perf_counter()
+            response = call(self._client())
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        # Les print() de app.py faussent les mesures : on les coupe par défaut
+        with open(os.devnull, "w") as devnull, \
+                (redirect_stdout(devnull) if self.quiet else nullcontext()):
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                list(pool.map(one, calls))
+            wall_time = time.perf_counter() - wall_start
+
+        result = summarize_latencies(name, latencies, errors, wall_time)
+        print(f"  {name:<12} p50={result['latency_ms']['p50']}ms "
+              f"p95={result['latency_ms']['p95']}ms p99={result['latency_ms']['p99']}ms "
+              f"{result['throughput_rps']} req/s ({errors} erreurs)")
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge hors-ligne du backend RAG")
+    parser.add_argument("--pdfs", type=int, default=4, help="nombre de PDF synthétiques")
+    parser.add_argument("--pages", type=int, default=20, help="pages par PDF")
+    parser.add_argument("--requests", type=int, default=100, help="requêtes par endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", default="upload_pdf,ask,summarize,quiz")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="latence simulée du LLM (0 = mesure du backend seul)")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0,
+                        help="latence simulée de l'embedder par texte")
+    parser.add_argument("--embed-call-latency-ms", type=float, default=0.0,
+                        help="coût fixe simulé de chaque appel encode()")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="affiche les logs de app.py")
+    parser.add_argument("--out", help="fichier JSON de sortie (sinon stdout)")
+    args = parser.parse_args(argv)
+
+    fakes.install(
+        llm_latency_ms=args.llm_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        embed_call_latency_ms=args.embed_call_latency_ms,
+    )
+    # Collections du benchmark dans un dossier jetable (pas dans kb_data/)
+    os.environ.setdefault("KB_DIR", tempfile.mkdtemp(prefix="rag_bench_kb_"))
+    import app as rag_app  # après fakes.install()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    driver = Driver(rag_app.app, args.concurrency, quiet=not args.verbose)
+
+    print(f"🏗️  Génération de {args.pdfs} PDF x {args.pages} pages (seed={args.seed})...")
+    corpus = synthetic.make_corpus(args.pdfs, pages=args.pages, seed=args.seed)
+    pdfs = [synthetic.pdf_bytes(pages) for pages in corpus]
+    questions = synthetic.make_questions(args.requests, seed=args.seed + 1)
+
+    results = []
+    print("🚀 Benchmark en cours...")
+
+    # Upload d'abord : les autres endpoints ont besoin de sources indexées
+    upload_calls = [
+        (lambda c, data=data, i=i: c.post(
+            "/upload_pdf",
+            data={"file": (io.BytesIO(data), f"synthetic_{i}.pdf")},
+            content_type="multipart/form-data",
+        ))
+        for i, data in enumerate(pdfs)
+    ]
+    upload_result = driver.run("upload_pdf", upload_calls)
+    if "upload_pdf" in endpoints:
+        results.append(upload_result)
+
+    with rag_app.app.test_client() as client:
+        source_ids = [s["id"] for s in client.get("/list_sources").get_json()]
+
+    if "ask" in endpoints:
+        results.append(driver.run("ask", [
+            (lambda c, q=q: c.post("/ask", json={"question": q, "selected_ids": source_ids}))
+            for q in questions
+        ]))
+    for name in ("summarize", "quiz"):
+        if name in endpoints:
+            results.append(driver.run(name, [
+                (lambda c, name=name: c.post(f"/{name}", json={"selected_ids": source_ids}))
+                for _ in range(args.requests)
+            ]))
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": vars(args),
+        "corpus": {
+            "pdfs": args.pdfs,
+            "pages": args.pages,
+            "pdf_bytes": sum(len(p) for p in pdfs),
+        },
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload)
+        print(f"💾 Rapport: {args.out}")
+    else:
+        print(payload)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Benchmark de retrieval hors-ligne (qualité + latence), sans LLM ni appel réseau
+- Corpus : PDF de data/
+- Questions : test_questions.py (DOCUMENT_QUESTIONS par défaut)
+- Étiquetage des chunks pertinents :
+    * "evidence" présent dans le chunk (étiquette exacte), sinon
+    * recouvrement lexical avec la ground_truth (étiquette approximative)
+- Grille : taille de chunk x type d'index FAISS x hybride (BM25 + dense) on/off
+- Rapporte recall@k, MRR et latence de recherche par requête
+
+Exemple :
+    python -m benchmarks.retrieval_bench --chunk-sizes 150,300,500 --index-types flat,hnsw,ivf
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import faiss
+import numpy as np
+
+import test_questions
+from chunking import chunk_spans
+from benchmarks.load_test import git_revision, percentile
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+QUESTION_SETS = {
+    "documents": test_questions.DOCUMENT_QUESTIONS,
+    "basic": test_questions.BASIC_QUESTIONS,
+    "all": test_questions.ALL_QUESTIONS,
+}
+
+# Mots vides FR/EN ignorés pour l'étiquetage lexical et BM25
+STOPWORDS = set("""
+le la les un une des de du d l et ou en au aux a à est sont pour par sur dans avec ce cette ces
+qui que quoi dont se sa son ses leur leurs il elle ils elles on nous vous ne pas plus comme
+the a an of and or to in on for with is are be by as at from that this these those it its
+what how which who why can also
+""".split())
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules, sans accents, ponctuation -> espaces (comparaison robuste au chunking)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(WORD_RE.findall(text))
+
+
+def content_words(text):
+    return [w for w in normalize(text).split() if w not in STOPWORDS and len(w) > 2]
+
+
+# ====== CORPUS ======
+
+def load_documents(data_dir):
+    """Extrait le texte des PDF (comme /upload_pdf). Ignore les fichiers illisibles."""
+    import pdfplumber
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.pdf"))):
+        try:
+            with pdfplumber.open(path) as pdf:
+                text = "".join((page.extract_text() or "") + "\n" for page in pdf.pages)
+        except Exception as e:
+            print(f"⚠️  {os.path.basename(path)} ignoré: {e}")
+            continue
+        documents.append({"name": os.path.basename(path), "text": text})
+        print(f"  - {os.path.basename(path)}: {len(text)} caractères")
+    return documents
+
+
+def build_chunks(documents, chunk_size, overlap_words=0):
+    chunks = []
+    for doc in documents:
+        text = doc["text"]
+        for span in chunk_spans(text, max_words=chunk_size, overlap_words=overlap_words):
+            chunks.append({"source": doc["name"], "text": text[span["start"]:span["end"]]})
+    return chunks
+
+
+def label_relevant(question, chunks, min_overlap=0.5):
+    """Indices des chunks pertinents pour une question (exact si "evidence", sinon lexical)."""
+    normalized = [normalize(c["text"]) for c in chunks]
+
+    evidence = question.get("evidence")
+    if evidence:
+        needle = normalize(evidence)
+        return {i for i, text in enumerate(normalized) if needle in text}, "evidence"
+
+    truth = set(content_words(question["ground_truth"]))
+    if not truth:
+        return set(), "lexical"
+    scores = [len(truth & set(text.split())) / len(truth) for text in normalized]
+    best = max(scores, default=0)
+    if best < min_overlap:
+        return set(), "lexical"
+    return {i for i, s in enumerate(scores) if s >= max(min_overlap, 0.8 * best)}, "lexical"
+
+
+# ====== INDEX ======
+
+def build_index(index_type, vectors, hnsw_m=32, ivf_nprobe=8):
+    dim = vectors.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+    elif index_type == "ivf":
+        nlist = max(1, int(math.sqrt(len(vectors))))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(vectors)
+        index.nprobe = min(ivf_nprobe, nlist)
+    else:
+        raise ValueError(f"Type d'index inconnu: {index_type}")
+    index.add(vectors)
+    return index
+
+
+class BM25:
+    """BM25 minimal sur les chunks (listes de postings en mémoire)."""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1, self.b = k1, b
+        self.doc_len = np.zeros(len(texts), dtype=np.float32)
+        self.postings = defaultdict(list)  # mot -> [(chunk, tf)]
+        for i, text in enumerate(texts):
+            words = content_words(text)
+            self.doc_len[i] = len(words)
+            for word, tf in Counter(words).items():
+                self.postings[word].append((i, tf))
+        self.avg_len = float(self.doc_len.mean()) if len(texts) else 0.0
+        n = len(texts)
+        self.idf = {
+            w: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for w, p in self.postings.items()
+        }
+
+    def scores(self, query):
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        for word in set(content_words(query)):
+            for i, tf in self.postings.get(word, ()):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[i] / self.avg_len)
+                scores[i] += self.idf[word] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[idx] += 1.0 / (k + rank + 1)
+    return [idx for idx, _ in sorted(fused.items(), key=lambda item: -item[1])]
+
+
+# ====== ÉVALUATION ======
+
+def evaluate_config(index, bm25, query_vectors, questions, labels, top_k, hybrid, candidates=50):
+    recalls = {k: [] for k in top_k}
+    reciprocal_ranks, latencies = [], []
+    depth = max(max(top_k), candidates if hybrid else 0)
+    depth = min(depth, index.ntotal)
+
+    for qi, question in enumerate(questions):
+        relevant = labels[qi]
+        start = time.perf_counter()
+        _, neighbors = index.search(query_vectors[qi:qi + 1], depth)
+        ranking = [int(i) for i in neighbors[0] if i >= 0]
+        if hybrid:
+            lexical = bm25.scores(question["question"])
+            lexical_ranking = [int(i) for i in np.argsort(-lexical)[:depth] if lexical[i] > 0]
+            ranking = reciprocal_rank_fusion([ranking, lexical_ranking])
+        latencies.append(time.perf_counter() - start)
+
+        if not relevant:
+            continue
+        for k in top_k:
+            recalls[k].append(len(relevant & set(ranking[:k])) / len(relevant))
+        first = next((rank for rank, idx in enumerate(ranking, 1) if idx in relevant), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+
+    latencies.sort()
+    return {
+        "recall": {f"@{k}": round(float(np.mean(v)), 4) if v else None for k, v in recalls.items()},
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else None,
+        "search_latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        },
+    }
+
+
+def load_embedder(fake):
+    if fake:
+        from benchmarks.fakes import FakeSentenceTransformer
+        return FakeSentenceTransformer()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de retrieval hors-ligne")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--questions", choices=sorted(QUESTION_SETS), default="documents")
+    parser.add_argument("--chunk-sizes", default="150,300,500", help="max_words par chunk")
+    parser.add_argument("--overlap", type=int, default=0, help="mots de recouvrement entre chunks")
+    parser.add_argument("--index-types", default="flat,hnsw,ivf")
+    parser.add_argument("--hybrid", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--top-k", default="1,3,5,8")
+    parser.add_argument("--fake-embedder", action="store_true",
+                        help="embedder déterministe (aucun modèle à charger)")
+    parser.add_argument("--out", help="fichier JSON de sortie")
+    args = parser.parse_args(argv)
+
+    chunk_sizes = [int(x) for x in args.chunk_sizes.split(",")]
+    index_types = [x.strip() for x in args.index_types.split(",")]
+    hybrid_modes = {"off": [False], "on": [True], "both": [False, True]}[args.hybrid]
+    top_k = [int(x) for x in args.top_k.split(",")]
+    questions = QUESTION_SETS[args.questions]
+
+    print(f"📚 Chargement des PDF de {args.data_dir}...")
+    documents = load_documents(args.data_dir)
+    if not documents:
+        print("❌ Aucun PDF exploitable")
+        return None
+
+    embedder = load_embedder(args.fake_embedder)
+    query_vectors = np.asarray(embedder.encode([q["question"] for q in questions]), dtype=np.float32)
+
+    results = []
+    for chunk_size in chunk_sizes:
+        chunks = build_chunks(documents, chunk_size, args.overlap)
+        texts = [c["text"] for c in chunks]
+        labels, label_kinds = [], Counter()
+        for question in questions:
+            relevant, kind = label_relevant(question, chunks)
+            labels.append(relevant)
+            label_kinds[kind if relevant else "unlabeled"] += 1
+
+        start = time.perf_counter()
+        vectors = np.asarray(embedder.encode(texts), dtype=np.float32)
+        embed_time = time.perf_counter() - start
+        bm25 = BM25(texts)
+
+        print(f"\n✂️  chunk_size={chunk_size}: {len(chunks)} chunks, "
+              f"étiquettes {dict(label_kinds)}, embedding {embed_time:.2f}s")
+
+        for index_type in index_types:
+            start = time.perf_counter()
+            index = build_index(index_type, vectors)
+            build_time = time.perf_counter() - start
+
+            for hybrid in hybrid_modes:
+                scores = evaluate_config(index, bm25, query_vectors, questions, labels, top_k, hybrid)
+                row = {
+                    "chunk_size": chunk_size,
+                    "overlap": args.overlap,
+                    "index_type": index_type,
+                    "hybrid": hybrid,
+                    "chunks": len(chunks),
+                    "labeled_queries": sum(1 for l in labels if l),
+                    "index_build_ms": round(build_time * 1000, 2),
+                    **scores,
+                }
+                results.append(row)
+                recall = " ".join(f"R{k}={v}" for k, v in scores["recall"].items())
+                print(f"  {index_type:<5} hybrid={'on ' if hybrid else 'off'} {recall} "
+                      f"MRR={scores['mrr']} p50={scores['search_latency_ms']['p50']}ms")
+
+    report = {
+        "git_revision": git_revision(),
+        "embedder": "fake" if args.fake_embedder else "all-MiniLM-L6-v2",
+        "questions": args.questions,
+        "documents": [d["name"] for d in documents],
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Rapport: {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
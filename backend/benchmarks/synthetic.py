@@ -0,0 +1,117 @@
+"""
+Génération de corpus et de PDF synthétiques (déterministes via seed)
+Aucune dépendance externe : le PDF est écrit à la main (police Helvetica standard).
+"""
+
+import random
+
+# Vocabulaire fixe pour que deux runs avec la même seed produisent le même corpus
+VOCABULARY = (
+    "reconnaissance faciale biometrie visage identite image reseau neurones convolution "
+    "pooling couche apprentissage donnees modele vecteur embedding caracteristiques "
+    "detection alignement normalisation eclairage pose expression verification identification "
+    "base correspondance seuil precision rappel evaluation algorithme classification "
+    "extraction descripteur texture contour profondeur entrainement validation test "
+    "cloud stockage serveur calcul service architecture securite confidentialite "
+    "texte fouille web document requete index recherche pertinence corpus frequence"
+).split()
+
+
+def make_paragraph(rng, min_words=40, max_words=120):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words))]
+    sentences, current = [], []
+    for word in words:
+        current.append(word)
+        if len(current) >= rng.randint(8, 18):
+            sentences.append(" ".join(current).capitalize() + ".")
+            current = []
+    if current:
+        sentences.append(" ".join(current).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_document(rng, pages=10, paragraphs_per_page=4):
+    """Renvoie une liste de pages (texte brut, paragraphes séparés par une ligne vide)."""
+    return [
+        "\n\n".join(make_paragraph(rng) for _ in range(paragraphs_per_page))
+        for _ in range(pages)
+    ]
+
+
+def make_corpus(n_docs, pages=10, paragraphs_per_page=4, seed=42):
+    rng = random.Random(seed)
+    return [make_document(rng, pages, paragraphs_per_page) for _ in range(n_docs)]
+
+
+def make_questions(n, seed=7):
+    rng = random.Random(seed)
+    return [
+        f"Que dit le document sur {rng.choice(VOCABULARY)} et {rng.choice(VOCABULARY)} ?"
+        for _ in range(n)
+    ]
+
+
+# ====== ÉCRITURE PDF MINIMALE ======
+
+def _wrap(text, width=90):
+    lines = []
+    for para in text.split("\n"):
+        line = ""
+        for word in para.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_bytes(pages):
+    """Construit un PDF valide (une page PDF par élément de `pages`)."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)  # rempli plus bas
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_text in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in _wrap(page_text)[:62]:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    return bytes(out)
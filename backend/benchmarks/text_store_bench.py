@@ -0,0 +1,123 @@
+"""
+Mémoire et latence du stockage de texte : ancien modèle vs TextStore compressé
+- ancien : texte complet dans SOURCES + copie du texte de chaque chunk
+- nouveau : texte une seule fois, compressé par blocs, chunks = offsets
+
+Exemple :
+    python -m benchmarks.text_store_bench --pages 1000 --codec zlib
+    python -m benchmarks.text_store_bench --data-dir data      # PDF réels
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+from chunking import chunk_spans
+from text_store import TextStore
+from benchmarks.chunking_bench import make_text
+from benchmarks.load_test import git_revision, percentile
+
+
+def load_pdfs(data_dir):
+    """[(texte, nombre de pages)] des PDF lisibles de data_dir."""
+    import pdfplumber
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.pdf"))):
+        try:
+            with pdfplumber.open(path) as pdf:
+                pages = [(page.extract_text() or "") + "\n" for page in pdf.pages]
+        except Exception as e:
+            print(f"⚠️  {os.path.basename(path)} ignoré: {e}")
+            continue
+        documents.append(("".join(pages), len(pages)))
+    return documents
+
+
+def time_reads(read, spans, n, seed=3, hot=None):
+    """Latences (µs) de `n` lectures de chunks tirés au hasard (parmi `hot` chunks si donné)."""
+    rng = random.Random(seed)
+    pool = spans[:hot] if hot else spans
+    latencies = []
+    for _ in range(n):
+        doc_id, span = rng.choice(pool)
+        start = time.perf_counter()
+        read(doc_id, span["start"], span["end"])
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return sorted(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du stockage de texte")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--data-dir", help="utiliser les PDF de ce dossier au lieu du texte synthétique")
+    parser.add_argument("--codec", default="auto", choices=["auto", "zstd", "zlib"])
+    parser.add_argument("--block-chars", type=int, default=16384)
+    parser.add_argument("--cache-blocks", type=int, default=256)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        documents = load_pdfs(args.data_dir)
+    else:
+        documents = [(make_text(args.pages)[0], args.pages)]
+    pages = sum(p for _, p in documents)
+
+    store = TextStore(args.block_chars, args.cache_blocks, args.codec)
+    # Sans cache : chaque lecture décompresse ses blocs (pire cas)
+    cold_store = TextStore(args.block_chars, 0, args.codec)
+    legacy = {}  # {doc_id: [chunk_text]} comme l'ancien CHUNKS_METADATA
+    legacy_bytes = 0
+    spans = []
+    add_time = 0.0
+    for doc_id, (text, _) in enumerate(documents):
+        start = time.perf_counter()
+        store.add(doc_id, text)
+        add_time += time.perf_counter() - start
+        cold_store.add(doc_id, text)
+        doc_spans = chunk_spans(text)
+        spans.extend((doc_id, s) for s in doc_spans)
+        legacy[doc_id] = [text[s["start"]:s["end"]] for s in doc_spans]
+        legacy_bytes += sys.getsizeof(text) + sum(sys.getsizeof(c) for c in legacy[doc_id])
+
+    stats = store.stats()
+    print(f"📄 {len(documents)} document(s), {pages} pages, {len(spans)} chunks, codec {stats['codec']}")
+    print(f"  ancien : {legacy_bytes / pages:>8.0f} o/page (texte + copies des chunks)")
+    print(f"  store  : {stats['compressed_bytes'] / pages:>8.0f} o/page compressés "
+          f"(ratio x{stats['ratio']}, compression {add_time:.2f}s)")
+
+    results = {}
+    for label, read, hot in (("cold", cold_store.get, None), ("hot", store.get, 8)):
+        store_lat = time_reads(read, spans, args.reads, hot=hot)
+        results[label] = {
+            "store_p50_us": round(percentile(store_lat, 50), 1),
+            "store_p95_us": round(percentile(store_lat, 95), 1),
+        }
+        print(f"  lecture {label:<4}: store p50={results[label]['store_p50_us']}µs "
+              f"p95={results[label]['store_p95_us']}µs")
+
+    report = {
+        "git_revision": git_revision(),
+        "params": vars(args),
+        "pages": pages,
+        "chunks": len(spans),
+        "legacy_bytes_per_page": round(legacy_bytes / pages),
+        "store_bytes_per_page": round(stats["compressed_bytes"] / pages),
+        "store": stats,
+        "reads": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Rapport: {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
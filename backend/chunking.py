@@ -0,0 +1,260 @@
+"""
+Découpage du texte extrait des PDF en chunks pour l'indexation
+
+- chunk_spans() : découpage en une passe sur les offsets de caractères.
+  Chaque chunk est une vue {start, end, page_start, page_end} sur le texte
+  d'origine (ponctuation conservée, recouvrement configurable).
+  Débuts de mot et fins de phrase sont repérés en vectoriel (numpy) par
+  blocs de BLOCK_CHARS caractères : la mémoire reste bornée quelle que
+  soit la taille du texte.
+- smart_chunk_text() : ancienne version qui recopie les chaînes, gardée
+  pour comparaison (benchmarks/chunking_bench.py).
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# Caractères traités par bloc (un bloc est coupé entre deux mots)
+BLOCK_CHARS = 1 << 16
+
+# Blancs (ceux de str.split) : ASCII par comparaisons, les autres (rares) via isin
+ASCII_BLANKS = np.zeros(33, dtype=bool)
+ASCII_BLANKS[[9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = True
+UNICODE_BLANKS = np.array(
+    [0x85, 0xA0, 0x1680, *range(0x2000, 0x200B), 0x2028, 0x2029, 0x202F, 0x205F, 0x3000],
+    dtype=np.uint32,
+)
+# Fin de phrase : mot terminé par . ! ? éventuellement suivis de deux guillemets/parenthèses
+SENTENCE_END_CHARS = [ord(c) for c in ".!?"]
+CLOSING_CHARS = [ord(c) for c in "\"')]»"]
+# Fin de paragraphe : ligne vide
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+WORD_RE = re.compile(r"\S+")
+# Fin du mot en cours et blancs qui suivent (coupure d'un bloc)
+WORD_TAIL_RE = re.compile(r"\S*+\s*+")
+
+EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def _any_of(values, codes):
+    mask = values == codes[0]
+    for code in codes[1:]:
+        mask |= values == code
+    return mask
+
+
+def _codepoints(block):
+    """Codes des caractères : un octet par caractère si le bloc tient en latin-1, sinon quatre."""
+    try:
+        return np.frombuffer(block.encode("latin-1"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return np.frombuffer(block.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _block_words(codepoints):
+    """
+    Débuts de mot d'un bloc + coupures de phrase (indice du mot qui suit
+    une fin de phrase), en indices locaux au bloc.
+    """
+    blank = codepoints <= 32
+    # Blancs ASCII autres que l'espace et \n, et caractères de contrôle : rares
+    odd = np.flatnonzero(blank ^ ((codepoints == 32) | (codepoints == 10)))
+    if len(odd):
+        blank[odd] = ASCII_BLANKS[codepoints[odd]]
+    wide = np.flatnonzero(codepoints > 127)
+    if len(wide):
+        blank[wide] = np.isin(codepoints[wide], UNICODE_BLANKS)
+    # Début de mot : non-blanc précédé d'un blanc (ou du début du bloc)
+    previous = np.concatenate(([True], blank[:-1]))
+    starts = np.flatnonzero(previous > blank)
+
+    # Fin de phrase : . ! ? suivi de 0 à 2 fermants puis d'un blanc ("fin.", "fin?)", "fin.»")
+    end = np.flatnonzero(_any_of(codepoints, SENTENCE_END_CHARS)) + 1
+    blank = np.concatenate((blank, [True] * 3))
+    codepoints = np.concatenate((codepoints, np.zeros(3, dtype=codepoints.dtype)))
+    for _ in range(2):
+        end += ~blank[end] & _any_of(codepoints[end], CLOSING_CHARS)
+    end = end[blank[end]]
+    return starts, np.searchsorted(starts, end)
+
+
+def word_blocks(text, block_chars=BLOCK_CHARS):
+    """
+    Mots de `text` par blocs d'environ `block_chars` caractères, coupés entre
+    deux mots : (débuts de mot en offsets absolus, coupures de phrase en
+    indices locaux, offsets m.end() des fins de paragraphe du bloc).
+    """
+    pos = 0
+    while pos < len(text):
+        stop = pos + block_chars
+        stop = WORD_TAIL_RE.match(text, stop).end() if stop < len(text) else len(text)
+        starts, sentence_breaks = _block_words(_codepoints(text[pos:stop]))
+        paragraphs = [m.end() for m in PARAGRAPH_RE.finditer(text, pos, stop)]
+        yield starts + pos, sentence_breaks, paragraphs
+        pos = stop
+
+
+class _WordWindow:
+    """
+    Mots de `text` chargés bloc par bloc (indices globaux) ; les mots
+    antérieurs au chunk en cours sont oubliés au fil du découpage.
+    """
+
+    def __init__(self, text):
+        self.blocks = word_blocks(text)
+        self.base = 0  # indice global du premier mot gardé
+        self.starts = EMPTY
+        self.count = 0  # mots chargés depuis le début du texte
+        # Indices i (listes triées) tels qu'on peut couper AVANT le mot i
+        self.sentence_breaks, self.paragraph_breaks = [], []
+        self.complete = False
+
+    def load(self, upto, keep_from):
+        """Charge des blocs jusqu'à dépasser `upto` mots (ou la fin du texte)."""
+        if self.complete or self.count > upto:
+            return
+        drop = max(0, keep_from - self.base)
+        base = self.base + drop
+        starts = [self.starts[drop:]]
+        sentence_breaks = self.sentence_breaks[bisect_left(self.sentence_breaks, base):]
+        paragraph_breaks = self.paragraph_breaks[bisect_left(self.paragraph_breaks, base):]
+        count = self.count
+        while count <= upto:
+            block = next(self.blocks, None)
+            if block is None:
+                self.complete = True
+                break
+            block_starts, block_sentence_breaks, paragraphs = block
+            starts.append(block_starts)
+            sentence_breaks += (block_sentence_breaks + count).tolist()
+            if paragraphs:
+                paragraph_breaks += (np.unique(block_starts.searchsorted(paragraphs)) + count).tolist()
+            count += len(block_starts)
+        self.base = base
+        self.count = count
+        self.starts = np.concatenate(starts)
+        self.sentence_breaks = sentence_breaks
+        self.paragraph_breaks = paragraph_breaks
+
+
+def _last_break(breaks, lo, hi):
+    """Plus grande coupure b avec lo < b <= hi, ou None."""
+    pos = bisect_right(breaks, hi) - 1
+    if pos >= 0 and breaks[pos] > lo:
+        return breaks[pos]
+    return None
+
+
+def chunk_spans(text, max_words=300, overlap_words=0, page_starts=None):
+    """
+    Découpe `text` en chunks d'au plus `max_words` mots, sans copier le texte.
+
+    Coupe de préférence sur une fin de paragraphe (si elle laisse un chunk
+    au moins à moitié plein), sinon sur une fin de phrase, sinon au mot près.
+
+    Args:
+        overlap_words: mots repris au début du chunk suivant (recalé sur un début de phrase si possible)
+        page_starts: offsets de début de chaque page (page 1 = page_starts[0])
+
+    Returns:
+        [{"start", "end", "page_start", "page_end"}] — texte du chunk = text[start:end]
+    """
+    overlap_words = max(0, min(overlap_words, max_words - 1))
+    words = _WordWindow(text)
+
+    chunks = []
+    first = 0
+    previous_last = 0
+    while True:
+        limit = first + max_words
+        if limit >= words.count:
+            words.load(limit, first - overlap_words)
+        n = words.count
+        if first >= n:
+            break
+        base = words.base
+        if limit >= n:
+            last = n
+        else:
+            # Avec recouvrement, la coupure doit dépasser la fin du chunk précédent
+            lo = max(first, previous_last)
+            para = _last_break(words.paragraph_breaks, lo, limit)
+            if para is not None and para - first >= max_words // 2:
+                last = para
+            else:
+                last = _last_break(words.sentence_breaks, lo, limit) or para or limit
+
+        start = int(words.starts[first - base])
+        end = WORD_RE.match(text, int(words.starts[last - 1 - base])).end()
+        chunk = {"start": start, "end": end}
+        if page_starts:
+            chunk["page_start"] = bisect_right(page_starts, start)
+            chunk["page_end"] = bisect_right(page_starts, end - 1)
+        chunks.append(chunk)
+
+        if last >= n:
+            break
+        previous_last = last
+        next_first = last
+        if overlap_words:
+            next_first = last - overlap_words
+            # Recaler le recouvrement sur un début de phrase s'il y en a un dans la fenêtre
+            breaks = words.sentence_breaks
+            pos = bisect_left(breaks, next_first)
+            if pos < len(breaks) and breaks[pos] < last:
+                next_first = breaks[pos]
+        first = max(next_first, first + 1)
+
+    return chunks
+
+
+#Divise le texte en morceaux (chunks) de max 300 mots.Essayez de respecter les paragraphes, 
+# puis les phrases si un paragraphe est trop long.
+# Chaque chunk sera utilisé pour générer un embedding
+def smart_chunk_text(text, max_words=300):
+    """Divise le texte en chunks intelligents (par paragraphes/phrases). Ancienne version."""
+    # Diviser par paragraphes d'abord
+    paragraphs = text.split('\n\n')
+    chunks = []
+    current_chunk = []
+    current_word_count = 0
+    
+    for para in paragraphs:
+        para = para.strip()
+        if not para:
+            continue
+            
+        words = para.split()
+        word_count = len(words)
+        
+        # Si le paragraphe est trop long, le diviser par phrases
+        if word_count > max_words:
+            sentences = para.replace('!', '.').replace('?', '.').split('.')
+            for sent in sentences:
+                sent = sent.strip()
+                if sent:
+                    sent_words = len(sent.split())
+                    if current_word_count + sent_words > max_words and current_chunk:
+                        chunks.append(' '.join(current_chunk))
+                        current_chunk = [sent]
+                        current_word_count = sent_words
+                    else:
+                        current_chunk.append(sent)
+                        current_word_count += sent_words
+        else:
+            # Ajouter le paragraphe entier
+            if current_word_count + word_count > max_words and current_chunk:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = [para]
+                current_word_count = word_count
+            else:
+                current_chunk.append(para)
+                current_word_count += word_count
+    
+    # Ajouter le dernier chunk
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    
+    return chunks
@@ -0,0 +1,295 @@
+"""
+Backends d'embedding interchangeables (CPU)
+- torch : SentenceTransformer standard (référence, par défaut)
+- int8  : même modèle, couches Linear quantifiées dynamiquement en int8 (torch)
+- onnx  : ONNX Runtime sur un export local (model.onnx + tokenizer.json), fp32 ou int8
+
+Configuration (variables d'environnement) :
+    EMBEDDER_BACKEND       torch | int8 | onnx          (défaut: torch)
+    EMBED_BATCH_SIZE       taille de batch              (défaut: 64)
+    EMBED_THREADS          threads intra-op, 0 = auto   (défaut: 0)
+    EMBED_MAX_SEQ_LENGTH   tokens max par texte         (défaut: 256)
+    EMBED_ONNX_DIR         dossier de l'export ONNX     (défaut: models/<modèle>-onnx)
+
+CLI :
+    python embeddings.py export-onnx --quantize      # crée l'export ONNX local
+    python embeddings.py parity --backend onnx       # compare au modèle de référence
+
+Débit mesuré (benchmarks/embedding_bench.py --offline-model : architecture
+MiniLM-L6 à poids aléatoires, chunks de 300 mots, 1 vCPU) : torch 12.7
+chunks/s, int8 20.2 chunks/s. Ce modèle ne dit rien de la qualité des
+vecteurs du modèle entraîné : vérifier `parity --backend int8` avant de
+changer de backend. Le backend ne fait pas partie du modèle enregistré par
+les collections, donc un changement ne déclenche aucun ré-encodage.
+"""
+
+import argparse
+import os
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+BACKENDS = ("torch", "int8", "onnx")
+
+# Textes de contrôle pour la vérification de parité
+PARITY_TEXTS = [
+    "La reconnaissance faciale identifie une personne à partir de son visage.",
+    "Un CNN applique des couches de convolution puis de pooling.",
+    "Data mining is also called knowledge discovery in databases (KDD).",
+    "Le serveur mail utilise SMTP pour l'envoi et IMAP/POP3 pour la réception.",
+    "Document clustering groups similar documents into clusters.",
+    "ESXi s'installe directement sur le matériel physique.",
+    "Short text.",
+    " ".join(["Un paragraphe long pour tester la troncature des séquences."] * 40),
+]
+
+
+class Embedder(ABC):
+    """Interface commune : encode(liste de textes) -> np.ndarray float32 (n, dimension)."""
+
+    backend = "base"
+
+    def __init__(self, model_name, batch_size=64, max_seq_length=256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.dimension = None
+
+    @property
+    def name(self):
+        return f"{self.model_name}:{self.backend}"
+
+    @abstractmethod
+    def encode(self, texts, batch_size=None, **kwargs):
+        """Vecteurs float32 (n, dimension) des textes."""
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+def _set_torch_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Modèle SentenceTransformer (PyTorch), éventuellement quantifié en int8."""
+
+    backend = "torch"
+
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=64, max_seq_length=256,
+                 threads=0, quantize=False):
+        super().__init__(model_name, batch_size, max_seq_length)
+        from sentence_transformers import SentenceTransformer
+
+        _set_torch_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.max_seq_length = max_seq_length
+        if quantize:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            self.backend = "int8"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        vectors = self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class OnnxEmbedder(Embedder):
+    """
+    Transformer exporté en ONNX + mean pooling + normalisation L2
+    (même pipeline que all-MiniLM-L6-v2 dans sentence-transformers).
+    """
+
+    backend = "onnx"
+
+    def __init__(self, model_dir, model_name=DEFAULT_MODEL, batch_size=64,
+                 max_seq_length=256, threads=0):
+        super().__init__(model_name, batch_size, max_seq_length)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = next(
+            (os.path.join(model_dir, f) for f in ("model_quantized.onnx", "model.onnx")
+             if os.path.exists(os.path.join(model_dir, f))),
+            None,
+        )
+        if model_path is None:
+            raise FileNotFoundError(
+                f"Aucun model.onnx dans {model_dir} (python embeddings.py export-onnx)"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+        self.model_path = model_path
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+        if self.backend == "onnx" and model_path.endswith("_quantized.onnx"):
+            self.backend = "onnx-int8"
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        batch_size = batch_size or self.batch_size
+
+        # Tri par longueur : moins de padding dans chaque batch
+        order = np.argsort([len(t) for t in texts])[::-1]
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            vectors[idx] = self._encode_batch([texts[i] for i in idx])
+        return vectors[0] if single else vectors
+
+
+def default_onnx_dir(model_name=DEFAULT_MODEL):
+    return os.path.join("models", f"{os.path.basename(model_name)}-onnx")
+
+
+def load_embedder(model_name=None, backend=None):
+    """Construit l'embedder configuré par les variables d'environnement."""
+    model_name = model_name or os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL)
+    backend = (backend or os.getenv("EMBEDDER_BACKEND", "torch")).lower()
+    batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    threads = int(os.getenv("EMBED_THREADS", "0"))
+    max_seq_length = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "256"))
+
+    if backend == "onnx":
+        model_dir = os.getenv("EMBED_ONNX_DIR", default_onnx_dir(model_name))
+        return OnnxEmbedder(model_dir, model_name, batch_size, max_seq_length, threads)
+    if backend in ("torch", "int8"):
+        return SentenceTransformerEmbedder(
+            model_name, batch_size, max_seq_length, threads, quantize=(backend == "int8")
+        )
+    raise ValueError(f"EMBEDDER_BACKEND inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+
+
+# ====== PARITÉ ======
+
+def check_parity(candidate, reference, texts=None, min_cosine=0.99):
+    """
+    Compare les vecteurs d'un backend à ceux du modèle de référence.
+
+    Returns:
+        dict {ok, min_cosine, mean_cosine, texts}
+    """
+    texts = texts or PARITY_TEXTS
+    a = np.asarray(candidate.encode(texts), dtype=np.float32)
+    b = np.asarray(reference.encode(texts), dtype=np.float32)
+    a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "ok": bool(cosines.min() >= min_cosine),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "texts": len(texts),
+    }
+
+
+# ====== EXPORT ONNX ======
+
+def export_onnx(model_name=DEFAULT_MODEL, out_dir=None, quantize=False, opset=14):
+    """Exporte le transformer sous-jacent en ONNX (+ tokenizer.json) pour OnnxEmbedder."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or default_onnx_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(out_dir)  # écrit tokenizer.json (tokenizer "fast")
+
+    sample = tokenizer(["export"], return_tensors="pt")
+    inputs = tuple(sample[k] for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample)
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, inputs, model_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    print(f"📦 Export ONNX: {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(out_dir, "model_quantized.onnx")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"📦 Export ONNX int8: {quantized_path}")
+    return out_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backends d'embedding : export ONNX et parité")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export-onnx", help="exporte le modèle en ONNX local")
+    export.add_argument("--model", default=DEFAULT_MODEL)
+    export.add_argument("--out")
+    export.add_argument("--quantize", action="store_true", help="ajoute une version int8")
+
+    parity = sub.add_parser("parity", help="compare un backend au modèle torch de référence")
+    parity.add_argument("--backend", choices=BACKENDS, default="onnx")
+    parity.add_argument("--model", default=DEFAULT_MODEL)
+    parity.add_argument("--min-cosine", type=float, default=0.99)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export-onnx":
+        export_onnx(args.model, args.out, args.quantize)
+        return 0
+
+    reference = SentenceTransformerEmbedder(args.model)
+    start = time.perf_counter()
+    candidate = load_embedder(args.model, args.backend)
+    print(f"⏱️  {candidate.name} chargé en {time.perf_counter() - start:.1f}s")
+    report = check_parity(candidate, reference, min_cosine=args.min_cosine)
+    emoji = "✅" if report["ok"] else "❌"
+    print(f"{emoji} Parité {candidate.name}: cosinus min={report['min_cosine']:.4f} "
+          f"moyen={report['mean_cosine']:.4f} (seuil {args.min_cosine})")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,16 +1,18 @@
 """
 Script d'évaluation RAG avec RAGAS
 Mesure la qualité des réponses générées par le système RAG
+
+ragas / datasets / openai sont importés seulement au moment du scoring :
+afficher le menu de run_tests.py ou collecter les réponses reste instantané.
 """
 
-from datasets import Dataset
-from ragas import evaluate
-from ragas.metrics import faithfulness, answer_correctness
-from openai import OpenAI
-from ragas.llms import llm_factory
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -23,8 +25,12 @@ load_dotenv()
 # ============================================================================
 
 API_URL = "http://localhost:5000/ask"
+BATCH_API_URL = "http://localhost:5000/ask_batch"
 RESULTS_DIR = "evaluation_results"
 
+# Nombre de requêtes /ask envoyées en parallèle au serveur Flask
+DEFAULT_WORKERS = 4
+
 # Clé API OpenAI (pour l'évaluateur RAGAS)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -95,12 +101,21 @@ def get_sources():
         print("   Vérifiez que le serveur Flask est démarré (python app.py)")
         return None
 
-def ask_rag(question, selected_sources):
+def create_session(workers=DEFAULT_WORKERS):
+    """Session HTTP avec un pool de connexions dimensionné pour `workers` threads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def ask_rag(question, selected_sources, session=None):
     """Interroge le système RAG et récupère la réponse + contexte"""
     payload = {"question": question, "selected_ids": selected_sources}
+    http = session or requests
     
     try:
-        response = requests.post(API_URL, json=payload, timeout=60)
+        response = http.post(API_URL, json=payload, timeout=60)
         
         if response.status_code != 200:
             print(f"  ❌ Erreur HTTP {response.status_code}")
@@ -122,25 +137,152 @@ def ask_rag(question, selected_sources):
         print(f"  ❌ Erreur: {e}")
         return None, []
 
+def ask_rag_batch(questions, selected_sources, session=None):
+    """
+    Interroge /ask_batch avec plusieurs questions en un seul appel (réponse NDJSON streamée).
+    
+    Yields:
+        (position dans `questions`, answer, chunks) au fil des réponses ; answer=None si échec
+    """
+    payload = {"questions": questions, "selected_ids": selected_sources, "stream": True}
+    http = session or requests
+    
+    try:
+        with http.post(BATCH_API_URL, json=payload, timeout=60 * len(questions), stream=True) as response:
+            if response.status_code != 200:
+                print(f"  ❌ Erreur HTTP {response.status_code}")
+                for i in range(len(questions)):
+                    yield i, None, []
+                return
+            
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                result = json.loads(line)
+                if "error" in result:
+                    print(f"  ❌ Erreur: {result['error']}")
+                    yield result["index"], None, []
+                    continue
+                yield result["index"], result.get("answer", ""), result.get("chunks") or ["Aucun contexte trouvé"]
+    
+    except requests.exceptions.Timeout:
+        print(f"  ⏱️  Timeout - Le batch a pris trop de temps")
+    except Exception as e:
+        print(f"  ❌ Erreur: {e}")
+
+# ============================================================================
+# CHECKPOINTS (reprise d'une évaluation interrompue)
+# ============================================================================
+
+def default_run_id(questions, selected_sources):
+    """Identifiant stable d'un run : mêmes questions + mêmes sources => même checkpoint"""
+    key = json.dumps(
+        [[q["question"] for q in questions], sorted(selected_sources)],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+def checkpoint_path(run_id):
+    return os.path.join(RESULTS_DIR, f"checkpoint_{run_id}.jsonl")
+
+def load_checkpoint(path):
+    """Charge les réponses déjà obtenues {index_question: entrée}"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # dernière ligne tronquée par un crash
+            done[entry["index"]] = entry
+    return done
+
+def collect_answers(questions, selected_sources, workers=DEFAULT_WORKERS, checkpoint=None, batch_size=0):
+    """
+    Interroge le RAG en parallèle (au plus `workers` requêtes simultanées).
+    Avec batch_size > 0, les questions partent par paquets via /ask_batch.
+    Chaque réponse est ajoutée au checkpoint dès qu'elle arrive.
+    
+    Returns:
+        Liste ordonnée d'entrées {index, question, answer, chunks} (échecs exclus)
+    """
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    if done:
+        print(f"♻️  Reprise: {len(done)}/{len(questions)} réponse(s) déjà en checkpoint")
+    
+    pending = [i for i in range(len(questions)) if i not in done]
+    lock = threading.Lock()
+    session = create_session(workers)
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    
+    def ask_one(i):
+        return i, ask_rag(questions[i]["question"], selected_sources, session=session)
+    
+    def record(i, answer, chunks):
+        item = questions[i]
+        
+        print(f"\n📝 Question {i + 1}/{len(questions)}")
+        print(f"   Catégorie: {item.get('category', 'général')}")
+        print(f"   Q: {item['question'][:70]}...")
+        
+        if answer is None:
+            print(f"   ❌ Échec - Question ignorée")
+            return
+        
+        entry = {"index": i, "question": item["question"], "answer": answer, "chunks": chunks}
+        with lock:
+            done[i] = entry
+            if checkpoint_file:
+                checkpoint_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                checkpoint_file.flush()
+        
+        print(f"   ✓ Réponse: {answer[:80]}...")
+        print(f"   ✓ Contexte: {len(chunks)} chunk(s)")
+    
+    try:
+        if batch_size:
+            for start in range(0, len(pending), batch_size):
+                indices = pending[start:start + batch_size]
+                texts = [questions[i]["question"] for i in indices]
+                for pos, answer, chunks in ask_rag_batch(texts, selected_sources, session=session):
+                    record(indices[pos], answer, chunks)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = [pool.submit(ask_one, i) for i in pending]
+                for future in as_completed(futures):
+                    i, (answer, chunks) = future.result()
+                    record(i, answer, chunks)
+    finally:
+        session.close()
+        if checkpoint_file:
+            checkpoint_file.close()
+    
+    return [done[i] for i in sorted(done)]
+
 # ============================================================================
 # ÉVALUATION PRINCIPALE
 # ============================================================================
 
-def evaluate_rag(questions=None, save=True):
+def evaluate_rag(questions=None, save=True, workers=DEFAULT_WORKERS, run_id=None, resume=True, batch_size=0):
     """
     Évalue le système RAG avec RAGAS
     
     Args:
         questions: Liste de questions à tester (utilise TEST_QUESTIONS par défaut)
         save: Si True, sauvegarde les résultats dans un fichier
+        workers: Nombre de requêtes /ask simultanées
+        run_id: Identifiant du checkpoint (par défaut: hash des questions + sources)
+        resume: Si True, reprend les réponses déjà présentes dans le checkpoint
+        batch_size: Si > 0, envoie les questions par paquets via /ask_batch
     """
     
     if questions is None:
         questions = TEST_QUESTIONS
     
-    # Créer le dossier de résultats
-    if save:
-        create_results_directory()
+    # Créer le dossier de résultats (aussi utilisé pour les checkpoints)
+    create_results_directory()
     
     # Récupérer les sources
     selected_sources = get_sources()
@@ -154,38 +296,35 @@ def evaluate_rag(questions=None, save=True):
     contexts = []
     categories = []
     
-    # Interroger le RAG pour chaque question
-    print(f"\n🔄 Interrogation du RAG ({len(questions)} questions)...")
+    # Interroger le RAG (en parallèle, avec checkpoint par question)
+    print(f"\n🔄 Interrogation du RAG ({len(questions)} questions, {workers} en parallèle)...")
     print("=" * 70)
     
-    for i, item in enumerate(questions, 1):
-        question = item["question"]
-        ground_truth = item["ground_truth"]
-        category = item.get("category", "général")
-        
-        print(f"\n📝 Question {i}/{len(questions)}")
-        print(f"   Catégorie: {category}")
-        print(f"   Q: {question[:70]}...")
-        
-        answer, chunks = ask_rag(question, selected_sources)
-        
-        if answer is None:
-            print(f"   ❌ Échec - Question ignorée")
-            continue
-        
-        test_questions.append(question)
-        ground_truths.append(ground_truth)
-        answers.append(answer)
-        contexts.append(chunks)
-        categories.append(category)
-        
-        print(f"   ✓ Réponse: {answer[:80]}...")
-        print(f"   ✓ Contexte: {len(chunks)} chunk(s)")
+    run_id = run_id or default_run_id(questions, selected_sources)
+    checkpoint = checkpoint_path(run_id)
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"🔖 Run: {run_id} (checkpoint: {checkpoint})")
+    
+    for entry in collect_answers(questions, selected_sources, workers, checkpoint, batch_size):
+        item = questions[entry["index"]]
+        test_questions.append(entry["question"])
+        ground_truths.append(item["ground_truth"])
+        answers.append(entry["answer"])
+        contexts.append(entry["chunks"])
+        categories.append(item.get("category", "général"))
     
     if not test_questions:
         print("\n❌ Aucune question n'a pu être traitée")
         return None
     
+    # Imports lourds (ragas tire pandas, langchain...), uniquement pour le scoring
+    from datasets import Dataset
+    from ragas import evaluate
+    from ragas.metrics import faithfulness
+    from openai import OpenAI
+    from ragas.llms import llm_factory
+    
     # Créer le dataset RAGAS
     print("\n📊 Préparation du dataset RAGAS...")
     dataset = Dataset.from_dict({
@@ -377,8 +516,13 @@ def evaluate_rag(questions=None, save=True):
             }
             
             # Sauvegarder les résultats
+            results_dict["run_id"] = run_id
             if save:
-                save_results(results_dict)
+                save_results(results_dict, filename=f"evaluation_{run_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            
+            # Run complet : le checkpoint n'est plus nécessaire
+            if os.path.exists(checkpoint):
+                os.remove(checkpoint)
             
             print("\n" + "=" * 70)
             print("✅ ÉVALUATION TERMINÉE")
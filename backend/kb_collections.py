@@ -0,0 +1,592 @@
+"""
+Collections nommées (espace de travail, cours, ...) : un index FAISS, des chunks
+et un stockage de texte par collection, persistés sur disque.
+
+- Chargement paresseux : une collection n'est lue depuis le disque qu'à sa
+  première utilisation.
+- Budget mémoire : au-delà de KB_MEMORY_MB, les collections inactives les
+  moins récemment utilisées sont déchargées (elles restent sur disque).
+
+Disposition sur disque (KB_DIR/<nom>/) :
+    index.faiss    index FAISS
+    meta.json      {version, name, embedding_model, dimension, sources, chunks}
+    texts.json     en-tête du TextStore (codec, blocs)
+    texts.bin      blocs de texte compressés
+    journal.jsonl  sources ajoutées depuis la dernière réécriture complète, une
+                   ligne {source, chunks, text_length, block_sizes, vectors, offset}
+    journal.bin    blocs de texte compressés puis vecteurs float32 de chaque ligne
+
+Un upload n'écrit que ce qu'il ajoute, à la fin du journal. Les fichiers de base
+ne sont réécrits (compaction) que quand le journal dépasse KB_COMPACT_RATIO fois
+leur taille, après un ré-encodage et avant un export de snapshot : le coût
+disque total des uploads reste linéaire en la taille de la collection.
+
+Chaque collection enregistre le modèle d'embedding de ses vecteurs : les
+questions sont encodées avec ce modèle, même si EMBEDDING_MODEL a changé,
+jusqu'à ce que le ré-encodage (cf. reembed.py) remplace l'index.
+
+Configuration (variables d'environnement) :
+    KB_DIR            dossier des collections                    (défaut: kb_data)
+    KB_MEMORY_MB      budget mémoire en Mo                       (défaut: 1024)
+    KB_COMPACT_RATIO  taille du journal / taille de la base qui
+                      déclenche une réécriture complète          (défaut: 1.0)
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+import metrics
+import models
+from text_store import create_text_store
+
+DEFAULT_COLLECTION = "default"
+# 2 : ajout de embedding_model (les collections au format 1 utilisent LEGACY_EMBEDDING_MODEL)
+# 3 : journal des ajouts (journal.jsonl / journal.bin), ignoré par les versions précédentes
+FORMAT_VERSION = 3
+SUPPORTED_VERSIONS = (1, 2, 3)
+LEGACY_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Dimension provisoire d'une collection vide (remplacée à son premier ajout)
+DEFAULT_DIMENSION = 384
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Coût mémoire approximatif d'un dict de chunk (offsets + pages) en Python
+CHUNK_OVERHEAD_BYTES = 400
+BASE_FILES = ("index.faiss", "meta.json", "texts.json", "texts.bin")
+JOURNAL, JOURNAL_BIN = "journal.jsonl", "journal.bin"
+COMPACT_RATIO = float(os.getenv("KB_COMPACT_RATIO", "1.0"))
+
+
+class CollectionNotFound(KeyError):
+    pass
+
+
+class InvalidCollectionName(ValueError):
+    pass
+
+
+class CollectionExists(Exception):
+    pass
+
+
+class CollectionBusy(Exception):
+    pass
+
+
+class EmbeddingModelChanged(ValueError):
+    """Embeddings calculés avec un autre modèle que celui de l'index (ré-encodage terminé entre-temps)."""
+    pass
+
+
+def validate_name(name):
+    """Nom de collection utilisable comme nom de dossier (pas de '/', '..', ...)."""
+    if not isinstance(name, str) or not NAME_RE.match(name):
+        raise InvalidCollectionName(
+            "Invalid collection name (1-64 characters: letters, digits, '-' or '_')"
+        )
+    return name
+
+
+class VectorSpace:
+    """
+    Index FAISS + modèle d'embedding qui a produit ses vecteurs.
+    Remplacés ensemble lors d'un ré-encodage : une requête garde l'espace
+    qu'elle a lu au départ (encodage de la question, recherche, rerank).
+    """
+
+    def __init__(self, index, model, lock):
+        self.index = index
+        self.model = model
+        self._lock = lock
+
+    @property
+    def dimension(self):
+        return self.index.d
+
+    def search(self, vectors, k):
+        """index.search protégé contre un ajout concurrent (upload)."""
+        with self._lock:
+            return self.index.search(vectors, k)
+
+    def vectors(self, ids):
+        """Vecteurs stockés dans l'index pour ces positions (reconstruits par FAISS)."""
+        with self._lock:
+            return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+
+class Collection:
+    """
+    Index + chunks + textes d'une collection.
+    `lock` protège l'état en mémoire (recherches, ajouts) ; `write_lock` sérialise
+    les écritures et l'accès au dossier, pour persister sans bloquer les recherches.
+    """
+
+    def __init__(self, name, path, embedding_model, dimension=DEFAULT_DIMENSION):
+        self.name = name
+        self.path = path
+        self.lock = threading.RLock()
+        self.write_lock = threading.RLock()
+        self.space = VectorSpace(faiss.IndexFlatL2(dimension), embedding_model, self.lock)
+        self.sources = []  # [{id, name, pages, chunk_count}]
+        self.chunks = []   # [{source_id, start, end, page_start, page_end, global_index}]
+        self.text_store = create_text_store()
+        self.last_used = time.monotonic()
+        self.users = 0  # requêtes en cours : une collection utilisée n'est jamais déchargée
+        self._stored_bytes = 0  # index + texte compressé + chunks (cf. _update_memory)
+        # Sur disque (sous write_lock) : taille des fichiers de base, fins valides du journal
+        self._base_bytes = 0
+        self._journal_end = 0
+        self._journal_bin_end = 0
+
+    @property
+    def index(self):
+        return self.space.index
+
+    @property
+    def embedding_model(self):
+        return self.space.model
+
+    @property
+    def dimension(self):
+        return self.space.dimension
+
+    # ====== LECTURE ======
+
+    def chunk_text(self, chunk):
+        """Texte d'un chunk : vue [start:end] sur le texte de sa source."""
+        return self.text_store.get(chunk["source_id"], chunk["start"], chunk["end"])
+
+    def select_chunks(self, selected_ids):
+        """Chunks de toutes les sources sélectionnées."""
+        selected = set(selected_ids)
+        return [chunk for chunk in self.chunks if chunk["source_id"] in selected]
+
+    def source_name(self, source_id):
+        return next(s["name"] for s in self.sources if s["id"] == source_id)
+
+    def search(self, vectors, k):
+        return self.space.search(vectors, k)
+
+    def vectors(self, ids):
+        return self.space.vectors(ids)
+
+    # ====== ÉCRITURE ======
+
+    def add_source(self, source, text, spans, embeddings, embedding_model):
+        """
+        Ajoute une source déjà découpée et encodée avec `embedding_model`, puis
+        l'ajoute au journal sur disque. Une collection vide adopte ce modèle et sa
+        dimension. Seul l'ajout en mémoire bloque les recherches, pas l'écriture.
+        """
+        with self.write_lock:
+            with self.lock:
+                if self.index.ntotal == 0:
+                    self.space = VectorSpace(
+                        faiss.IndexFlatL2(embeddings.shape[1]), embedding_model, self.lock
+                    )
+                elif embedding_model != self.embedding_model:
+                    raise EmbeddingModelChanged(self.embedding_model)
+                start_idx = self.index.ntotal
+                self.index.add(embeddings)
+                self.sources.append(source)
+                self.text_store.add(source["id"], text)
+                chunks = [
+                    {"source_id": source["id"], **span, "global_index": start_idx + i}
+                    for i, span in enumerate(spans)
+                ]
+                self.chunks.extend(chunks)
+            self._update_memory()
+            if start_idx == 0 or not self._base_bytes:
+                self.save()  # première écriture (ou nouvelle dimension) : base complète
+            else:
+                self._append_journal(source, chunks, embeddings)
+
+    def replace_space(self, index, embedding_model, encode):
+        """
+        Substitue un index ré-encodé avec `embedding_model` (mêmes positions que
+        les chunks). Les chunks ajoutés pendant le ré-encodage sont encodés ici
+        avec `encode`, sous le verrou d'écriture (aucun upload ne peut s'intercaler),
+        puis l'espace est remplacé d'un bloc.
+        """
+        with self.write_lock:
+            missing = self.chunks[index.ntotal:]
+            if missing:
+                texts = [self.chunk_text(chunk) for chunk in missing]
+                index.add(np.asarray(encode(texts), dtype=np.float32))
+            with self.lock:
+                self.space = VectorSpace(index, embedding_model, self.lock)
+            self._update_memory()
+            self.save()
+            return len(missing)
+
+    def _update_memory(self):
+        """Recalcule la taille stockée (après chargement, ajout ou ré-encodage uniquement)."""
+        store = self.text_store.stats()
+        self._stored_bytes = (
+            self.index.ntotal * self.dimension * 4
+            + store["compressed_bytes"]
+            + len(self.chunks) * CHUNK_OVERHEAD_BYTES
+        )
+
+    def memory_bytes(self):
+        """Taille approximative en mémoire, sans parcourir les blocs (appelé à chaque requête)."""
+        return self._stored_bytes + self.text_store.cached_chars
+
+    def info(self):
+        return {
+            "name": self.name,
+            "loaded": True,
+            "sources": len(self.sources),
+            "chunks": len(self.chunks),
+            "embedding_model": self.embedding_model,
+            "dimension": self.dimension,
+            "memory_mb": round(self.memory_bytes() / 2**20, 2),
+        }
+
+    # ====== PERSISTANCE ======
+
+    def _append_journal(self, source, chunks, embeddings):
+        """
+        Écrit une source ajoutée à la fin du journal (sous `write_lock`) : blocs
+        et vecteurs dans journal.bin, puis la ligne qui les décrit dans journal.jsonl.
+        Une écriture interrompue laisse une fin incomplète, ignorée à la lecture et
+        écrasée par l'ajout suivant. Compacte si le journal devient trop gros.
+        """
+        length, blocks = self.text_store.compressed(source["id"])
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        record = {
+            "source": source,
+            "chunks": chunks,
+            "text_length": length,
+            "block_sizes": [len(b) for b in blocks],
+            "vectors": len(vectors),
+            "offset": self._journal_bin_end,
+        }
+        data = b"".join(blocks) + vectors.tobytes()
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        journal_bytes = self._journal_bin_end + len(data) + self._journal_end + len(line)
+        if journal_bytes > COMPACT_RATIO * self._base_bytes:
+            self.save()
+            return
+        _write_at(os.path.join(self.path, JOURNAL_BIN), self._journal_bin_end, data)
+        _write_at(os.path.join(self.path, JOURNAL), self._journal_end, line)
+        self._journal_bin_end += len(data)
+        self._journal_end += len(line)
+
+    def compact(self):
+        """Réécrit les fichiers de base si le journal n'est pas vide (ex: avant un export)."""
+        with self.write_lock:
+            if self._journal_end:
+                self.save()
+
+    def save(self):
+        """
+        Écrit la collection complète (sans journal) dans un dossier temporaire puis
+        le substitue à l'ancien. Sous `write_lock` seulement : aucune écriture ne
+        peut modifier l'index ni les listes pendant ce temps, et les recherches
+        (lecture seule) continuent.
+        """
+        with self.write_lock:
+            with self.lock:
+                space = self.space
+                meta = {
+                    "version": FORMAT_VERSION,
+                    "name": self.name,
+                    "embedding_model": space.model,
+                    "dimension": space.dimension,
+                    "sources": list(self.sources),
+                    "chunks": list(self.chunks),
+                }
+            tmp = self.path + ".tmp"
+            old = self.path + ".old"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            faiss.write_index(space.index, os.path.join(tmp, "index.faiss"))
+            self.text_store.save(os.path.join(tmp, "texts"))
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            base_bytes = _files_bytes(tmp, BASE_FILES)
+
+            shutil.rmtree(old, ignore_errors=True)
+            if os.path.exists(self.path):
+                os.replace(self.path, old)
+            os.replace(tmp, self.path)
+            shutil.rmtree(old, ignore_errors=True)
+            self._base_bytes = base_bytes
+            self._journal_end = self._journal_bin_end = 0
+
+    @classmethod
+    def load(cls, name, path):
+        if not os.path.exists(path) and os.path.exists(path + ".old"):
+            # Arrêt pendant save() : l'ancienne version est complète
+            os.replace(path + ".old", path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Collection {name}: format {meta.get('version')} non supporté")
+
+        collection = cls(name, path, meta.get("embedding_model", LEGACY_EMBEDDING_MODEL))
+        index = faiss.read_index(os.path.join(path, "index.faiss"))
+        if index.d != meta["dimension"]:
+            raise ValueError(f"Collection {name}: index de dimension {index.d} != {meta['dimension']}")
+        collection.space = VectorSpace(index, collection.embedding_model, collection.lock)
+        collection.sources = meta["sources"]
+        collection.chunks = meta["chunks"]
+        collection.text_store = create_text_store(os.path.join(path, "texts"))
+        collection._base_bytes = _files_bytes(path, BASE_FILES)
+
+        entries, collection._journal_end, collection._journal_bin_end = _read_journal(path, index.d)
+        if entries:
+            index.add(np.concatenate([vectors for _, _, vectors in entries]))
+        for record, blocks, _ in entries:
+            collection.sources.append(record["source"])
+            collection.chunks.extend(record["chunks"])
+            collection.text_store.add_compressed(record["source"]["id"], record["text_length"], blocks)
+        if index.ntotal != len(collection.chunks):
+            raise ValueError(f"Collection {name}: {index.ntotal} vecteurs pour {len(collection.chunks)} chunks")
+        collection._update_memory()
+        return collection
+
+
+def _write_at(path, offset, data):
+    """Écrit `data` à la position `offset` et tronque ce qui suit (fin d'écriture interrompue)."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+
+def _files_bytes(directory, names):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in names if os.path.exists(os.path.join(directory, name))
+    )
+
+
+def _read_journal(path, dimension):
+    """
+    Ajouts complets du journal d'une collection, dans l'ordre.
+
+    Returns:
+        ([(ligne, blocs compressés, vecteurs)], fin valide du .jsonl, fin valide du .bin)
+    """
+    try:
+        with open(os.path.join(path, JOURNAL), "rb") as f:
+            lines = f.read().splitlines(keepends=True)
+        f = open(os.path.join(path, JOURNAL_BIN), "rb")
+    except FileNotFoundError:
+        return [], 0, 0
+
+    entries, end, bin_end = [], 0, 0
+    with f:
+        for line in lines:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record["offset"] != bin_end:
+                break
+            f.seek(bin_end)
+            blocks = [f.read(size) for size in record["block_sizes"]]
+            raw = f.read(record["vectors"] * dimension * 4)
+            if [len(b) for b in blocks] != record["block_sizes"] or len(raw) != record["vectors"] * dimension * 4:
+                break  # ligne écrite mais données tronquées
+            entries.append((record, blocks, np.frombuffer(raw, dtype=np.float32).reshape(-1, dimension)))
+            end += len(line)
+            bin_end = f.tell()
+    return entries, end, bin_end
+
+
+class CollectionManager:
+    """Collections chargées à la demande, déchargées en LRU sous un budget mémoire."""
+
+    def __init__(self, root, memory_budget_bytes, embedding_model=LEGACY_EMBEDDING_MODEL):
+        self.root = root
+        self.memory_budget = memory_budget_bytes
+        self.embedding_model = embedding_model  # modèle des nouvelles collections
+        self._loaded = OrderedDict()  # {nom: Collection}, du moins au plus récemment utilisé
+        self._loading = {}  # {nom: Event} des collections en cours de lecture sur disque
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        path = self._path(name)
+        return name in self._loaded or os.path.exists(path) or os.path.exists(path + ".old")
+
+    def names(self):
+        on_disk = {
+            entry for entry in os.listdir(self.root)
+            if NAME_RE.match(entry) and os.path.isdir(self._path(entry))
+        }
+        return sorted(on_disk | set(self._loaded))
+
+    def _get(self, name, create):
+        """
+        Collection chargée (lue sur disque si besoin). La lecture se fait hors de
+        `_lock` : seules les requêtes sur la même collection attendent son chargement.
+        """
+        validate_name(name)
+        path = self._path(name)
+        while True:
+            with self._lock:
+                collection = self._loaded.get(name)
+                if collection is not None:
+                    return self._acquire(name, collection)
+                loading = self._loading.get(name)
+                if loading is None:
+                    if not (os.path.exists(path) or os.path.exists(path + ".old")):
+                        if not create:
+                            raise CollectionNotFound(name)
+                        self._loaded[name] = Collection(name, path, self.embedding_model)
+                        return self._acquire(name, self._loaded[name])
+                    loading = self._loading[name] = threading.Event()
+                    break
+            loading.wait()  # chargée par une autre requête (ou échec : on réessaie)
+
+        try:
+            start = time.perf_counter()
+            collection = Collection.load(name, path)
+            print(f"📂 Collection {name} chargée en {time.perf_counter() - start:.2f}s "
+                  f"({len(collection.chunks)} chunks)")
+            with self._lock:
+                # Un import (install) a pu installer une version plus récente entre-temps
+                collection = self._loaded.setdefault(name, collection)
+                return self._acquire(name, collection)
+        finally:
+            with self._lock:
+                del self._loading[name]
+            loading.set()
+
+    def _acquire(self, name, collection):
+        """Sous `_lock` : marque la collection utilisée (jamais déchargée pendant ce temps)."""
+        self._loaded.move_to_end(name)
+        collection.users += 1
+        collection.last_used = time.monotonic()
+        self._evict()
+        return collection
+
+    def _release(self, collection):
+        with self._lock:
+            collection.users -= 1
+            self._evict()
+
+    @contextmanager
+    def use(self, name, create=False):
+        """
+        Collection `name` pour la durée d'une requête (jamais déchargée pendant ce temps).
+        Lève CollectionNotFound si elle n'existe pas et que `create` est faux.
+        """
+        collection = self._get(name, create)
+        try:
+            yield collection
+        finally:
+            self._release(collection)
+
+    def _evict(self):
+        """Décharge les collections inactives les plus anciennes tant que le budget est dépassé."""
+        total = sum(c.memory_bytes() for c in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            collection = self._loaded[name]
+            if collection.users > 0:
+                continue
+            total -= collection.memory_bytes()
+            del self._loaded[name]
+            print(f"💤 Collection {name} déchargée (budget {self.memory_budget // 2**20} Mo)")
+        metrics.set_collection_stats(len(self._loaded), total)
+
+    def unload(self, name):
+        """Décharge une collection inactive (elle reste sur disque)."""
+        with self._lock:
+            collection = self._loaded.get(name)
+            if collection is None or collection.users > 0:
+                return False
+            del self._loaded[name]
+            self._evict()
+            return True
+
+    def embedding_model_of(self, name):
+        """Modèle d'embedding d'une collection, sans la charger si elle est sur disque."""
+        with self._lock:
+            collection = self._loaded.get(name)
+        if collection is not None:
+            return collection.embedding_model
+        path = self._path(name)
+        if not os.path.exists(path):
+            path += ".old"
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f).get("embedding_model", LEGACY_EMBEDDING_MODEL)
+
+    def install(self, name, directory, overwrite=False):
+        """
+        Remplace (ou crée) la collection `name` par celle du dossier `directory`
+        (import de snapshot). Le dossier est validé en le chargeant avant la substitution.
+        """
+        validate_name(name)
+        collection = Collection.load(name, directory)
+        if collection.index.ntotal != len(collection.chunks):
+            raise ValueError("Collection index and chunks are out of sync")
+
+        path = self._path(name)
+        with self._lock:
+            if self.exists(name) and not overwrite:
+                raise CollectionExists(name)
+            current = self._loaded.get(name)
+            if current is not None and current.users > 0:
+                raise CollectionBusy(name)
+            shutil.rmtree(path + ".old", ignore_errors=True)
+            if os.path.exists(path):
+                os.replace(path, path + ".old")
+            os.replace(directory, path)
+            shutil.rmtree(path + ".old", ignore_errors=True)
+
+            collection.path = path
+            self._loaded.pop(name, None)
+            self._loaded[name] = collection
+            collection.last_used = time.monotonic()
+            self._evict()
+        return collection
+
+    def info(self):
+        with self._lock:
+            loaded = {name: c.info() for name, c in self._loaded.items()}
+        return [
+            loaded.get(name, {"name": name, "loaded": False})
+            for name in self.names()
+        ]
+
+    def totals(self):
+        """Tailles cumulées des collections chargées, pour les jauges Prometheus."""
+        with self._lock:
+            collections = list(self._loaded.values())
+        stores = [c.text_store.stats() for c in collections]
+        return {
+            "vectors": sum(c.index.ntotal for c in collections),
+            "chunks": sum(len(c.chunks) for c in collections),
+            "sources": sum(len(c.sources) for c in collections),
+            "text_chars": sum(s["chars"] for s in stores),
+            "text_compressed_bytes": sum(s["compressed_bytes"] for s in stores),
+        }
+
+
+def create_manager():
+    """CollectionManager configuré par les variables d'environnement."""
+    return CollectionManager(
+        os.getenv("KB_DIR", "kb_data"),
+        int(float(os.getenv("KB_MEMORY_MB", "1024")) * 2**20),
+        models.embedding_model(),
+    )
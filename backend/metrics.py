@@ -0,0 +1,234 @@
+"""
+Métriques Prometheus du backend RAG
+Histogrammes de latence par étape du pipeline + jauges (index, chunks, caches)
+
+Activé par défaut si `prometheus_client` est installé.
+METRICS_ENABLED=0 désactive tout : `stage()` renvoie alors un context manager
+partagé qui ne fait rien (coût quasi nul sur le chemin chaud).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+except ImportError:  # dépendance optionnelle
+    CollectorRegistry = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Étapes instrumentées du pipeline RAG (tout autre nom est refusé par stage())
+STAGES = frozenset((
+    "pdf_extraction",
+    "chunking",
+    "embedding",
+    "vector_search",
+    "metadata_scan",
+    "rerank",
+    "batch_wait",
+    "admission_wait",
+    "prompt_build",
+    "llm_call",
+    "transcription",
+))
+
+# Buckets adaptés à des étapes allant de la milliseconde (search) à la dizaine de secondes (LLM)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ENABLED = (
+    CollectorRegistry is not None
+    and os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+)
+
+_NULL_STAGE = nullcontext()
+
+if ENABLED:
+    REGISTRY = CollectorRegistry()
+
+    STAGE_LATENCY = Histogram(
+        "rag_stage_duration_seconds",
+        "Durée de chaque étape du pipeline RAG",
+        ["stage"],
+        buckets=LATENCY_BUCKETS,
+        registry=REGISTRY,
+    )
+    INDEX_SIZE = Gauge(
+        "rag_index_vectors",
+        "Nombre de vecteurs dans l'index FAISS",
+        registry=REGISTRY,
+    )
+    CHUNK_COUNT = Gauge(
+        "rag_chunks",
+        "Nombre de chunks indexés",
+        registry=REGISTRY,
+    )
+    SOURCE_COUNT = Gauge(
+        "rag_sources",
+        "Nombre de sources PDF chargées",
+        registry=REGISTRY,
+    )
+    COLLECTIONS_LOADED = Gauge(
+        "rag_collections_loaded",
+        "Collections actuellement chargées en mémoire",
+        registry=REGISTRY,
+    )
+    COLLECTIONS_MEMORY = Gauge(
+        "rag_collections_memory_bytes",
+        "Mémoire estimée des collections chargées",
+        registry=REGISTRY,
+    )
+    TEXT_STORE_BYTES = Gauge(
+        "rag_text_store_bytes",
+        "Taille du texte stocké (brut en caractères, compressé en octets)",
+        ["kind"],
+        registry=REGISTRY,
+    )
+    BATCH_SIZE = Histogram(
+        "rag_batch_size",
+        "Nombre de requêtes regroupées par micro-batch",
+        ["batcher"],
+        buckets=(1, 2, 4, 8, 16, 32, 64),
+        registry=REGISTRY,
+    )
+    ADMISSION_QUEUE = Gauge(
+        "rag_admission_queue_depth",
+        "Requêtes en attente d'un slot LLM, par file",
+        ["queue"],
+        registry=REGISTRY,
+    )
+    ADMISSION_ACTIVE = Gauge(
+        "rag_admission_active",
+        "Slots LLM occupés, par file",
+        ["queue"],
+        registry=REGISTRY,
+    )
+    ADMISSION_WAIT = Histogram(
+        "rag_admission_wait_seconds",
+        "Attente d'un slot LLM avant exécution, par file",
+        ["queue"],
+        buckets=LATENCY_BUCKETS,
+        registry=REGISTRY,
+    )
+    ADMISSION_REJECTED = Counter(
+        "rag_admission_rejected_total",
+        "Requêtes refusées (429) par le contrôle d'admission",
+        ["queue", "reason"],
+        registry=REGISTRY,
+    )
+    CACHE_REQUESTS = Counter(
+        "rag_cache_requests_total",
+        "Accès aux caches internes",
+        ["cache", "result"],
+        registry=REGISTRY,
+    )
+    CACHE_HIT_RATE = Gauge(
+        "rag_cache_hit_ratio",
+        "Taux de hit cumulé de chaque cache",
+        ["cache"],
+        registry=REGISTRY,
+    )
+
+_cache_lock = threading.Lock()
+_cache_stats = {}  # {cache: [hits, misses]}
+
+
+def _check_stage(stage):
+    if stage not in STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+
+def observe_stage(stage, seconds):
+    """Enregistre une durée (en secondes) pour une étape."""
+    _check_stage(stage)
+    if ENABLED:
+        STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def _timed_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def stage(name):
+    """Context manager qui mesure la durée d'une étape du pipeline."""
+    _check_stage(name)
+    if not ENABLED:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+def observe_batch(batcher, size):
+    """Enregistre la taille d'un micro-batch."""
+    if ENABLED:
+        BATCH_SIZE.labels(batcher=batcher).observe(size)
+
+
+def set_index_stats(index_size, chunk_count, source_count):
+    """Met à jour les jauges de taille de la base vectorielle."""
+    if ENABLED:
+        INDEX_SIZE.set(index_size)
+        CHUNK_COUNT.set(chunk_count)
+        SOURCE_COUNT.set(source_count)
+
+
+def set_collection_stats(loaded, memory_bytes):
+    """Met à jour les jauges des collections chargées (cf. kb_collections.py)."""
+    if ENABLED:
+        COLLECTIONS_LOADED.set(loaded)
+        COLLECTIONS_MEMORY.set(memory_bytes)
+
+
+def set_text_store_stats(raw_chars, compressed_bytes):
+    """Met à jour les jauges de taille du stockage de texte compressé."""
+    if ENABLED:
+        TEXT_STORE_BYTES.labels(kind="raw").set(raw_chars)
+        TEXT_STORE_BYTES.labels(kind="compressed").set(compressed_bytes)
+
+
+def set_admission_queue(queue, waiting, active):
+    """Met à jour la profondeur et l'occupation d'une file d'admission."""
+    if ENABLED:
+        ADMISSION_QUEUE.labels(queue=queue).set(waiting)
+        ADMISSION_ACTIVE.labels(queue=queue).set(active)
+
+
+def observe_admission_wait(queue, seconds):
+    if ENABLED:
+        ADMISSION_WAIT.labels(queue=queue).observe(seconds)
+
+
+def record_admission_rejected(queue, reason):
+    if ENABLED:
+        ADMISSION_REJECTED.labels(queue=queue, reason=reason).inc()
+
+
+def record_cache(cache, hit):
+    """Compte un hit/miss sur un cache nommé et met à jour son taux de hit."""
+    if not ENABLED:
+        return
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+    with _cache_lock:
+        stats = _cache_stats.setdefault(cache, [0, 0])
+        stats[0 if hit else 1] += 1
+        ratio = stats[0] / (stats[0] + stats[1])
+    CACHE_HIT_RATE.labels(cache=cache).set(ratio)
+
+
+def render():
+    """Renvoie (payload, content_type) au format d'exposition Prometheus."""
+    if not ENABLED:
+        return b"# metrics disabled\n", CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,120 @@
+"""
+Chargement paresseux des composants lourds (embedder, client Groq)
+Le serveur Flask démarre sans importer torch / sentence-transformers :
+les modèles sont chargés au premier usage ou par le warmup en arrière-plan.
+
+Plusieurs embedders peuvent être chargés en même temps : pendant un
+ré-encodage, les collections encore indexées avec l'ancien modèle continuent
+d'encoder leurs questions avec lui (cf. reembed.py).
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_embedder_lock = threading.Lock()
+_client_lock = threading.Lock()
+_embedders = {}  # {nom du modèle: embedder}
+_client = None
+
+# État exposé par /readyz : "pending" -> "loading" -> "ready" | "error"
+STATUS = {
+    "embedder": "pending",
+    "llm_client": "pending",
+    "warmup": "pending",
+}
+ERRORS = {}
+
+
+def embedding_model():
+    """Modèle d'embedding configuré (celui des nouvelles collections et des ré-encodages)."""
+    return os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+
+def get_embedder(model_name=None):
+    """
+    Renvoie l'embedder de `model_name` (par défaut le modèle configuré, cf.
+    embeddings.py), chargé une seule fois, thread-safe.
+    """
+    model_name = model_name or embedding_model()
+    embedder = _embedders.get(model_name)
+    if embedder is not None:
+        return embedder
+    with _embedder_lock:
+        if model_name not in _embedders:
+            # /readyz ne suit que le modèle configuré
+            configured = model_name == embedding_model()
+            if configured:
+                STATUS["embedder"] = "loading"
+            start = time.perf_counter()
+            try:
+                from embeddings import load_embedder
+                embedder = load_embedder(model_name)
+            except Exception as e:
+                if configured:
+                    STATUS["embedder"] = "error"
+                    ERRORS["embedder"] = str(e)
+                raise
+            _embedders[model_name] = embedder
+            if configured:
+                STATUS["embedder"] = "ready"
+            print(f"🧠 Embedder {embedder.name} chargé en {time.perf_counter() - start:.1f}s")
+    return _embedders[model_name]
+
+
+def release_embedders(keep):
+    """Libère les embedders qui ne sont plus dans `keep` (rechargés à la demande si besoin)."""
+    with _embedder_lock:
+        for model_name in [m for m in _embedders if m not in keep]:
+            del _embedders[model_name]
+            print(f"🧹 Embedder {model_name} libéré")
+
+
+def get_llm_client():
+    """Renvoie le client Groq (créé au premier appel)."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            STATUS["llm_client"] = "loading"
+            try:
+                from groq import Groq
+                _client = Groq()
+            except Exception as e:
+                STATUS["llm_client"] = "error"
+                ERRORS["llm_client"] = str(e)
+                raise
+            STATUS["llm_client"] = "ready"
+    return _client
+
+
+def warmup():
+    """Charge les modèles et fait un encode factice (premier appel torch = le plus lent)."""
+    STATUS["warmup"] = "loading"
+    start = time.perf_counter()
+    try:
+        get_embedder().encode(["warmup"])
+        get_llm_client()
+    except Exception as e:
+        STATUS["warmup"] = "error"
+        ERRORS["warmup"] = str(e)
+        print(f"❌ Warmup échoué: {e}")
+        return
+    STATUS["warmup"] = "ready"
+    print(f"🔥 Warmup terminé en {time.perf_counter() - start:.1f}s")
+
+
+def start_warmup():
+    """Lance le warmup dans un thread daemon (désactivable avec WARMUP=0)."""
+    if os.getenv("WARMUP", "1").lower() in ("0", "false", "no"):
+        return None
+    thread = threading.Thread(target=warmup, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return STATUS["embedder"] == "ready" and STATUS["llm_client"] == "ready"
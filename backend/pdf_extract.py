@@ -0,0 +1,289 @@
+"""
+Extraction du texte des PDF : moteurs interchangeables + cache par page
+
+Moteurs (utilisés seulement s'ils sont installés) :
+    pdfplumber  précis (mise en page), mais lent : référence historique
+    pdfium      pypdfium2 (dépendance de pdfplumber), texte brut, très rapide
+    pymupdf     PyMuPDF (fitz), texte brut, très rapide
+    pypdf       pypdf, pur Python, plus rapide que pdfplumber
+    auto        moteur rapide disponible, avec repli page par page sur
+                pdfplumber quand le texte obtenu semble vide ou illisible
+
+Le texte de chaque page est mis en cache par (hash du fichier, moteur, page) :
+un nouvel essai ou un re-chunking avec d'autres paramètres ne ré-extrait rien.
+
+Configuration (variables d'environnement) :
+    PDF_ENGINE          moteur par défaut            (défaut: auto)
+    PDF_PAGE_CACHE_MB   taille du cache des pages    (défaut: 64)
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import metrics
+
+ENGINES = ("pdfplumber", "pdfium", "pymupdf", "pypdf")
+# Ordre de préférence du mode auto (du plus rapide au plus lent)
+FAST_ENGINES = ("pymupdf", "pdfium", "pypdf")
+ENGINE_MODULES = {
+    "pdfplumber": "pdfplumber",
+    "pdfium": "pypdfium2",
+    "pymupdf": "fitz",
+    "pypdf": "pypdf",
+}
+
+CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f�]")
+
+# pypdfium2 n'est pas thread-safe : un seul document pdfium ouvert à la fois
+_pdfium_lock = threading.Lock()
+
+
+# ====== MOTEURS ======
+# Chaque moteur : open(data) -> document avec page_count, text(i) et close()
+
+class _PdfplumberDocument:
+    def __init__(self, data):
+        import pdfplumber
+        self._pdf = pdfplumber.open(io.BytesIO(data))
+        self.page_count = len(self._pdf.pages)
+
+    def text(self, i):
+        page = self._pdf.pages[i]
+        try:
+            return page.extract_text() or ""
+        finally:
+            page.close()  # libère le cache d'objets de la page
+
+    def close(self):
+        self._pdf.close()
+
+
+class _PdfiumDocument:
+    def __init__(self, data):
+        import pypdfium2
+        _pdfium_lock.acquire()
+        self._pdf = None
+        try:
+            self._pdf = pypdfium2.PdfDocument(data)
+            self.page_count = len(self._pdf)
+        except BaseException:
+            # Le verrou doit être libéré même si le document est illisible
+            try:
+                if self._pdf is not None:
+                    self._pdf.close()
+            finally:
+                _pdfium_lock.release()
+            raise
+
+    def text(self, i):
+        page = self._pdf[i]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self):
+        try:
+            self._pdf.close()
+        finally:
+            _pdfium_lock.release()
+
+
+class _PymupdfDocument:
+    def __init__(self, data):
+        import fitz
+        self._pdf = fitz.open(stream=data, filetype="pdf")
+        self.page_count = self._pdf.page_count
+
+    def text(self, i):
+        return self._pdf[i].get_text()
+
+    def close(self):
+        self._pdf.close()
+
+
+class _PypdfDocument:
+    def __init__(self, data):
+        from pypdf import PdfReader
+        self._pdf = PdfReader(io.BytesIO(data))
+        self.page_count = len(self._pdf.pages)
+
+    def text(self, i):
+        return self._pdf.pages[i].extract_text() or ""
+
+    def close(self):
+        pass
+
+
+_DOCUMENTS = {
+    "pdfplumber": _PdfplumberDocument,
+    "pdfium": _PdfiumDocument,
+    "pymupdf": _PymupdfDocument,
+    "pypdf": _PypdfDocument,
+}
+
+
+def is_available(engine):
+    import importlib.util
+    return importlib.util.find_spec(ENGINE_MODULES[engine]) is not None
+
+
+def available_engines():
+    return [engine for engine in ENGINES if is_available(engine)]
+
+
+def resolve_engine(engine):
+    """Valide le moteur demandé ; "auto" devient le moteur rapide disponible (ou pdfplumber)."""
+    engine = (engine or "auto").lower()
+    if engine == "auto":
+        return next((e for e in FAST_ENGINES if is_available(e)), "pdfplumber")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown PDF engine: {engine} (expected: auto, {', '.join(ENGINES)})")
+    if not is_available(engine):
+        raise ValueError(f"PDF engine not installed: {engine}")
+    return engine
+
+
+def looks_unreadable(text):
+    """
+    Heuristique de repli du mode auto : page vide, caractères de contrôle
+    (encodage de police cassé) ou mots collés (espaces perdus).
+    """
+    stripped = text.strip()
+    if not stripped:
+        return True
+    if len(CONTROL_RE.findall(stripped)) > 0.05 * len(stripped):
+        return True
+    words = stripped.split()
+    return len(stripped) > 200 and len(stripped) / len(words) > 25
+
+
+# ====== CACHE DES PAGES ======
+
+class PageCache:
+    """
+    LRU {(hash, moteur, page): texte} borné en octets (texte encodé en UTF-8),
+    + nombre de pages par fichier. Le nombre de pages n'est gardé que tant qu'au
+    moins une page du fichier est en cache : il est évincé avec sa dernière page.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._pages = OrderedDict()  # {clé: (texte, moteur, octets)}
+        self._page_counts = {}   # {hash: nombre de pages du PDF}
+        self._cached_pages = {}  # {hash: pages de ce fichier présentes dans le LRU}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+        metrics.record_cache("pdf_pages", entry is not None)
+        return entry[:2] if entry is not None else None
+
+    def put(self, key, text, engine):
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            else:
+                self._cached_pages[key[0]] = self._cached_pages.get(key[0], 0) + 1
+            self._pages[key] = (text, engine, size)
+            self._bytes += size
+            while self._pages and self._bytes > self.max_bytes:
+                (digest, _, _), (_, _, evicted) = self._pages.popitem(last=False)
+                self._bytes -= evicted
+                self._cached_pages[digest] -= 1
+                if not self._cached_pages[digest]:
+                    del self._cached_pages[digest]
+                    self._page_counts.pop(digest, None)
+
+    def page_count(self, file_hash):
+        return self._page_counts.get(file_hash)
+
+    def set_page_count(self, file_hash, count):
+        """À appeler après put() : ignoré si aucune page du fichier n'est restée en cache."""
+        with self._lock:
+            if file_hash in self._cached_pages:
+                self._page_counts[file_hash] = count
+
+
+PAGE_CACHE = PageCache(int(float(os.getenv("PDF_PAGE_CACHE_MB", "64")) * 2**20))
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def extract_pages(data, engine=None, cache=PAGE_CACHE):
+    """
+    Texte de chaque page du PDF `data` (bytes).
+
+    Returns:
+        (pages: list[str], rapport {engine, file_hash, pages_by_engine, cached_pages, seconds})
+    """
+    requested = (engine or os.getenv("PDF_ENGINE", "auto")).lower()
+    primary = resolve_engine(requested)
+    fallback = requested == "auto" and primary != "pdfplumber" and is_available("pdfplumber")
+    digest = file_hash(data)
+    start = time.perf_counter()
+
+    page_count = cache.page_count(digest) if cache else None
+    pages = [None] * page_count if page_count is not None else None
+    engines = {}  # {page: moteur qui a produit le texte}
+    cached = 0
+    if pages is not None:
+        for i in range(page_count):
+            entry = cache.get((digest, requested, i))
+            if entry is not None:
+                pages[i], engines[i] = entry
+                cached += 1
+
+    missing = None if pages is None else [i for i, text in enumerate(pages) if text is None]
+    if missing is None or missing:
+        document = _DOCUMENTS[primary](data)
+        try:
+            if pages is None:
+                pages = [None] * document.page_count
+                missing = list(range(document.page_count))
+            for i in missing:
+                pages[i] = document.text(i)
+                engines[i] = primary
+        finally:
+            document.close()
+
+        retry = [i for i in missing if fallback and looks_unreadable(pages[i])]
+        if retry:
+            # Repli page par page sur pdfplumber, plus lent mais plus robuste
+            document = _DOCUMENTS["pdfplumber"](data)
+            try:
+                for i in retry:
+                    text = document.text(i)
+                    if len(text.strip()) > len(pages[i].strip()):
+                        pages[i], engines[i] = text, "pdfplumber"
+            finally:
+                document.close()
+
+        if cache:
+            for i in missing:
+                cache.put((digest, requested, i), pages[i], engines[i])
+            cache.set_page_count(digest, len(pages))
+
+    report = {
+        "engine": requested if requested != "auto" else f"auto:{primary}",
+        "file_hash": digest,
+        "pages_by_engine": dict(Counter(engines.values())),
+        "cached_pages": cached,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    return pages, report
@@ -0,0 +1,477 @@
+"""
+Quiz (QCM) structurés et banque de questions par source
+
+- Le texte du LLM est découpé côté serveur en questions structurées
+  {question, choices, answer, ...}. Chaque question est validée (4 options
+  A-D distinctes, une lettre de réponse) ; seules les questions invalides ou
+  manquantes sont redemandées au LLM.
+- Les questions valides vont dans une banque par collection et par source,
+  indexée par chunk (section du prompt dont la question est tirée).
+- /quiz pioche dans la banque quand elle suffit (quelques ms, sans LLM ni
+  file d'admission : seule la génération prend un slot "quiz") ; la
+  banque est complétée en arrière-plan jusqu'à QUIZ_BANK_TARGET questions par
+  source, en visant les chunks les moins couverts.
+
+Configuration (variables d'environnement) :
+    QUIZ_BANK_ENABLED    1 = banque utilisée, 0 = quiz généré à chaque requête (défaut: 1)
+    QUIZ_BANK_TARGET     questions gardées par source                         (défaut: 20)
+    QUIZ_BANK_DIR        dossier de la banque             (défaut: <KB_DIR>/.quiz_bank)
+    QUIZ_BANK_CACHE      banques (collections) gardées en mémoire, LRU         (défaut: 16)
+    QUIZ_QUESTIONS       questions par quiz                                    (défaut: 5)
+    QUIZ_MAX_RETRIES     nouvelles demandes pour les questions invalides       (défaut: 2)
+"""
+
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import admission
+import tracing
+
+LETTERS = "ABCD"
+# Texte des sections envoyé au LLM par génération
+MAX_PROMPT_CHARS = 12000
+
+BLOCK_RE = re.compile(r"^\s*\**\s*\d+\s*[.)]\s+", re.M)
+HEADER_RE = re.compile(r"^\[(?P<meta>[^\]]*)\]\s*[-–—:]?\s*(?P<question>.*)$")
+DOCUMENT_RE = re.compile(r"document\s*:\s*([^|\]]+?)\s*(?:[|,]|$)", re.I)
+SECTION_RE = re.compile(r"section\s*:?\s*(\d+)", re.I)
+CHOICE_RE = re.compile(r"^\(?([A-Da-d])\s*[).:]\s*(.+?)$")
+ANSWER_RE = re.compile(
+    r"^\**\s*r[ée]ponse(?:\s+correcte)?\s*\**\s*:?\s*\**\s*\(?([A-Da-d])\b\)?\**\s*[).:-]?\s*(.*)$",
+    re.I,
+)
+
+
+# ====== PARSING ======
+
+def _parse_block(block):
+    lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+    if not lines:
+        return None
+    item = {"question": "", "choices": [], "letters": [], "answer": None,
+            "explanation": "", "document": None, "section": None}
+
+    header = HEADER_RE.match(lines[0])
+    if header:
+        meta = header.group("meta")
+        document = DOCUMENT_RE.search(meta)
+        section = SECTION_RE.search(meta)
+        item["document"] = document.group(1).strip() if document else None
+        item["section"] = int(section.group(1)) if section else None
+        question_lines = [header.group("question")]
+    else:
+        question_lines = [lines[0]]
+
+    for line in lines[1:]:
+        answer = ANSWER_RE.match(line)
+        if answer:
+            item["answer"] = LETTERS.index(answer.group(1).upper())
+            item["explanation"] = answer.group(2).strip()
+            continue
+        choice = CHOICE_RE.match(line)
+        if choice:
+            item["letters"].append(choice.group(1).upper())
+            item["choices"].append(choice.group(2).strip())
+        elif not item["choices"]:
+            question_lines.append(line)  # question sur plusieurs lignes
+    item["question"] = " ".join(part for part in question_lines if part).strip()
+    return item
+
+
+def validate(item):
+    """Raison du rejet d'une question parsée, ou None si elle est valide."""
+    if len(item["question"]) < 5:
+        return "missing question"
+    if item["letters"] != list(LETTERS):
+        return "expected options A, B, C, D"
+    if any(not choice for choice in item["choices"]):
+        return "empty option"
+    if len({choice.lower() for choice in item["choices"]}) != len(item["choices"]):
+        return "duplicate options"
+    if item["answer"] is None:
+        return "missing answer letter"
+    return None
+
+
+def parse_quiz(text):
+    """
+    Questions structurées d'un QCM généré par le LLM.
+
+    Returns:
+        (questions valides, [raison du rejet de chaque question invalide])
+    """
+    questions, rejected = [], []
+    for block in BLOCK_RE.split(text or "")[1:]:
+        item = _parse_block(block)
+        if item is None:
+            continue
+        error = validate(item)
+        if error:
+            rejected.append(error)
+            continue
+        del item["letters"]
+        item["answer_letter"] = LETTERS[item["answer"]]
+        item["id"] = hashlib.sha1(
+            "\n".join([item["question"], *item["choices"]]).lower().encode("utf-8")
+        ).hexdigest()[:12]
+        questions.append(item)
+    return questions, rejected
+
+
+def render_quiz(questions):
+    """Texte du quiz au format historique (réponse "result" de /quiz)."""
+    lines = []
+    for i, q in enumerate(questions, 1):
+        document = f"[Document: {q['document']}] - " if q.get("document") else ""
+        lines.append(f"{i}. {document}{q['question']}")
+        lines.extend(f"   {letter}) {choice}" for letter, choice in zip(LETTERS, q["choices"]))
+        lines.append(f"   Réponse correcte : {q['answer_letter']}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# ====== PROMPT ======
+
+def build_prompt(documents, total_questions, avoid=None):
+    """
+    Prompt de génération d'un QCM.
+    `documents` : [(nom du document, [(numéro de section, texte)])], sections numérotées
+    globalement pour rattacher chaque question à son chunk.
+    """
+    blocks = []
+    for source_name, sections in documents:
+        blocks.append(f"\n{'='*60}")
+        blocks.append(f"DOCUMENT SOURCE: {source_name}")
+        blocks.append(f"{'='*60}\n")
+        for number, text in sections:
+            blocks.append(f"[Section {number}]")
+            blocks.append(text)
+            blocks.append("")  # Ligne vide pour séparation
+    combined_text = "\n\n".join(blocks)
+    names = [name for name, _ in documents]
+
+    avoid_text = ""
+    if avoid:
+        listed = "\n".join(f"- {q}" for q in avoid)
+        avoid_text = f"\nNE REPRENDS PAS ces questions déjà posées :\n{listed}\n"
+
+    return f"""Tu es un expert en création de quiz. Tu dois créer un QCM basé STRICTEMENT sur le contenu suivant.
+
+RÈGLES ABSOLUES :
+1. Les questions et réponses doivent venir DIRECTEMENT du texte fourni
+2. Ne PAS inventer d'informations
+3. Vérifie que chaque réponse correcte correspond exactement à une information du texte
+4. Les mauvaises réponses doivent être plausibles mais clairement incorrectes
+
+CONTENU SOURCE ({len(names)} document(s) : {', '.join(names)}) :
+{combined_text}
+{avoid_text}
+INSTRUCTIONS DE GÉNÉRATION :
+- Génère exactement {total_questions} questions QCM
+- Répartis les questions équitablement entre tous les documents
+- Pour chaque question :
+  * Cite le document source et le numéro de la section utilisée
+  * Pose une question claire basée sur une information factuelle du texte
+  * Propose 4 options (A, B, C, D)
+  * UNE SEULE réponse correcte qui correspond EXACTEMENT au texte
+  * 3 réponses incorrectes mais plausibles
+  * Indique la lettre de la bonne réponse (A, B, C ou D)
+
+EXEMPLE DE FORMAT :
+1. [Document: exemple.pdf | Section 3] - Quelle est la définition de X selon le document ?
+   A) Première définition incorrecte
+   B) Définition correcte tirée du texte
+   C) Deuxième définition incorrecte
+   D) Troisième définition incorrecte
+   Réponse correcte : B
+
+GÉNÈRE LE QUIZ MAINTENANT (respecte strictement le format ci-dessus) :
+"""
+
+
+# ====== BANQUE ======
+
+class QuestionBank:
+    """
+    {collection: {source_id: [questions]}} persisté en JSON (un fichier par
+    collection), avec génération synchrone si la banque ne suffit pas et
+    complément en arrière-plan. Seules les `max_banks` banques les plus
+    récemment utilisées restent en mémoire (relues sur disque au besoin).
+
+    `llm(prompt) -> texte` : appel LLM du quiz (cf. app.py).
+    """
+
+    def __init__(self, root, manager, llm, target_per_source=20, questions=5, max_retries=2,
+                 max_banks=16):
+        self.root = root
+        self.manager = manager
+        self.llm = llm
+        self.target = target_per_source
+        self.questions = questions
+        self.max_retries = max_retries
+        self.max_banks = max_banks
+        self._banks = OrderedDict()  # {collection: banque}, du moins au plus récemment utilisé
+        self._served = Counter()  # {id: fois servie} (en mémoire)
+        self._lock = threading.Lock()
+        self._pending = set()  # (collection, source_id) en attente de complément
+        self._queue = queue.Queue()
+        self._worker = None
+
+    # ---- stockage ----
+
+    def _path(self, collection_name):
+        return os.path.join(self.root, f"{collection_name}.json")
+
+    def _bank(self, collection_name):
+        """Banque d'une collection (sous `_lock`), relue sur disque si elle a été évincée."""
+        bank = self._banks.get(collection_name)
+        if bank is None:
+            try:
+                with open(self._path(collection_name), encoding="utf-8") as f:
+                    bank = json.load(f)
+            except FileNotFoundError:
+                bank = {}
+            self._banks[collection_name] = bank
+            while len(self._banks) > self.max_banks:
+                _, evicted = self._banks.popitem(last=False)
+                # Compteurs de service des questions évincées : repartent de 0 au rechargement
+                for entries in evicted.values():
+                    for q in entries:
+                        self._served.pop(q["id"], None)
+        self._banks.move_to_end(collection_name)
+        return bank
+
+    def _save(self, collection_name, bank):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._path(collection_name) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(bank, f, ensure_ascii=False)
+        os.replace(tmp, self._path(collection_name))
+
+    def add(self, collection_name, questions):
+        """Ajoute des questions validées (dédoublonnées par id) ; renvoie le nombre ajouté."""
+        with self._lock:
+            bank = self._bank(collection_name)
+            added = 0
+            for q in questions:
+                entries = bank.setdefault(q["source_id"], [])
+                if all(e["id"] != q["id"] for e in entries):
+                    entries.append(q)
+                    added += 1
+            if added:
+                self._save(collection_name, bank)
+        return added
+
+    def count(self, collection_name, source_id):
+        with self._lock:
+            return len(self._bank(collection_name).get(source_id, []))
+
+    def chunk_counts(self, collection_name, source_id):
+        """Nombre de questions en banque par chunk d'une source."""
+        with self._lock:
+            return Counter(q["chunk"] for q in self._bank(collection_name).get(source_id, []))
+
+    def sample(self, collection_name, source_ids, per_source, rng=random):
+        """
+        `per_source` questions de chaque source, les moins servies d'abord et
+        sur des chunks différents si possible ; None si la banque ne suffit pas.
+        """
+        picked = []
+        with self._lock:
+            bank = self._bank(collection_name)
+            for source_id in source_ids:
+                entries = list(bank.get(source_id, []))
+                if len(entries) < per_source:
+                    return None
+                rng.shuffle(entries)
+                entries.sort(key=lambda q: self._served[q["id"]])
+                chosen, chunks = [], set()
+                for q in entries:
+                    if len(chosen) < per_source and q["chunk"] not in chunks:
+                        chosen.append(q)
+                        chunks.add(q["chunk"])
+                for q in entries:
+                    if len(chosen) < per_source and q not in chosen:
+                        chosen.append(q)
+                picked.extend(chosen)
+            for q in picked:
+                self._served[q["id"]] += 1
+        return [dict(q) for q in picked]
+
+    def stats(self, collection_name):
+        with self._lock:
+            bank = self._bank(collection_name)
+            return {source_id: len(entries) for source_id, entries in bank.items()}
+
+    # ---- génération ----
+
+    def _sections(self, collection, source_id, max_chars):
+        """Chunks d'une source à donner au LLM : les moins couverts par la banque d'abord."""
+        counts = self.chunk_counts(collection.name, source_id)
+        chunks = [c for c in collection.chunks if c["source_id"] == source_id]
+        chunks.sort(key=lambda c: counts[c["global_index"]])  # tri stable : ordre du document
+        sections, total = [], 0
+        for chunk in chunks:
+            # Texte relu depuis le store seulement pour les chunks retenus
+            text = collection.chunk_text(chunk).strip()
+            if sections and total + len(text) >= max_chars:
+                break
+            sections.append((chunk, text))
+            total += len(text)
+        sections.sort(key=lambda s: s[0]["global_index"])
+        return sections
+
+    def generate(self, collection, source_ids, per_source):
+        """
+        Génère et valide `per_source` questions par source ; redemande au LLM
+        uniquement les questions invalides ou manquantes (QUIZ_MAX_RETRIES fois).
+
+        Returns:
+            (questions avec source_id + chunk, rapport {attempts, rejected})
+        """
+        documents, by_section, by_name = [], {}, {}
+        number = 0
+        max_chars = MAX_PROMPT_CHARS // len(source_ids)
+        for source_id in source_ids:
+            name = collection.source_name(source_id)
+            by_name[name.lower()] = source_id
+            sections = []
+            for chunk, text in self._sections(collection, source_id, max_chars):
+                number += 1
+                by_section[number] = (source_id, chunk["global_index"])
+                sections.append((number, text))
+            documents.append((name, sections))
+            print(f"  → {name}: {len(sections)} sections")
+
+        wanted = per_source * len(source_ids)
+        questions, seen, rejected = [], set(), []
+        attempts = 0
+        while len(questions) < wanted and attempts <= self.max_retries:
+            missing = wanted - len(questions)
+            if attempts:
+                print(f"🔁 Quiz : {missing} question(s) invalide(s) ou manquante(s), nouvelle demande")
+            avoid = [q["question"] for q in questions] if attempts else None
+            with tracing.stage("prompt_build"):
+                prompt = build_prompt(documents, missing, avoid)
+            parsed, errors = parse_quiz(self.llm(prompt))
+            rejected.extend(errors)
+            attempts += 1
+            for q in parsed:
+                if q["id"] in seen:
+                    continue
+                if q["section"] in by_section:
+                    q["source_id"], q["chunk"] = by_section[q["section"]]
+                else:
+                    # Section absente ou inconnue : rattachée au document cité, sans chunk
+                    q["source_id"] = by_name.get((q["document"] or "").lower(), source_ids[0])
+                    q["chunk"] = None
+                del q["section"]  # numéro propre au prompt : remplacé par le chunk
+                seen.add(q["id"])
+                questions.append(q)
+        return questions[:wanted], {"attempts": attempts, "rejected": rejected}
+
+    # ---- /quiz ----
+
+    def quiz(self, collection, source_ids, use_bank=True, count=None):
+        """
+        Questions d'un quiz sur `source_ids` : tirées de la banque si elle suffit,
+        sinon générées maintenant (et ajoutées à la banque).
+
+        Returns:
+            (questions, infos {served_from, ...})
+        """
+        count = count or self.questions
+        per_source = max(1, count // len(source_ids))
+
+        if use_bank:
+            start = time.perf_counter()
+            questions = self.sample(collection.name, source_ids, per_source)
+            if questions is not None:
+                self.top_up(collection.name, source_ids)
+                return questions, {
+                    "served_from": "bank",
+                    "seconds": round(time.perf_counter() - start, 4),
+                }
+
+        # Slot d'admission seulement pour l'appel LLM (pas pour les tirages en banque)
+        with admission.slot("quiz"):
+            questions, report = self.generate(collection, source_ids, per_source)
+        self.add(collection.name, questions)
+        if use_bank:
+            self.top_up(collection.name, source_ids)
+        return questions, {"served_from": "llm", **report}
+
+    # ---- complément en arrière-plan ----
+
+    def top_up(self, collection_name, source_ids):
+        """Planifie le complément des sources sous QUIZ_BANK_TARGET questions."""
+        for source_id in source_ids:
+            key = (collection_name, source_id)
+            with self._lock:
+                if key in self._pending:
+                    continue
+            if self.count(collection_name, source_id) >= self.target:
+                continue
+            with self._lock:
+                self._pending.add(key)
+            self._ensure_worker()
+            self._queue.put(key)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="quiz-bank", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            collection_name, source_id = self._queue.get()
+            try:
+                self._fill(collection_name, source_id)
+            except admission.Overloaded:
+                print(f"🚦 Banque de quiz : complément de {collection_name}/{source_id} reporté (serveur chargé)")
+            except Exception as e:
+                print(f"❌ Banque de quiz : complément de {collection_name}/{source_id} échoué: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard((collection_name, source_id))
+
+    def _fill(self, collection_name, source_id):
+        if not self.manager.exists(collection_name):
+            return
+        with self.manager.use(collection_name) as collection:
+            if all(s["id"] != source_id for s in collection.sources):
+                return
+            # Quelques générations au plus par passage ; la suivante est planifiée par /quiz
+            for _ in range(4):
+                if self.count(collection_name, source_id) >= self.target:
+                    return
+                with admission.slot("quiz_bank"):
+                    questions, _ = self.generate(collection, [source_id], self.questions)
+                if not self.add(collection_name, questions):
+                    return  # plus rien de nouveau
+                print(f"🏦 Banque de quiz {collection_name}/{collection.source_name(source_id)}: "
+                      f"{self.count(collection_name, source_id)} question(s)")
+
+
+def create_question_bank(manager, llm):
+    """QuestionBank configurée par les variables d'environnement."""
+    return QuestionBank(
+        os.getenv("QUIZ_BANK_DIR", os.path.join(manager.root, ".quiz_bank")),
+        manager,
+        llm,
+        target_per_source=int(os.getenv("QUIZ_BANK_TARGET", "20")),
+        questions=int(os.getenv("QUIZ_QUESTIONS", "5")),
+        max_retries=int(os.getenv("QUIZ_MAX_RETRIES", "2")),
+        max_banks=int(os.getenv("QUIZ_BANK_CACHE", "16")),
+    )
+
+
+BANK_ENABLED = os.getenv("QUIZ_BANK_ENABLED", "1").lower() not in ("0", "false", "no")
@@ -0,0 +1,150 @@
+"""
+Ré-encodage des collections quand le modèle d'embedding change
+
+Une collection indexée avec un autre modèle qu'EMBEDDING_MODEL est ré-encodée
+en arrière-plan, par batches, depuis le texte stocké de ses chunks (aucun PDF
+à ré-uploader). Pendant ce temps, les questions utilisent l'ancien index avec
+l'ancien modèle. Le nouvel index remplace ensuite l'ancien d'un bloc, après
+encodage des chunks ajoutés entre-temps.
+
+Configuration (variables d'environnement) :
+    REEMBED_ON_START     1 = ré-encoder au démarrage les collections périmées (défaut: 1)
+    REEMBED_BATCH_SIZE   chunks encodés par batch                            (défaut: 256)
+"""
+
+import os
+import threading
+import time
+
+import faiss
+import numpy as np
+
+import models
+
+
+class Reembedder:
+    """Job de ré-encodage en arrière-plan (un seul à la fois), avec progression."""
+
+    def __init__(self, manager, batch_size=256):
+        self.manager = manager
+        self.batch_size = batch_size
+        self._running = False
+        self._queued = []  # collections à traiter à la fin du job en cours
+        self._lock = threading.Lock()
+        self.state = {"status": "idle", "model": None, "collections": {}}
+
+    def start(self, names=None):
+        """
+        Lance le job sur `names` (par défaut toutes les collections).
+        Renvoie False si un job est déjà en cours.
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._launch(names)
+            return True
+
+    def enqueue(self, names):
+        """
+        Ré-encode `names` : lance un job, ou les ajoute au job en cours (traitées
+        à sa fin). Renvoie "started" ou "queued".
+        """
+        with self._lock:
+            if not self._running:
+                self._launch(names)
+                return "started"
+            self._queued.extend(name for name in names if name not in self._queued)
+            self.state["queued"] = list(self._queued)
+            return "queued"
+
+    def _launch(self, names):
+        self._running = True
+        self.state = {
+            "status": "running",
+            "model": models.embedding_model(),
+            "started_at": time.time(),
+            "collections": {},
+        }
+        threading.Thread(target=self._run, args=(names,), name="reembed", daemon=True).start()
+
+    def _run(self, names):
+        model = self.state["model"]
+        names = list(names or self.manager.names())
+        try:
+            while True:
+                for name in names:
+                    self._reembed(name, model)
+                with self._lock:
+                    names, self._queued = self._queued, []
+                    self.state.pop("queued", None)
+                    if not names:
+                        self.state["status"] = "done"
+                        self.state["finished_at"] = time.time()
+                        failed = any(c["status"] == "error" for c in self.state["collections"].values())
+                        self._running = False
+                        break
+        except Exception as e:
+            with self._lock:
+                self.state["status"] = "error"
+                self.state["error"] = str(e)
+                self.state["queued"] = self._queued  # non traitées
+                self._queued = []
+                self._running = False
+            print(f"❌ Ré-encodage interrompu: {e}")
+            return
+        # L'ancien modèle n'est plus nécessaire (rechargé si une collection l'utilise encore)
+        if not failed:
+            models.release_embedders(keep={model})
+
+    def _reembed(self, name, model):
+        progress = {"status": "pending", "done": 0, "total": 0}
+        self.state["collections"][name] = progress
+        if self.manager.embedding_model_of(name) == model:
+            progress["status"] = "up_to_date"  # pas besoin de charger la collection
+            return
+        with self.manager.use(name) as collection:
+            if collection.embedding_model == model:
+                progress["status"] = "up_to_date"
+                return
+            with collection.lock:
+                chunks = list(collection.chunks)
+            progress.update(status="running", total=len(chunks), from_model=collection.embedding_model)
+            print(f"🔁 Ré-encodage de {name}: {collection.embedding_model} -> {model} "
+                  f"({len(chunks)} chunks)")
+            start = time.perf_counter()
+            try:
+                embedder = models.get_embedder(model)
+                index = None
+                for i in range(0, len(chunks), self.batch_size):
+                    texts = [collection.chunk_text(c) for c in chunks[i:i + self.batch_size]]
+                    vectors = np.asarray(embedder.encode(texts), dtype=np.float32)
+                    if index is None:
+                        index = faiss.IndexFlatL2(vectors.shape[1])
+                    index.add(vectors)
+                    progress["done"] = index.ntotal
+                if index is None:
+                    index = faiss.IndexFlatL2(embedder.get_sentence_embedding_dimension())
+                added = collection.replace_space(index, model, embedder.encode)
+            except Exception as e:
+                progress.update(status="error", error=str(e))
+                print(f"❌ Ré-encodage de {name} échoué: {e}")
+                return
+            progress.update(status="done", done=index.ntotal, total=index.ntotal,
+                            seconds=round(time.perf_counter() - start, 2))
+            print(f"✅ {name} ré-encodé en {progress['seconds']}s ({added} chunk(s) ajouté(s) pendant le job)")
+
+    def status(self):
+        state = dict(self.state)
+        state["collections"] = {name: dict(p) for name, p in self.state["collections"].items()}
+        return state
+
+
+def create_reembedder(manager):
+    return Reembedder(manager, batch_size=int(os.getenv("REEMBED_BATCH_SIZE", "256")))
+
+
+def start_on_boot(reembedder):
+    """Ré-encode au démarrage les collections d'un autre modèle (désactivable avec REEMBED_ON_START=0)."""
+    if os.getenv("REEMBED_ON_START", "1").lower() in ("0", "false", "no"):
+        return False
+    return reembedder.start()
@@ -0,0 +1,157 @@
+"""
+Sélection adaptative des chunks envoyés au LLM (/ask, /ask_batch)
+
+1. Score de pertinence = cosinus (vecteurs normalisés) entre la question et
+   chaque candidat FAISS, recalculé depuis les vecteurs stockés dans l'index.
+2. k adaptatif : on coupe sous un score minimal, ou dès que les scores
+   "décrochent" (écart entre deux candidats consécutifs au-delà d'un seuil).
+3. MMR (maximal marginal relevance) vectorisée sur les candidats restants :
+   λ·pertinence − (1−λ)·similarité max aux chunks déjà retenus, ce qui écarte
+   les quasi-doublons.
+
+Chaque candidat reçoit une décision ("selected", "below_threshold", "after_cliff",
+"duplicate", "mmr_limit") renvoyée au client avec son score.
+
+Configuration (variables d'environnement) :
+    RETRIEVAL_ADAPTIVE     1 = k adaptatif + MMR, 0 = 5 premiers voisins (défaut: 1)
+    RETRIEVAL_MAX_K        chunks max envoyés au LLM            (défaut: 5)
+    RETRIEVAL_MIN_K        chunks min, même sous le seuil       (défaut: 1)
+    RETRIEVAL_MIN_SCORE    cosinus minimal                      (défaut: 0.2)
+    RETRIEVAL_CLIFF        décrochage entre deux scores voisins (défaut: 0.15)
+    RETRIEVAL_MMR_LAMBDA   poids pertinence vs diversité        (défaut: 0.7)
+    RETRIEVAL_DUPLICATE    similarité au-delà = doublon         (défaut: 0.95)
+"""
+
+import os
+
+import numpy as np
+
+REASONS = {
+    "selected": "retenu par MMR (pertinent et non redondant)",
+    "below_threshold": "score sous le seuil minimal",
+    "after_cliff": "après un décrochage des scores",
+    "duplicate": "quasi-doublon d'un chunk déjà retenu",
+    "mmr_limit": "pertinent mais au-delà du nombre max de chunks",
+}
+
+
+def load_config():
+    return {
+        "adaptive": os.getenv("RETRIEVAL_ADAPTIVE", "1").lower() not in ("0", "false", "no"),
+        "max_k": int(os.getenv("RETRIEVAL_MAX_K", "5")),
+        "min_k": int(os.getenv("RETRIEVAL_MIN_K", "1")),
+        "min_score": float(os.getenv("RETRIEVAL_MIN_SCORE", "0.2")),
+        "cliff": float(os.getenv("RETRIEVAL_CLIFF", "0.15")),
+        "mmr_lambda": float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7")),
+        "duplicate": float(os.getenv("RETRIEVAL_DUPLICATE", "0.95")),
+    }
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def rank(query_vector, candidate_vectors):
+    """Positions des candidats triées par cosinus décroissant avec la question."""
+    scores = _normalize(candidate_vectors) @ _normalize(query_vector).reshape(-1)
+    return [int(i) for i in np.argsort(-scores, kind="stable")]
+
+
+def adaptive_cut(scores, min_score, cliff, min_k=1):
+    """
+    Nombre de candidats à garder (scores triés par ordre décroissant) et raison de la coupure.
+
+    Returns:
+        (n, "below_threshold" | "after_cliff" | None)
+    """
+    n = len(scores)
+    if n == 0:
+        return 0, None
+    below = np.flatnonzero(scores < min_score)
+    cut_threshold = int(below[0]) if len(below) else n
+    gaps = np.flatnonzero(scores[:-1] - scores[1:] > cliff) + 1
+    cut_cliff = int(gaps[0]) if len(gaps) else n
+
+    cut = min(cut_threshold, cut_cliff)
+    reason = None
+    if cut < n:
+        reason = "below_threshold" if cut_threshold <= cut_cliff else "after_cliff"
+    return max(cut, min(min_k, n)), reason
+
+
+def mmr(query, vectors, k, mmr_lambda=0.7, duplicate=0.95):
+    """
+    MMR vectorisée sur des vecteurs normalisés. Un candidat trop similaire
+    (>= `duplicate`) à un chunk déjà retenu n'est jamais retenu.
+
+    Returns:
+        (indices retenus dans l'ordre de sélection,
+         similarité max de chaque candidat aux chunks retenus)
+    """
+    n = len(vectors)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    max_sim = np.full(n, -np.inf, dtype=np.float32)  # similarité max à la sélection courante
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if selected and max_sim[best] >= duplicate:
+            continue
+        selected.append(best)
+        max_sim = np.maximum(max_sim, similarity[best])
+    return selected, max_sim
+
+
+def select(query_vector, candidate_vectors, config):
+    """
+    Choisit les chunks à envoyer au LLM parmi les candidats (ordre FAISS).
+
+    Returns:
+        (positions retenues dans l'ordre du prompt, décisions par candidat
+         [{"position", "score", "decision", "rank"}] dans l'ordre FAISS)
+    """
+    n = len(candidate_vectors)
+    if n == 0:
+        return [], []
+    query = _normalize(query_vector).reshape(-1)
+    vectors = _normalize(candidate_vectors)
+    scores = vectors @ query
+
+    order = np.argsort(-scores, kind="stable")
+    keep, cut_reason = adaptive_cut(scores[order], config["min_score"], config["cliff"], config["min_k"])
+    pool = order[:keep]
+
+    picked, max_sim = mmr(
+        query, vectors[pool], config["max_k"], config["mmr_lambda"], config["duplicate"]
+    )
+    selected = [int(pool[i]) for i in picked]
+
+    decisions = {
+        int(p): "duplicate" if max_sim[i] >= config["duplicate"] else "mmr_limit"
+        for i, p in enumerate(pool)
+    }
+    decisions.update({p: "selected" for p in selected})
+    for p in order[keep:]:
+        decisions[int(p)] = (
+            "below_threshold" if scores[p] < config["min_score"] else cut_reason or "after_cliff"
+        )
+    ranks = {p: rank for rank, p in enumerate(selected, 1)}
+
+    report = [
+        {
+            "position": i,
+            "score": round(float(scores[i]), 4),
+            "decision": decisions[i],
+            "rank": ranks.get(i),
+        }
+        for i in range(n)
+    ]
+    return selected, report
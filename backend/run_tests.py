@@ -1,18 +1,36 @@
 """
 Script de lancement des tests d'évaluation RAG
 Permet de choisir quel type d'évaluation lancer
+
+Mode interactif (menu) :
+    python run_tests.py
+Mode batch (CI, scripts) :
+    python run_tests.py --suite all --workers 8
+    python run_tests.py --suite all --run-id abc123      # reprend un run interrompu
+    python run_tests.py --list
 """
 
+import argparse
 import sys
-from evaluate_rag import evaluate_rag
+from evaluate_rag import evaluate_rag, DEFAULT_WORKERS
 from test_questions import (
     BASIC_QUESTIONS,
     EXTENDED_QUESTIONS,
     ADVANCED_QUESTIONS,
     ALL_QUESTIONS,
+    DOCUMENT_QUESTIONS,
     print_questions_summary
 )
 
+# Suites disponibles en mode batch : nom -> (questions, libellé)
+SUITES = {
+    "basic": (BASIC_QUESTIONS, "Évaluation de base"),
+    "extended": (EXTENDED_QUESTIONS, "Évaluation étendue"),
+    "advanced": (ADVANCED_QUESTIONS, "Évaluation avancée"),
+    "all": (ALL_QUESTIONS, "Évaluation complète"),
+    "documents": (DOCUMENT_QUESTIONS, "Évaluation sur les PDF de data/"),
+}
+
 def print_menu():
     """Affiche le menu de sélection"""
     print("\n" + "="*70)
@@ -27,13 +45,20 @@ def print_menu():
     print("  0. Quitter\n")
     print("="*70)
 
-def run_evaluation(questions, test_name):
+def run_evaluation(questions, test_name, workers=DEFAULT_WORKERS, run_id=None, resume=True, batch_size=0):
     """Lance une évaluation avec les questions données"""
     print(f"\n🚀 Lancement: {test_name}")
     print(f"📝 Nombre de questions: {len(questions)}")
     print("-"*70)
     
-    results = evaluate_rag(questions=questions, save=True)
+    results = evaluate_rag(
+        questions=questions,
+        save=True,
+        workers=workers,
+        run_id=run_id,
+        resume=resume,
+        batch_size=batch_size
+    )
     
     if results:
         print(f"\n✅ {test_name} terminée avec succès!")
@@ -87,7 +112,41 @@ def main():
         except Exception as e:
             print(f"\n❌ Erreur: {e}")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Évaluation RAG (menu interactif si aucune option)")
+    parser.add_argument("--suite", choices=sorted(SUITES), help="suite de questions à évaluer")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"requêtes /ask simultanées (défaut: {DEFAULT_WORKERS})")
+    parser.add_argument("--run-id", help="identifiant du checkpoint à reprendre")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="ignore le checkpoint existant et repart de zéro")
+    parser.add_argument("--batch", type=int, default=0, metavar="N",
+                        help="envoie les questions par paquets de N via /ask_batch")
+    parser.add_argument("--list", action="store_true", help="affiche les questions disponibles")
+    return parser.parse_args(argv)
+
+def run_batch(args):
+    """Mode non interactif : code de sortie 0 si succès, 1 sinon"""
+    if args.list:
+        print_questions_summary()
+        return 0
+    
+    questions, test_name = SUITES[args.suite]
+    ok = run_evaluation(
+        questions,
+        test_name,
+        workers=args.workers,
+        run_id=args.run_id,
+        resume=not args.no_resume,
+        batch_size=args.batch
+    )
+    return 0 if ok else 1
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.suite or args.list:
+        sys.exit(run_batch(args))
+    
     print("="*70)
     print("🔬 SYSTÈME D'ÉVALUATION RAG")
     print("="*70)
@@ -0,0 +1,131 @@
+"""
+Cache de retrieval par conversation (questions de suivi sur /ask)
+
+Pour chaque conversation_id, on garde les candidats de la dernière recherche
+complète (chunks + vecteurs normalisés) et le vecteur de la question qui les a
+produits. Une question de suivi proche de cette question est re-scorée sur ces
+candidats au lieu d'interroger tout l'index.
+
+Bornes :
+    SESSION_TTL_S           expiration d'une session inactive   (défaut: 900)
+    SESSION_MAX_SESSIONS    sessions gardées au maximum          (défaut: 1000)
+    SESSION_MAX_MB          mémoire totale des vecteurs en cache (défaut: 64)
+    SESSION_CANDIDATES      candidats gardés par session         (défaut: 40)
+    SESSION_SIMILARITY      cosinus min avec la question d'origine
+                            pour réutiliser les candidats        (défaut: 0.7)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+# Coût approximatif d'un candidat hors vecteur (dict de chunk partagé + liste)
+CANDIDATE_OVERHEAD_BYTES = 100
+
+
+class SessionCache:
+    """{conversation_id: candidats} en LRU, avec TTL glissant et plafond mémoire."""
+
+    def __init__(self, ttl_s=900, max_sessions=1000, max_bytes=64 * 2**20,
+                 max_candidates=40, similarity=0.7):
+        self.ttl = ttl_s
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_candidates = max_candidates
+        self.similarity = similarity
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _scope(collection, space, selected_ids):
+        # Les candidats ne valent que pour la même collection, dans le même état
+        # (modèle d'embedding + taille de l'index), et les mêmes sources
+        return (collection.name, space.model, space.index.ntotal, frozenset(selected_ids))
+
+    def lookup(self, conversation_id, collection, space, selected_ids, query_vector):
+        """
+        Candidats réutilisables pour cette question, ou None.
+
+        Returns:
+            (candidats, vecteurs, similarité avec la question d'origine) ou (None, None, similarité|None)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(conversation_id)
+            if session is not None:
+                session["expires"] = now + self.ttl
+                self._sessions.move_to_end(conversation_id)
+
+        if session is None or session["scope"] != self._scope(collection, space, selected_ids):
+            metrics.record_cache("session_candidates", False)
+            return None, None, None
+
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarity = float(session["anchor"] @ query)
+        hit = similarity >= self.similarity
+        metrics.record_cache("session_candidates", hit)
+        if not hit:
+            return None, None, similarity
+        return session["candidates"], session["vectors"], similarity
+
+    def store(self, conversation_id, collection, space, selected_ids, query_vector, candidates, vectors):
+        """Remplace les candidats de la session par ceux d'une recherche complète."""
+        candidates = candidates[:self.max_candidates]
+        vectors = np.asarray(vectors[:len(candidates)], dtype=np.float32)
+        anchor = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        anchor = anchor / max(float(np.linalg.norm(anchor)), 1e-12)
+        size = vectors.nbytes + anchor.nbytes + len(candidates) * CANDIDATE_OVERHEAD_BYTES
+
+        now = time.monotonic()
+        with self._lock:
+            self._drop(conversation_id)
+            self._sessions[conversation_id] = {
+                "scope": self._scope(collection, space, selected_ids),
+                "anchor": anchor,
+                "candidates": candidates,
+                "vectors": vectors,
+                "bytes": size,
+                "expires": now + self.ttl,
+            }
+            self._bytes += size
+            self._expire(now)
+            while self._sessions and (
+                len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._sessions)))
+
+    def _drop(self, conversation_id):
+        session = self._sessions.pop(conversation_id, None)
+        if session is not None:
+            self._bytes -= session["bytes"]
+
+    def _expire(self, now):
+        # L'ordre LRU suit aussi l'ordre d'expiration (TTL glissant identique pour tous)
+        while self._sessions:
+            conversation_id, session = next(iter(self._sessions.items()))
+            if session["expires"] > now:
+                break
+            self._drop(conversation_id)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes}
+
+
+def create_session_cache():
+    """SessionCache configuré par les variables d'environnement."""
+    return SessionCache(
+        ttl_s=float(os.getenv("SESSION_TTL_S", "900")),
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+        max_bytes=int(float(os.getenv("SESSION_MAX_MB", "64")) * 2**20),
+        max_candidates=int(os.getenv("SESSION_CANDIDATES", "40")),
+        similarity=float(os.getenv("SESSION_SIMILARITY", "0.7")),
+    )
@@ -0,0 +1,252 @@
+"""
+Export / import d'une collection en un seul fichier binaire (snapshot)
+
+Pour monter un nouveau nœud ou revenir en arrière sans ré-uploader ni
+ré-encoder les PDF : le snapshot contient les fichiers de la collection
+(index FAISS avec les embeddings, sources + chunks, texte compressé).
+Il est écrit et relu en flux, fichier par fichier, sans être construit en mémoire.
+
+Format (entiers big-endian) :
+    "RAGKBSNP" + version (u16)
+    manifeste : longueur (u32) + JSON + sha256 (32 o)
+    pour chaque fichier :
+        longueur du nom (u16) + nom + flags (u8, 1 = zlib)
+        trames : longueur (u32) + octets, terminées par une trame vide
+        sha256 du contenu décompressé (32 o)
+    fin : longueur de nom 0
+
+CLI :
+    python snapshot.py export cours-ia cours-ia.snap
+    python snapshot.py import cours-ia.snap --name cours-ia-v2 [--overwrite]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+import uuid
+import zlib
+
+MAGIC = b"RAGKBSNP"
+SNAPSHOT_VERSION = 1
+FRAME_BYTES = 1 << 20
+# Fichiers d'une collection (cf. kb_collections.py) -> compressés dans le snapshot ?
+# L'index (float32) et les blocs de texte (déjà compressés) y gagnent peu.
+FILES = {
+    "meta.json": True,
+    "texts.json": True,
+    "index.faiss": False,
+    "texts.bin": False,
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class NothingToExport(Exception):
+    """Collection jamais sauvegardée (ex: `default` avant le premier upload)."""
+    pass
+
+
+# ====== EXPORT ======
+
+def export_collection(collection):
+    """
+    Flux d'octets du snapshot d'une collection (itérateur, pour une réponse streamée).
+
+    Les fichiers sont ouverts sous le verrou d'écriture de la collection : un
+    upload concurrent (qui remplace le dossier) n'affecte pas le snapshot en cours.
+    Le journal des derniers uploads est d'abord compacté dans les fichiers de base.
+    Lève NothingToExport si la collection n'a encore rien écrit sur disque.
+    """
+    with collection.write_lock:
+        collection.compact()
+        if not os.path.exists(os.path.join(collection.path, "meta.json")):
+            raise NothingToExport(collection.name)
+        handles = [(name, open(os.path.join(collection.path, name), "rb")) for name in FILES]
+        manifest = {
+            "collection": collection.name,
+            "embedding_model": collection.embedding_model,
+            "dimension": collection.dimension,
+            "sources": len(collection.sources),
+            "chunks": len(collection.chunks),
+            "vectors": collection.index.ntotal,
+            "files": list(FILES),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+    return _export_stream(manifest, handles)
+
+
+def _export_stream(manifest, handles):
+    try:
+        body = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+        yield MAGIC + struct.pack(">HI", SNAPSHOT_VERSION, len(body)) + body
+        yield hashlib.sha256(body).digest()
+
+        for name, f in handles:
+            compress = FILES[name]
+            encoded = name.encode("utf-8")
+            yield struct.pack(">H", len(encoded)) + encoded + struct.pack(">B", int(compress))
+            digest = hashlib.sha256()
+            compressor = zlib.compressobj(6) if compress else None
+            while True:
+                data = f.read(FRAME_BYTES)
+                if not data:
+                    break
+                digest.update(data)
+                if compressor:
+                    data = compressor.compress(data)
+                if data:
+                    yield struct.pack(">I", len(data)) + data
+            if compressor:
+                tail = compressor.flush()
+                yield struct.pack(">I", len(tail)) + tail
+            yield struct.pack(">I", 0) + digest.digest()
+
+        yield struct.pack(">H", 0)
+    finally:
+        for _, f in handles:
+            f.close()
+
+
+def write_snapshot(collection, path):
+    """Écrit le snapshot dans un fichier ; renvoie sa taille en octets."""
+    size = 0
+    stream = export_collection(collection)  # avant open() : pas de fichier vide si rien à exporter
+    with open(path, "wb") as out:
+        for data in stream:
+            out.write(data)
+            size += len(data)
+    return size
+
+
+# ====== IMPORT ======
+
+def _read_exact(stream, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            raise SnapshotError("Truncated snapshot")
+        data += chunk
+    return bytes(data)
+
+
+def read_snapshot(stream, directory):
+    """
+    Lit un snapshot depuis un flux (fichier, corps de requête) et écrit les
+    fichiers de la collection dans `directory`, checksums vérifiés.
+
+    Returns:
+        manifeste du snapshot
+    """
+    header = _read_exact(stream, len(MAGIC) + 6)
+    if header[:len(MAGIC)] != MAGIC:
+        raise SnapshotError("Not a knowledge-base snapshot")
+    version, manifest_len = struct.unpack(">HI", header[len(MAGIC):])
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {version}")
+    body = _read_exact(stream, manifest_len)
+    if hashlib.sha256(body).digest() != _read_exact(stream, 32):
+        raise SnapshotError("Snapshot manifest checksum mismatch")
+    manifest = json.loads(body)
+
+    os.makedirs(directory)
+    seen = set()
+    while True:
+        (name_len,) = struct.unpack(">H", _read_exact(stream, 2))
+        if name_len == 0:
+            break
+        name = _read_exact(stream, name_len).decode("utf-8")
+        if name not in FILES or name in seen:
+            raise SnapshotError(f"Unexpected file in snapshot: {name}")
+        seen.add(name)
+        (flags,) = struct.unpack(">B", _read_exact(stream, 1))
+        decompressor = zlib.decompressobj() if flags & 1 else None
+        digest = hashlib.sha256()
+        with open(os.path.join(directory, name), "wb") as out:
+            while True:
+                (frame_len,) = struct.unpack(">I", _read_exact(stream, 4))
+                if frame_len == 0:
+                    break
+                data = _read_exact(stream, frame_len)
+                if decompressor:
+                    data = decompressor.decompress(data)
+                digest.update(data)
+                out.write(data)
+            if decompressor:
+                tail = decompressor.flush()
+                digest.update(tail)
+                out.write(tail)
+        if digest.digest() != _read_exact(stream, 32):
+            raise SnapshotError(f"Checksum mismatch for {name}")
+
+    missing = set(FILES) - seen
+    if missing:
+        raise SnapshotError(f"Snapshot is missing: {', '.join(sorted(missing))}")
+    return manifest
+
+
+def import_snapshot(manager, stream, name=None, overwrite=False):
+    """
+    Importe un snapshot dans le CollectionManager, sous `name` (par défaut le
+    nom d'origine). La collection est lue dans un dossier temporaire, validée,
+    puis substituée d'un bloc à l'existante (si `overwrite`).
+
+    Returns:
+        (collection, manifeste)
+    """
+    tmp = os.path.join(manager.root, f".import-{uuid.uuid4().hex}")
+    try:
+        manifest = read_snapshot(stream, tmp)
+        collection = manager.install(name or manifest["collection"], tmp, overwrite)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return collection, manifest
+
+
+# ====== CLI ======
+
+def main(argv=None):
+    import argparse
+
+    from kb_collections import CollectionBusy, CollectionExists, CollectionNotFound, create_manager
+
+    parser = argparse.ArgumentParser(description="Export / import de collections")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="écrire le snapshot d'une collection")
+    export.add_argument("collection")
+    export.add_argument("path")
+    restore = commands.add_parser("import", help="charger un snapshot dans KB_DIR")
+    restore.add_argument("path")
+    restore.add_argument("--name", help="nom de la collection importée (défaut: nom d'origine)")
+    restore.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+
+    manager = create_manager()
+    start = time.perf_counter()
+    if args.command == "export":
+        try:
+            with manager.use(args.collection) as collection:
+                size = write_snapshot(collection, args.path)
+        except (CollectionNotFound, NothingToExport) as e:
+            parser.exit(1, f"❌ Nothing to export: {e.args[0]}\n")
+        print(f"📦 {args.collection} -> {args.path} ({size / 2**20:.1f} Mo, "
+              f"{time.perf_counter() - start:.2f}s)")
+    else:
+        try:
+            with open(args.path, "rb") as f:
+                collection, manifest = import_snapshot(manager, f, args.name, args.overwrite)
+        except CollectionExists as e:
+            parser.exit(1, f"❌ Collection already exists: {e.args[0]} (use --overwrite)\n")
+        except (CollectionBusy, ValueError) as e:
+            parser.exit(1, f"❌ Import failed: {e}\n")
+        print(f"📥 {args.path} -> {collection.name} ({manifest['chunks']} chunks, "
+              f"{time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
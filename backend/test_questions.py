@@ -73,6 +73,59 @@ ADVANCED_QUESTIONS = [
 # Dataset complet (pour une évaluation exhaustive)
 ALL_QUESTIONS = BASIC_QUESTIONS + EXTENDED_QUESTIONS + ADVANCED_QUESTIONS
 
+# Questions sur les PDF fournis dans data/ (benchmark de retrieval hors-ligne)
+# "evidence" : extrait présent mot pour mot dans les chunks pertinents
+DOCUMENT_QUESTIONS = [
+    {
+        "question": "Quel hyperviseur a été choisi pour le projet cloud IaaS ?",
+        "ground_truth": "L'équipe a choisi ESXi, l'hyperviseur de niveau 1 de VMware vSphere.",
+        "evidence": "décidé de travailler avec Esxi",
+        "category": "cloud"
+    },
+    {
+        "question": "Quels protocoles utilise un serveur mail ?",
+        "ground_truth": "Un serveur mail utilise principalement SMTP pour l'envoi et IMAP/POP3 pour la réception.",
+        "evidence": "protocoles SMTP pour l’envoi",
+        "category": "cloud"
+    },
+    {
+        "question": "Quels protocoles un NAS utilise-t-il pour partager les fichiers ?",
+        "ground_truth": "Un NAS utilise généralement NFS sous Linux ou SMB/CIFS sous Windows.",
+        "evidence": "NFS (sous Linux)",
+        "category": "cloud"
+    },
+    {
+        "question": "Pourquoi l'installation d'ESXi a-t-elle échoué sur la machine MSI ?",
+        "ground_truth": "Le processeur du MSI n'est pas reconnu par les noyaux récents d'ESXi, qui gèrent mal la topologie hybride des cœurs P-core et E-core.",
+        "evidence": "topologie hybride des cœurs",
+        "category": "cloud"
+    },
+    {
+        "question": "What is data mining also called?",
+        "ground_truth": "Data mining is also called knowledge discovery in databases (KDD).",
+        "evidence": "knowledge discovery in databases",
+        "category": "text mining"
+    },
+    {
+        "question": "What are the three main steps of a data mining process?",
+        "ground_truth": "Pre-processing, data mining and post-processing.",
+        "evidence": "three main steps",
+        "category": "text mining"
+    },
+    {
+        "question": "What are the seven practice areas of text mining?",
+        "ground_truth": "Search and information retrieval, document clustering, document classification, web mining, information extraction, natural language processing and concept extraction.",
+        "evidence": "seven practice areas are as follows",
+        "category": "text mining"
+    },
+    {
+        "question": "How does document clustering work?",
+        "ground_truth": "Document clustering uses data mining algorithms to group similar documents into clusters, so that documents in one cluster are more similar to one another.",
+        "evidence": "Document clustering uses algorithms from data mining",
+        "category": "text mining"
+    },
+]
+
 # ============================================================================
 # FONCTIONS UTILITAIRES
 # ============================================================================
@@ -91,7 +144,8 @@ def print_questions_summary():
     print(f"  - BASIC_QUESTIONS: {len(BASIC_QUESTIONS)} questions")
     print(f"  - EXTENDED_QUESTIONS: {len(EXTENDED_QUESTIONS)} questions")
     print(f"  - ADVANCED_QUESTIONS: {len(ADVANCED_QUESTIONS)} questions")
-    print(f"  - ALL_QUESTIONS: {len(ALL_QUESTIONS)} questions\n")
+    print(f"  - ALL_QUESTIONS: {len(ALL_QUESTIONS)} questions")
+    print(f"  - DOCUMENT_QUESTIONS: {len(DOCUMENT_QUESTIONS)} questions (PDF de data/)\n")
     
     categories = get_question_categories()
     print(f"📂 Catégories ({len(categories)}):")
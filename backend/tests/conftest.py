@@ -0,0 +1,16 @@
+"""
+Configuration commune des tests : backend/ dans le sys.path, modèles remplacés
+par les fakes déterministes (cf. benchmarks/fakes.py) et KB_DIR temporaire.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("KB_DIR", tempfile.mkdtemp(prefix="kb-tests-"))
+os.environ.setdefault("REEMBED_ON_START", "0")
+
+from benchmarks import fakes  # noqa: E402
+
+fakes.install()
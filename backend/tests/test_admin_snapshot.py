@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+import app
+import models
+from benchmarks import fakes
+from kb_collections import CollectionManager
+
+TOKEN = "secret"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "COLLECTIONS", CollectionManager(str(tmp_path), 2**30, models.embedding_model()))
+    monkeypatch.setattr(app, "ADMIN_TOKEN", TOKEN)
+    return app.app.test_client()
+
+
+def test_admin_requires_configured_token(client, monkeypatch):
+    assert client.get("/admin/export").status_code == 403
+    assert client.get("/admin/export", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    monkeypatch.setattr(app, "ADMIN_TOKEN", None)
+    assert client.get("/admin/queues").status_code == 403
+    assert client.post("/admin/import?overwrite=1", data=b"").status_code == 403
+
+
+def test_export_empty_collection(client):
+    response = client.get("/admin/export", headers={"X-Admin-Token": TOKEN})
+    assert response.status_code == 409
+    assert "nothing to export" in response.get_json()["error"]
+
+
+def test_export_import_round_trip(client):
+    with app.COLLECTIONS.use("default", create=True) as default:
+        source = {"id": "s1", "name": "s1.pdf", "pages": 1, "chunk_count": 1}
+        spans = [{"start": 0, "end": 5, "page_start": 1, "page_end": 1}]
+        vectors = fakes.FakeSentenceTransformer().encode(["hello"])
+        default.add_source(source, "hello", spans, vectors, models.embedding_model())
+
+    headers = {"X-Admin-Token": TOKEN}
+    exported = client.get("/admin/export", headers=headers)
+    assert exported.status_code == 200
+    imported = client.post("/admin/import?collection=copy", data=io.BytesIO(exported.data),
+                           headers=headers)
+    assert imported.status_code == 200
+    assert imported.get_json()["chunks"] == 1
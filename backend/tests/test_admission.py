@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+import admission
+import app
+from admission import AdmissionController, Overloaded
+
+
+def controller(slots=1, **overrides):
+    queues = {name: config for name, config in admission.QUEUES.items()}
+    queues.update(overrides)
+    return AdmissionController(slots, queues)
+
+
+def wait_for_waiters(ctrl, count):
+    deadline = time.time() + 5
+    while len(ctrl._waiters) < count:
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def test_freed_slot_goes_to_highest_priority_then_fifo():
+    ctrl = controller(slots=1)
+    ctrl.acquire("summarize")
+    order = []
+
+    def take(name):
+        ctrl.acquire(name)
+        order.append(name)
+        ctrl.release(name, 0.01)
+
+    threads = []
+    for name in ("quiz_bank", "quiz", "ask", "summarize"):
+        threads.append(threading.Thread(target=take, args=(name,)))
+        threads[-1].start()
+        wait_for_waiters(ctrl, len(threads))
+    ctrl.release("summarize", 0.01)
+    for thread in threads:
+        thread.join()
+    assert order == ["ask", "quiz", "summarize", "quiz_bank"]
+
+
+def test_max_active_caps_a_queue_but_not_the_others():
+    ctrl = controller(slots=4, summarize=(1, 8, 1, 0.05))
+    ctrl.acquire("summarize")
+    with pytest.raises(Overloaded) as refused:
+        ctrl.acquire("summarize")
+    assert refused.value.reason == "timeout" and refused.value.retry_after >= 1
+    ctrl.acquire("ask")  # les autres files gardent les slots libres
+    assert ctrl.stats()["active"] == 2
+
+
+def test_full_queue_is_refused_immediately():
+    ctrl = controller(slots=1, quiz=(1, 1, 1, 5.0))
+    ctrl.acquire("ask")
+    waiter = threading.Thread(target=lambda: (ctrl.acquire("quiz"), ctrl.release("quiz", 0)))
+    waiter.start()
+    wait_for_waiters(ctrl, 1)
+    start = time.perf_counter()
+    with pytest.raises(Overloaded) as refused:
+        ctrl.acquire("quiz")
+    assert refused.value.reason == "queue_full" and time.perf_counter() - start < 1
+    ctrl.release("ask", 0)
+    waiter.join()
+
+
+def test_overloaded_view_answers_429_with_retry_after(monkeypatch):
+    ctrl = controller(slots=1, ask=(0, 0, 1, 1.0))
+    monkeypatch.setattr(admission, "CONTROLLER", ctrl)
+    response = app.app.test_client().post("/ask", json={"question": "q", "selected_ids": ["s"]})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["reason"] == "queue_full"
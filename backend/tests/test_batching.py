@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+
+import app
+from batching import QueryBatcher, direct_search
+
+
+def encode(texts):
+    return np.array([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+
+class CountingSearch:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, vectors, k):
+        self.calls.append(len(vectors))
+        ids = np.tile(np.arange(k), (len(vectors), 1))
+        return np.zeros_like(ids, dtype=np.float32), ids
+
+
+def test_encode_only_requests_share_the_batch_without_searching():
+    batcher = QueryBatcher(max_batch=8, max_wait_ms=50)
+    search = CountingSearch()
+    results = {}
+
+    def submit(text, with_search):
+        results[text] = batcher.submit(text, 3, encode, search if with_search else None)
+
+    threads = [threading.Thread(target=submit, args=(t, t != "bb")) for t in ("a", "bb", "ccc")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    vector, distances, ids, timings = results["bb"]
+    assert vector.tolist() == [2.0, 1.0]
+    assert distances is None and ids is None and "vector_search" not in timings
+    assert results["ccc"][2].tolist() == [0, 1, 2]
+    assert sum(search.calls) == 2
+
+
+def test_direct_search_encode_only():
+    vector, distances, ids, timings = direct_search("abc", 5, encode)
+    assert vector.tolist() == [3.0, 1.0] and ids is None and "embedding" in timings
+
+
+class FakeSpace:
+    model = "fake"
+
+    def __init__(self):
+        self.index = type("Index", (), {"ntotal": 4})()
+        self.searches = 0
+
+    def search(self, vectors, k):
+        self.searches += 1
+        ids = np.arange(k)[None, :]
+        return np.zeros((1, k), dtype=np.float32), ids
+
+    def vectors(self, ids):
+        return np.eye(4, dtype=np.float32)[ids]
+
+
+class FakeCollection:
+    name = "fake"
+
+    def __init__(self):
+        self.space = FakeSpace()
+        self.chunks = [{"source_id": "s", "global_index": i} for i in range(4)]
+
+    def select_chunks(self, selected_ids):
+        return self.chunks
+
+
+def test_session_hit_skips_the_vector_search(monkeypatch):
+    monkeypatch.setattr(app.models, "get_embedder", lambda model: type("E", (), {
+        "encode": staticmethod(lambda texts: np.array([[1.0, 0.0, 0.0, 0.0]] * len(texts)))
+    }))
+    collection = FakeCollection()
+    first = app.session_retrieve(collection, "conv-batching", "question", ["s"])
+    second = app.session_retrieve(collection, "conv-batching", "question bis", ["s"])
+    assert first[4]["cache"] == "miss" and second[4]["cache"] == "hit"
+    assert collection.space.searches == 1
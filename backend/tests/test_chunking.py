@@ -0,0 +1,127 @@
+import functools
+import random
+import re
+from bisect import bisect_left, bisect_right
+
+import pytest
+
+import chunking
+from chunking import chunk_spans, smart_chunk_text
+
+SENTENCE_END_RE = re.compile(r"[.!?][\"')\]»]{0,2}$")
+BLANKS = [" ", " ", " ", "\n", "\n\n", " \n \n", "\t", " ", " ", "\x1c"]
+WORDS = ["alpha", "beta", "gamma", "délta", "ωmega", "x", "fin.", "quoi?", "(note)", "dit.»",
+         "voilà!)", "etc.\"')", "1.5", "«début"]
+
+
+def reference_spans(text, max_words, overlap_words=0):
+    """Même découpage que chunk_spans, écrit simplement (liste complète des mots)."""
+    words = list(re.finditer(r"\S+", text))
+    starts = [m.start() for m in words]
+    n = len(words)
+    sentence_breaks = [i + 1 for i, m in enumerate(words) if SENTENCE_END_RE.search(m.group())]
+    paragraph_breaks = sorted({bisect_left(starts, m.end()) for m in chunking.PARAGRAPH_RE.finditer(text)})
+    overlap_words = max(0, min(overlap_words, max_words - 1))
+
+    spans, first, previous_last = [], 0, 0
+    while first < n:
+        limit = first + max_words
+        if limit >= n:
+            last = n
+        else:
+            lo = max(first, previous_last)
+            para = chunking._last_break(paragraph_breaks, lo, limit)
+            if para is not None and para - first >= max_words // 2:
+                last = para
+            else:
+                last = chunking._last_break(sentence_breaks, lo, limit) or para or limit
+        spans.append((starts[first], words[last - 1].end()))
+        if last >= n:
+            break
+        previous_last, next_first = last, last
+        if overlap_words:
+            next_first = last - overlap_words
+            pos = bisect_left(sentence_breaks, next_first)
+            if pos < len(sentence_breaks) and sentence_breaks[pos] < last:
+                next_first = sentence_breaks[pos]
+        first = max(next_first, first + 1)
+    return spans
+
+
+def random_text(rng, words):
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice(BLANKS))
+    return rng.choice(["", "  ", "\n"]) + "".join(parts)
+
+
+def word_index(text):
+    return {m.start(): i for i, m in enumerate(re.finditer(r"\S+", text))}
+
+
+@pytest.mark.parametrize("block_chars", [7, 64, chunking.BLOCK_CHARS])
+def test_matches_reference_across_block_sizes(monkeypatch, block_chars):
+    monkeypatch.setattr(chunking, "word_blocks",
+                        functools.partial(chunking.word_blocks, block_chars=block_chars))
+    rng = random.Random(block_chars)
+    for _ in range(120):
+        text = random_text(rng, rng.randint(0, 400))
+        max_words = rng.choice([1, 2, 5, 20, 60])
+        overlap = rng.choice([0, 0, 1, 3, 10])
+        spans = [(c["start"], c["end"]) for c in chunk_spans(text, max_words, overlap)]
+        assert spans == reference_spans(text, max_words, overlap)
+
+
+def test_chunks_respect_max_words_and_slice_to_whole_words():
+    rng = random.Random(1)
+    for _ in range(200):
+        text = random_text(rng, rng.randint(1, 500))
+        max_words = rng.choice([3, 30, 100])
+        for chunk in chunk_spans(text, max_words, rng.choice([0, 2])):
+            piece = text[chunk["start"]:chunk["end"]]
+            assert 1 <= len(piece.split()) <= max_words
+            assert piece == piece.strip()
+            assert chunk["start"] == 0 or text[chunk["start"] - 1].isspace()
+            assert chunk["end"] == len(text) or text[chunk["end"]].isspace()
+
+
+def test_overlap_repeats_at_most_overlap_words_and_covers_every_word():
+    rng = random.Random(2)
+    for _ in range(200):
+        text = random_text(rng, rng.randint(1, 500))
+        overlap = rng.choice([1, 5, 10])
+        index = word_index(text)
+        previous_first, previous_end, seen = -1, -1, set()
+        for chunk in chunk_spans(text, 30, overlap):
+            first = index[chunk["start"]]
+            count = len(text[chunk["start"]:chunk["end"]].split())
+            assert first > previous_first  # progresse toujours
+            assert previous_end - first + 1 <= overlap  # mots repris du chunk précédent
+            seen.update(range(first, first + count))
+            previous_first, previous_end = first, first + count - 1
+        assert seen == set(range(len(index)))
+
+
+def test_page_provenance():
+    pages = [" ".join(f"p{p}w{i}." if i % 7 == 6 else f"p{p}w{i}" for i in range(45)) for p in range(1, 6)]
+    text, page_starts = "", []
+    for page in pages:
+        page_starts.append(len(text))
+        text += page + "\n\n"
+    for chunk in chunk_spans(text, 40, 5, page_starts=page_starts):
+        found = {int(w[1:w.index("w")]) for w in text[chunk["start"]:chunk["end"]].split()}
+        assert (chunk["page_start"], chunk["page_end"]) == (min(found), max(found))
+
+
+def test_same_content_as_smart_chunk_text():
+    # smart_chunk_text retire . ! ? et recolle les morceaux : même suite de mots hors ponctuation
+    rng = random.Random(3)
+
+    def words(pieces):
+        return [w for piece in pieces for w in re.sub(r"[.!?]", " ", piece).split()]
+
+    for _ in range(100):
+        text = random_text(rng, rng.randint(1, 400))
+        spans = chunk_spans(text, 50)
+        assert words(text[c["start"]:c["end"]] for c in spans) == words(smart_chunk_text(text, 50))
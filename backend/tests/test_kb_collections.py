@@ -0,0 +1,84 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+import kb_collections
+import snapshot
+from kb_collections import JOURNAL, CollectionManager
+
+MODEL = "fake"
+
+
+def add_source(collection, source_id, words=400, seed=0):
+    text = " ".join(f"mot{source_id}{i}" for i in range(words))
+    spans = [{"start": i, "end": min(i + 200, len(text)), "page_start": 1, "page_end": 1}
+             for i in range(0, len(text), 200)]
+    vectors = np.random.default_rng(seed).random((len(spans), 8), dtype=np.float32)
+    source = {"id": source_id, "name": f"{source_id}.pdf", "pages": 1, "chunk_count": len(spans)}
+    collection.add_source(source, text, spans, vectors, MODEL)
+    return text
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CollectionManager(str(tmp_path), 2**30, MODEL)
+
+
+def reload(manager, name="kb"):
+    return kb_collections.Collection.load(name, os.path.join(manager.root, name))
+
+
+def test_upload_appends_to_journal_without_rewriting_base(manager):
+    with manager.use("kb", create=True) as collection:
+        add_source(collection, "a", words=4000)
+        base = os.path.join(collection.path, "index.faiss")
+        before = os.stat(base)
+        text = add_source(collection, "b", seed=1)
+        after = os.stat(base)
+        assert (before.st_ino, before.st_mtime_ns) == (after.st_ino, after.st_mtime_ns)
+        assert os.path.exists(os.path.join(collection.path, JOURNAL))
+        expected = collection.vectors(range(collection.index.ntotal))
+
+    loaded = reload(manager)
+    assert [s["id"] for s in loaded.sources] == ["a", "b"]
+    assert loaded.index.ntotal == len(loaded.chunks)
+    np.testing.assert_array_equal(loaded.vectors(range(loaded.index.ntotal)), expected)
+    assert loaded.text_store.text("b") == text
+
+
+def test_torn_journal_tail_is_ignored_then_overwritten(manager):
+    with manager.use("kb", create=True) as collection:
+        add_source(collection, "a", words=4000)
+        add_source(collection, "b", seed=1)
+        path = collection.path
+    with open(os.path.join(path, JOURNAL), "ab") as f:
+        f.write(b'{"source": {"id": "c"')
+    with open(os.path.join(path, "journal.bin"), "ab") as f:
+        f.write(b"\0" * 100)
+
+    loaded = reload(manager)
+    assert [s["id"] for s in loaded.sources] == ["a", "b"]
+    add_source(loaded, "d", seed=2)
+    assert [s["id"] for s in reload(manager).sources] == ["a", "b", "d"]
+
+
+def test_large_journal_is_compacted(manager, monkeypatch):
+    monkeypatch.setattr(kb_collections, "COMPACT_RATIO", 0.0)
+    with manager.use("kb", create=True) as collection:
+        add_source(collection, "a")
+        add_source(collection, "b", seed=1)
+        assert not os.path.exists(os.path.join(collection.path, JOURNAL))
+    assert len(reload(manager).sources) == 2
+
+
+def test_export_includes_journaled_sources(manager):
+    with manager.use("kb", create=True) as collection:
+        add_source(collection, "a", words=4000)
+        add_source(collection, "b", seed=1)
+        data = b"".join(snapshot.export_collection(collection))
+        assert not os.path.exists(os.path.join(collection.path, JOURNAL))
+    imported, manifest = snapshot.import_snapshot(manager, io.BytesIO(data), "copy")
+    assert manifest["sources"] == 2
+    assert [s["id"] for s in imported.sources] == ["a", "b"]
@@ -0,0 +1,40 @@
+import pytest
+
+import app
+import metrics
+import models
+from benchmarks import fakes
+from kb_collections import CollectionManager
+
+
+def gauge(client, name):
+    for line in client.get("/metrics").get_data(as_text=True).splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    raise AssertionError(f"{name} absent de /metrics")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    if not metrics.ENABLED:
+        pytest.skip("prometheus_client absent")
+    monkeypatch.setattr(app, "COLLECTIONS", CollectionManager(str(tmp_path), 2**30, models.embedding_model()))
+    return app.app.test_client()
+
+
+def test_index_gauges_follow_collections_outside_routes(client):
+    with app.COLLECTIONS.use("default", create=True) as collection:
+        source = {"id": "s1", "name": "s1.pdf", "pages": 1, "chunk_count": 2}
+        spans = [{"start": 0, "end": 5, "page_start": 1, "page_end": 1},
+                 {"start": 6, "end": 11, "page_start": 1, "page_end": 1}]
+        vectors = fakes.FakeSentenceTransformer().encode(["hello", "world"])
+        collection.add_source(source, "hello world", spans, vectors, models.embedding_model())
+    assert gauge(client, "rag_index_vectors") == 2
+    assert gauge(client, "rag_chunks") == 2
+
+    app.COLLECTIONS.unload("default")  # éviction : plus rien en mémoire
+    assert gauge(client, "rag_index_vectors") == 0
+
+    with app.COLLECTIONS.use("default"):  # rechargement paresseux depuis le disque
+        pass
+    assert gauge(client, "rag_index_vectors") == 2
@@ -0,0 +1,46 @@
+import sys
+import types
+
+import pytest
+
+import pdf_extract
+from pdf_extract import PageCache
+
+
+def test_page_cache_is_bounded_in_encoded_bytes():
+    cache = PageCache(max_bytes=10)
+    cache.put(("h", "auto", 0), "éééé", "pdfium")  # 4 caractères, 8 octets
+    assert cache.get(("h", "auto", 0)) == ("éééé", "pdfium")
+    cache.put(("h", "auto", 1), "abc", "pdfium")   # 11 octets > 10 : la page 0 est évincée
+    assert cache.get(("h", "auto", 0)) is None
+    assert cache.get(("h", "auto", 1)) == ("abc", "pdfium")
+
+
+def test_page_count_is_evicted_with_last_page():
+    cache = PageCache(max_bytes=4)
+    cache.put(("a", "auto", 0), "abcd", "pypdf")
+    cache.set_page_count("a", 1)
+    assert cache.page_count("a") == 1
+    cache.put(("b", "auto", 0), "x", "pypdf")
+    assert cache.page_count("a") is None
+
+
+def test_pdfium_lock_released_when_page_count_fails(monkeypatch):
+    closed = []
+
+    class BrokenDocument:
+        def __init__(self, data):
+            pass
+
+        def __len__(self):
+            raise RuntimeError("document corrompu")
+
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setitem(sys.modules, "pypdfium2", types.SimpleNamespace(PdfDocument=BrokenDocument))
+    with pytest.raises(RuntimeError):
+        pdf_extract._PdfiumDocument(b"%PDF")
+    assert closed == [True]
+    assert pdf_extract._pdfium_lock.acquire(blocking=False)
+    pdf_extract._pdfium_lock.release()
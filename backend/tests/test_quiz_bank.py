@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pytest
+
+import admission
+from kb_collections import Collection
+from quiz_bank import QuestionBank, parse_quiz
+
+
+def block(number, question, choices="ABCD", answer="B", section=1):
+    lines = [f"{number}. [Document: cours.pdf | Section {section}] - {question}"]
+    lines += [f"   {letter}) Option {letter} de {question}" for letter in choices]
+    if answer:
+        lines.append(f"   Réponse correcte : {answer}")
+    return "\n".join(lines) + "\n"
+
+
+def test_parse_valid_question():
+    questions, rejected = parse_quiz(block(1, "Que désigne le terme KDD ?", section=3))
+    assert rejected == []
+    (q,) = questions
+    assert q["question"] == "Que désigne le terme KDD ?"
+    assert q["choices"][1] == "Option B de Que désigne le terme KDD ?"
+    assert (q["answer"], q["answer_letter"], q["document"], q["section"]) == (1, "B", "cours.pdf", 3)
+    assert len(q["id"]) == 12
+
+
+def test_parse_multiline_question_and_loose_answer_format():
+    text = "1. Quelle est\nla capitale ?\n(a) Paris\nb. Lyon\nC: Nice\nD) Lille\n**Réponse : a** Paris\n"
+    (q,), rejected = parse_quiz(text)
+    assert q["question"] == "Quelle est la capitale ?"
+    assert q["answer_letter"] == "A" and q["explanation"] == "Paris"
+
+
+@pytest.mark.parametrize("text, reason", [
+    (block(1, "Quoi"), "missing question"),
+    (block(1, "Question sans D ?", choices="ABC"), "expected options A, B, C, D"),
+    (block(1, "Question sans réponse ?", answer=None), "missing answer letter"),
+    ("1. Options identiques ?\nA) x\nB) X\nC) y\nD) z\nRéponse : A\n", "duplicate options"),
+])
+def test_parse_rejects_malformed_items(text, reason):
+    questions, rejected = parse_quiz(text + block(2, "Question valide numéro deux ?"))
+    assert [q["question"] for q in questions] == ["Question valide numéro deux ?"]
+    assert rejected == [reason]
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = Collection("cours", str(tmp_path / "cours"), "fake", dimension=4)
+    text = "Premier paragraphe sur le KDD.\n\nSecond paragraphe sur le clustering."
+    spans = [{"start": 0, "end": 30, "page_start": 1, "page_end": 1},
+             {"start": 32, "end": len(text), "page_start": 1, "page_end": 1}]
+    source = {"id": "s1", "name": "cours.pdf", "pages": 1, "chunk_count": 2}
+    collection.add_source(source, text, spans, np.eye(2, 4, dtype=np.float32), "fake")
+    return collection
+
+
+class ScriptedLLM:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.answers.pop(0) if self.answers else ""
+
+
+def test_generate_retries_only_missing_questions(tmp_path, collection):
+    llm = ScriptedLLM(
+        block(1, "Que désigne le KDD ?", section=1) + block(2, "Invalide ?", answer=None),
+        block(1, "Que regroupe le clustering ?", section=2),
+    )
+    bank = QuestionBank(str(tmp_path / "bank"), None, llm, max_retries=2)
+    questions, report = bank.generate(collection, ["s1"], 2)
+
+    assert [q["chunk"] for q in questions] == [0, 1]
+    assert all(q["source_id"] == "s1" and "section" not in q for q in questions)
+    assert report == {"attempts": 2, "rejected": ["missing answer letter"]}
+    assert "exactement 1 questions" in llm.prompts[1]
+    assert "- Que désigne le KDD ?" in llm.prompts[1]  # question déjà obtenue à éviter
+
+
+def test_generate_stops_after_max_retries(tmp_path, collection):
+    llm = ScriptedLLM()
+    bank = QuestionBank(str(tmp_path / "bank"), None, llm, max_retries=1)
+    questions, report = bank.generate(collection, ["s1"], 3)
+    assert questions == [] and report["attempts"] == 2 and len(llm.prompts) == 2
+
+
+def test_bank_hit_skips_llm_and_admission(tmp_path, collection, monkeypatch):
+    llm = ScriptedLLM(block(1, "Que désigne le KDD ?") + block(2, "Que regroupe le clustering ?"))
+    bank = QuestionBank(str(tmp_path / "bank"), None, llm, target_per_source=2, questions=2)
+    _, info = bank.quiz(collection, ["s1"])
+    assert info["served_from"] == "llm"
+
+    def refuse(name):
+        raise admission.Overloaded(name, "queue_full", 1)
+    monkeypatch.setattr(admission, "CONTROLLER", type("Full", (), {"acquire": staticmethod(refuse)})())
+    questions, info = bank.quiz(collection, ["s1"])
+    assert info["served_from"] == "bank" and len(questions) == 2
+    with pytest.raises(admission.Overloaded):
+        bank.quiz(collection, ["s1"], use_bank=False)
+
+
+def test_banks_are_lru_bounded_and_reloaded_from_disk(tmp_path):
+    bank = QuestionBank(str(tmp_path), None, None, max_banks=2)
+    for name in ("a", "b", "c"):
+        bank.add(name, [{"id": name, "source_id": "s", "chunk": 0}])
+        bank.sample(name, ["s"], 1)
+    assert list(bank._banks) == ["b", "c"] and "a" not in bank._served
+    assert bank.count("a", "s") == 1
+    assert os.path.exists(os.path.join(str(tmp_path), "a.json"))
+    assert list(bank._banks) == ["c", "a"]
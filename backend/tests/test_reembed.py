@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import models
+from kb_collections import Collection, CollectionManager
+from reembed import Reembedder
+
+OLD, NEW = "old-model", "new-model"
+
+
+class FakeEmbedder:
+    """Vecteur de dimension 8 dérivé de la longueur du texte ; `gate` bloque l'encodage."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts):
+        self.gate.wait(5)
+        return np.array([[len(t), 1, 0, 0, 0, 0, 0, 1] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(models, "embedding_model", lambda: NEW)
+    monkeypatch.setattr(models, "get_embedder", lambda name=None: embedder)
+    monkeypatch.setattr(models, "release_embedders", lambda keep: None)
+    return embedder
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CollectionManager(str(tmp_path), 2**30, OLD)
+
+
+def add_source(collection, source_id, texts):
+    text = " ".join(texts)
+    spans, start = [], 0
+    for piece in texts:
+        spans.append({"start": start, "end": start + len(piece), "page_start": 1, "page_end": 1})
+        start += len(piece) + 1
+    source = {"id": source_id, "name": f"{source_id}.pdf", "pages": 1, "chunk_count": len(spans)}
+    collection.add_source(source, text, spans, np.ones((len(spans), 4), dtype=np.float32), OLD)
+
+
+def wait_done(reembedder):
+    deadline = time.time() + 5
+    while reembedder.status()["status"] == "running":
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return reembedder.status()
+
+
+def test_switches_collection_to_the_new_model(manager, embedder):
+    with manager.use("cours", create=True) as collection:
+        add_source(collection, "s1", ["un", "deux mots", "trois mots ici"])
+
+    reembedder = Reembedder(manager, batch_size=2)
+    assert reembedder.start(["cours"])
+    status = wait_done(reembedder)
+
+    assert status["status"] == "done"
+    assert status["collections"]["cours"]["status"] == "done"
+    with manager.use("cours") as collection:
+        assert (collection.embedding_model, collection.dimension) == (NEW, 8)
+        np.testing.assert_array_equal(collection.vectors([0, 1, 2])[:, 0], [2, 9, 14])
+    assert manager.embedding_model_of("cours") == NEW  # persisté
+    assert Collection.load("cours", manager._path("cours")).embedding_model == NEW
+
+
+def test_up_to_date_collection_is_skipped(manager, embedder):
+    with manager.use("cours", create=True) as collection:
+        add_source(collection, "s1", ["un"])
+    reembedder = Reembedder(manager)
+    reembedder.start(["cours"])
+    wait_done(reembedder)
+    reembedder.start(["cours"])
+    assert wait_done(reembedder)["collections"]["cours"]["status"] == "up_to_date"
+
+
+def test_replace_space_encodes_chunks_added_during_the_job(manager, embedder):
+    with manager.use("cours", create=True) as collection:
+        add_source(collection, "s1", ["un", "deux"])
+        index = __import__("faiss").IndexFlatL2(8)
+        index.add(embedder.encode(["un", "deux"]))
+        add_source(collection, "s2", ["ajouté", "pendant le job"])  # upload pendant le ré-encodage
+
+        added = collection.replace_space(index, NEW, embedder.encode)
+
+        assert added == 2 and collection.index.ntotal == 4
+        np.testing.assert_array_equal(collection.vectors([2, 3])[:, 0], [6, 14])
+        assert collection.embedding_model == NEW
+
+
+def test_enqueue_while_running_processes_after_current_job(manager, embedder):
+    for name in ("a", "b"):
+        with manager.use(name, create=True) as collection:
+            add_source(collection, "s1", ["texte"])
+    reembedder = Reembedder(manager)
+    embedder.gate.clear()
+    assert reembedder.enqueue(["a"]) == "started"
+    assert reembedder.start(["b"]) is False
+    assert reembedder.enqueue(["b"]) == "queued"
+    assert reembedder.status()["queued"] == ["b"]
+    embedder.gate.set()
+
+    status = wait_done(reembedder)
+    assert {name: c["status"] for name, c in status["collections"].items()} == {"a": "done", "b": "done"}
+    assert "queued" not in status
+
+
+def test_job_without_collections_finishes(manager, embedder):
+    reembedder = Reembedder(manager)
+    assert reembedder.start()
+    assert wait_done(reembedder)["status"] == "done"
@@ -0,0 +1,74 @@
+import types
+
+import numpy as np
+
+import session_cache
+from session_cache import CANDIDATE_OVERHEAD_BYTES, SessionCache
+
+COLLECTION = types.SimpleNamespace(name="cours")
+QUERY = np.array([1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+
+
+def space(model="fake", ntotal=10):
+    return types.SimpleNamespace(model=model, index=types.SimpleNamespace(ntotal=ntotal))
+
+
+def store(cache, conversation_id, sp=None, candidates=3, selected=("s1",)):
+    chunks = [{"global_index": i} for i in range(candidates)]
+    cache.store(conversation_id, COLLECTION, sp or space(), list(selected), QUERY,
+                chunks, np.eye(candidates, 4, dtype=np.float32))
+
+
+def lookup(cache, conversation_id, sp=None, selected=("s1",), query=QUERY):
+    return cache.lookup(conversation_id, COLLECTION, sp or space(), list(selected), query)
+
+
+def test_hit_on_close_question_miss_on_distant_one():
+    cache = SessionCache(similarity=0.7)
+    store(cache, "c")
+    candidates, vectors, similarity = lookup(cache, "c", query=np.array([1.0, 0.2, 0, 0]))
+    assert len(candidates) == 3 and vectors.shape == (3, 4) and similarity > 0.9
+    assert lookup(cache, "c", query=np.array([0.0, 1.0, 0, 0]))[0] is None
+
+
+def test_sliding_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_cache.time, "monotonic", lambda: now[0])
+    cache = SessionCache(ttl_s=10)
+    store(cache, "c")
+    now[0] += 8
+    assert lookup(cache, "c")[0] is not None  # prolonge la session
+    now[0] += 8
+    assert lookup(cache, "c")[0] is not None
+    now[0] += 11
+    assert lookup(cache, "c")[0] is None
+    assert cache.stats() == {"sessions": 0, "bytes": 0}
+
+
+def test_memory_cap_evicts_least_recently_used():
+    per_session = 3 * 4 * 4 + 4 * 4 + 3 * CANDIDATE_OVERHEAD_BYTES
+    cache = SessionCache(max_bytes=2 * per_session)
+    store(cache, "a")
+    store(cache, "b")
+    lookup(cache, "a")  # "b" devient la moins récente
+    store(cache, "c")
+    assert lookup(cache, "b")[0] is None
+    assert lookup(cache, "a")[0] is not None and lookup(cache, "c")[0] is not None
+    assert cache.stats() == {"sessions": 2, "bytes": 2 * per_session}
+
+
+def test_session_count_cap_and_candidate_cap():
+    cache = SessionCache(max_sessions=1, max_candidates=2)
+    store(cache, "a", candidates=5)
+    assert len(lookup(cache, "a")[0]) == 2
+    store(cache, "b")
+    assert lookup(cache, "a")[0] is None
+
+
+def test_scope_change_invalidates_candidates():
+    cache = SessionCache()
+    store(cache, "c")
+    assert lookup(cache, "c", sp=space(ntotal=11)) == (None, None, None)  # upload entre-temps
+    assert lookup(cache, "c", sp=space(model="autre")) == (None, None, None)  # ré-encodage
+    assert lookup(cache, "c", selected=("s1", "s2")) == (None, None, None)  # autres sources
+    assert lookup(cache, "c", selected=("s1",))[0] is not None
@@ -0,0 +1,218 @@
+"""
+Stockage compressé du texte extrait des PDF
+Chaque document est gardé une seule fois, découpé en blocs de caractères
+compressés (zstd si `zstandard` est installé, sinon zlib). Les chunks ne
+sont que des offsets (start, end) : leur texte est relu depuis les blocs,
+avec un petit cache LRU des blocs décompressés pour les chunks chauds.
+
+Configuration (variables d'environnement) :
+    TEXT_STORE_CODEC     auto | zstd | zlib              (défaut: auto)
+    TEXT_BLOCK_CHARS     caractères par bloc             (défaut: 16384)
+    TEXT_CACHE_BLOCKS    blocs décompressés en cache     (défaut: 256)
+"""
+
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import metrics
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+
+class _ZlibCodec:
+    name = "zlib"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class _ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level=3):
+        self.level = level
+
+    # Les (dé)compresseurs zstandard ne sont pas thread-safe : un par appel
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+def make_codec(name="auto"):
+    if name == "auto":
+        name = "zstd" if zstandard is not None else "zlib"
+    if name == "zstd":
+        if zstandard is None:
+            raise ValueError("TEXT_STORE_CODEC=zstd mais le paquet zstandard n'est pas installé")
+        return _ZstdCodec()
+    if name == "zlib":
+        return _ZlibCodec()
+    raise ValueError(f"TEXT_STORE_CODEC inconnu: {name} (attendu: auto, zstd, zlib)")
+
+
+class TextStore:
+    """
+    {doc_id: blocs compressés}. `get(doc_id, start, end)` renvoie text[start:end]
+    en ne décompressant que les blocs concernés.
+    """
+
+    def __init__(self, block_chars=16384, cache_blocks=256, codec="auto"):
+        self.block_chars = block_chars
+        self.cache_blocks = cache_blocks
+        self.codec = make_codec(codec) if isinstance(codec, str) else codec
+        self._docs = {}  # {doc_id: {"length": int, "blocks": [bytes]}}
+        self._cache = OrderedDict()  # {(doc_id, block): str}
+        self.cached_chars = 0  # tenu à jour à chaque entrée/sortie du cache (lu sans verrou)
+        self._lock = threading.Lock()
+
+    def add(self, doc_id, text):
+        """Compresse et enregistre le texte d'un document (remplace l'éventuelle version précédente)."""
+        blocks = [
+            self.codec.compress(text[i:i + self.block_chars].encode("utf-8"))
+            for i in range(0, len(text), self.block_chars)
+        ]
+        with self._lock:
+            self._drop_cached(doc_id)
+            self._docs[doc_id] = {"length": len(text), "blocks": blocks}
+
+    def compressed(self, doc_id):
+        """(longueur, blocs compressés) d'un document, pour l'écrire tel quel (journal)."""
+        doc = self._docs[doc_id]
+        return doc["length"], list(doc["blocks"])
+
+    def add_compressed(self, doc_id, length, blocks):
+        """Enregistre un document déjà compressé avec le codec et la taille de bloc du store."""
+        with self._lock:
+            self._drop_cached(doc_id)
+            self._docs[doc_id] = {"length": length, "blocks": list(blocks)}
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._drop_cached(doc_id)
+            self._docs.pop(doc_id, None)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def length(self, doc_id):
+        return self._docs[doc_id]["length"]
+
+    def _drop_cached(self, doc_id):
+        for key in [k for k in self._cache if k[0] == doc_id]:
+            self.cached_chars -= len(self._cache.pop(key))
+
+    def _block(self, doc_id, block):
+        key = (doc_id, block)
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+        metrics.record_cache("text_blocks", text is not None)
+        if text is not None:
+            return text
+
+        # Décompression hors verrou : deux threads peuvent décoder le même bloc, sans gravité
+        text = self.codec.decompress(self._docs[doc_id]["blocks"][block]).decode("utf-8")
+        with self._lock:
+            previous = self._cache.get(key)
+            self.cached_chars += len(text) - (len(previous) if previous is not None else 0)
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_blocks:
+                self.cached_chars -= len(self._cache.popitem(last=False)[1])
+        return text
+
+    def get(self, doc_id, start=0, end=None):
+        """Texte [start:end] du document `doc_id`."""
+        length = self._docs[doc_id]["length"]
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return ""
+        first, last = start // self.block_chars, (end - 1) // self.block_chars
+        if first == last:
+            offset = first * self.block_chars
+            return self._block(doc_id, first)[start - offset:end - offset]
+
+        parts = []
+        for block in range(first, last + 1):
+            offset = block * self.block_chars
+            text = self._block(doc_id, block)
+            parts.append(text[max(start - offset, 0):end - offset])
+        return "".join(parts)
+
+    def text(self, doc_id):
+        """Texte complet d'un document (décompressé sans passer par le cache LRU)."""
+        blocks = self._docs[doc_id]["blocks"]
+        return "".join(self.codec.decompress(b).decode("utf-8") for b in blocks)
+
+    # ====== PERSISTANCE ======
+    # <prefix>.json : {codec, block_chars, docs: {doc_id: {length, sizes}}}
+    # <prefix>.bin  : blocs compressés concaténés, dans l'ordre de l'en-tête
+
+    def save(self, prefix):
+        with self._lock:
+            docs = {doc_id: dict(d) for doc_id, d in self._docs.items()}
+        header = {"codec": self.codec.name, "block_chars": self.block_chars, "docs": {}}
+        with open(prefix + ".bin", "wb") as f:
+            for doc_id, doc in docs.items():
+                header["docs"][doc_id] = {
+                    "length": doc["length"],
+                    "sizes": [len(b) for b in doc["blocks"]],
+                }
+                for block in doc["blocks"]:
+                    f.write(block)
+        with open(prefix + ".json", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+    @classmethod
+    def load(cls, prefix, cache_blocks=256):
+        """Relit un store sauvegardé (même codec et même taille de bloc qu'à l'écriture)."""
+        with open(prefix + ".json", encoding="utf-8") as f:
+            header = json.load(f)
+        store = cls(header["block_chars"], cache_blocks, header["codec"])
+        with open(prefix + ".bin", "rb") as f:
+            for doc_id, doc in header["docs"].items():
+                blocks = [f.read(size) for size in doc["sizes"]]
+                store._docs[doc_id] = {"length": doc["length"], "blocks": blocks}
+        return store
+
+    def stats(self):
+        """Caractères stockés vs octets compressés, et occupation du cache."""
+        with self._lock:
+            chars = sum(d["length"] for d in self._docs.values())
+            compressed = sum(len(b) for d in self._docs.values() for b in d["blocks"])
+        return {
+            "codec": self.codec.name,
+            "documents": len(self._docs),
+            "chars": chars,
+            "compressed_bytes": compressed,
+            "ratio": round(chars / compressed, 2) if compressed else None,
+            "cached_blocks": len(self._cache),
+            "cached_chars": self.cached_chars,
+        }
+
+
+def create_text_store(prefix=None):
+    """TextStore configuré par les variables d'environnement (relu depuis `prefix` s'il existe)."""
+    cache_blocks = int(os.getenv("TEXT_CACHE_BLOCKS", "256"))
+    if prefix and os.path.exists(prefix + ".json"):
+        return TextStore.load(prefix, cache_blocks)
+    return TextStore(
+        block_chars=int(os.getenv("TEXT_BLOCK_CHARS", "16384")),
+        cache_blocks=cache_blocks,
+        codec=os.getenv("TEXT_STORE_CODEC", "auto").lower(),
+    )
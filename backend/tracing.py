@@ -0,0 +1,203 @@
+"""
+Traçage par requête du backend RAG
+- En-tête `Server-Timing` avec la durée de chaque étape (embedding, search, LLM...)
+- Trace JSON optionnelle (`?trace=1` ou en-tête `X-Trace: 1`)
+- Profilage à la demande (`?profile=1` ou en-tête `X-Profile: 1`), dumpé dans PROFILE_DIR
+
+Les étapes sont déclarées avec `tracing.stage("embedding")`, qui alimente aussi
+les histogrammes Prometheus de `metrics`.
+"""
+
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import request
+
+import metrics
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_current = ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Durées des étapes d'une requête, dans l'ordre d'exécution."""
+
+    __slots__ = ("request_id", "endpoint", "start", "stages", "profiler", "profile_path")
+
+    def __init__(self, endpoint):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.stages = []  # [(nom, secondes)]
+        self.profiler = None
+        self.profile_path = None
+
+    def add(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def totals(self):
+        """Durées cumulées par étape (une étape peut apparaître plusieurs fois)."""
+        totals = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self, total):
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self, total):
+        return {
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "total_ms": round(total * 1000, 2),
+            "stages": [
+                {"stage": name, "ms": round(seconds * 1000, 2)}
+                for name, seconds in self.stages
+            ],
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def _timed_stage(name, trace):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe_stage(name, elapsed)
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def record(name, seconds):
+    """Enregistre une durée déjà mesurée (ex: par le worker de micro-batching)."""
+    metrics.observe_stage(name, seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def stage(name):
+    """Mesure une étape : histogramme Prometheus + trace de la requête courante."""
+    trace = _current.get()
+    if trace is None:
+        return metrics.stage(name)
+    return _timed_stage(name, trace)
+
+
+# ====== PROFILAGE ======
+
+def _flag(header, param):
+    value = request.headers.get(header) or request.args.get(param) or ""
+    return value.lower() in ("1", "true", "yes", "json")
+
+
+def _start_profiler():
+    """Profileur échantillonnant (pyinstrument) si disponible, sinon cProfile."""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler(interval=0.001)
+    profiler.start()
+    return profiler
+
+
+def _dump_profile(trace):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(PROFILE_DIR, f"{trace.endpoint}_{timestamp}_{trace.request_id}")
+    profiler = trace.profiler
+
+    if hasattr(profiler, "stop"):  # pyinstrument
+        profiler.stop()
+        path = base + ".html"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    else:  # cProfile -> lisible avec pstats / snakeviz
+        profiler.disable()
+        path = base + ".prof"
+        profiler.dump_stats(path)
+
+    print(f"🔬 Profil enregistré: {path}")
+    return path
+
+
+# ====== INTÉGRATION FLASK ======
+
+def init_app(app, endpoints, allow_profiling=None):
+    """
+    Active le traçage sur les endpoints donnés.
+
+    Args:
+        endpoints: noms des fonctions Flask à tracer ("ask", "upload_pdf"...)
+        allow_profiling: autorise `?profile=1` (par défaut: ALLOW_PROFILING ou mode debug)
+    """
+    endpoints = set(endpoints)
+
+    def profiling_allowed():
+        if allow_profiling is not None:
+            return allow_profiling
+        env = os.getenv("ALLOW_PROFILING")
+        if env is not None:
+            return env.lower() in ("1", "true", "yes")
+        return app.debug
+
+    @app.before_request
+    def _start_trace():
+        if not TRACING_ENABLED or request.endpoint not in endpoints:
+            return
+        trace = Trace(request.endpoint)
+        if profiling_allowed() and _flag("X-Profile", "profile"):
+            trace.profiler = _start_profiler()
+        _current.set(trace)
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _current.get()
+        if trace is None:
+            return response
+        _current.set(None)
+        total = time.perf_counter() - trace.start
+
+        if trace.profiler is not None:
+            trace.profile_path = _dump_profile(trace)
+            response.headers["X-Profile-File"] = trace.profile_path
+
+        response.headers["Server-Timing"] = trace.server_timing(total)
+        response.headers["Timing-Allow-Origin"] = "*"
+        response.headers["X-Request-Id"] = trace.request_id
+
+        if _flag("X-Trace", "trace"):
+            trace_dict = trace.to_dict(total)
+            payload = response.get_json(silent=True) if response.is_json else None
+            if isinstance(payload, dict):
+                payload["trace"] = trace_dict
+                response.set_data(json.dumps(payload, ensure_ascii=False))
+            else:
+                response.headers["X-Trace"] = json.dumps(trace_dict)
+        return response
+
+    @app.teardown_request
+    def _drop_trace(exc):
+        # Requête interrompue par une exception : ne pas laisser fuir la trace
+        trace = _current.get()
+        if trace is not None and trace.profiler is not None:
+            _dump_profile(trace)
+        _current.set(None)
@@ -3,7 +3,7 @@ import {
   Search, List, Settings, Share2, Plus, FileText, Zap, MessageSquare, Mic,
   BookOpen, Clock, ChevronsUpDown, Info, Loader2, Maximize, Minus,
 } from 'lucide-react';
-import QuizModal from './QuizModal';
+import QuizModal, { QuizQuestion } from './QuizModal';
 import VoiceRecorder from "./VoiceRecorder";
 
 // --- Config API backend ---
@@ -107,11 +107,15 @@ async function fetchSources() {
   });
 }
 
+// Identifiant de conversation (un par chargement de page) : le backend réutilise
+// les passages déjà trouvés pour les questions de suivi
+const CONVERSATION_ID = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
 async function askQuestionApi(question: string, selectedIds: string[]) {
   const res = await fetch(`${API_URL}/ask`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ question, selected_ids: selectedIds }),
+    body: JSON.stringify({ question, selected_ids: selectedIds, conversation_id: CONVERSATION_ID }),
   });
   const data = await res.json();
   return data.answer as string;
@@ -127,6 +131,8 @@ async function summarizeApi(selectedIds: string[]) {
   return data.result as string;
 }
 
+// Le backend renvoie des questions déjà parsées et validées ("questions"),
+// et le texte brut ("result") pour compatibilité
 async function quizApi(selectedIds: string[]) {
   const res = await fetch(`${API_URL}/quiz`, {
     method: "POST",
@@ -134,7 +140,7 @@ async function quizApi(selectedIds: string[]) {
     body: JSON.stringify({ selected_ids: selectedIds }),
   });
   const data = await res.json();
-  return data.result as string;
+  return data as { result?: string; questions?: QuizQuestion[] };
 }
 
 // --- Notes mock (on garde) ---
@@ -236,7 +242,7 @@ export default function App() {
   const [notes, setNotes] = useState<NoteItem[]>(INITIAL_NOTES);
   const [activeTab, setActiveTab] = useState<'audio' | 'mindmap'>('audio');
   const [question, setQuestion] = useState<string>("Is UnderSeal a sustainable product?");
-const [quizData, setQuizData] = useState<any[]>([]);
+const [quizData, setQuizData] = useState<QuizQuestion[]>([]);
 const [showQuiz, setShowQuiz] = useState(false);
   // --- Charger les sources au démarrage ---
   const loadSources = useCallback(async () => {
@@ -346,19 +352,20 @@ const handleGenerateQuiz = async () => {
   setResult({ text: "Génération du quiz...", type: 'quiz' });
 
   try {
-    const rawText = await quizApi(selectedSourceIds);
-    
-    // 🔍 DEBUG : Voir ce qui est vraiment reçu
-    console.log("Type reçu:", typeof rawText);
-    console.log("Valeur reçue:", rawText);
-    console.log("Est null/undefined?", rawText == null);
-
-    if (!rawText || typeof rawText !== "string") {
-      console.error("Format inattendu:", rawText);
-      throw new Error("Quiz API a renvoyé un format inattendu");
-    }
+    const data = await quizApi(selectedSourceIds);
+    const rawText = data.result;
 
-    const questions = parseQuizText(rawText);
+    let questions: QuizQuestion[];
+    if (Array.isArray(data.questions)) {
+      // Questions structurées du backend (options + index de la bonne réponse)
+      questions = data.questions;
+    } else {
+      if (!rawText || typeof rawText !== "string") {
+        console.error("Format inattendu:", data);
+        throw new Error("Quiz API a renvoyé un format inattendu");
+      }
+      questions = parseQuizText(rawText);
+    }
 
     if (!questions.length) {
       throw new Error("Aucune question trouvée dans la réponse LLM.");
@@ -1,7 +1,7 @@
 import React, { useState } from "react";
 import { X, ChevronDown } from "lucide-react";
 
-interface QuizQuestion {
+export interface QuizQuestion {
   question: string;
   choices: string[];
   answer: number;